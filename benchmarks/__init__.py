@@ -0,0 +1,5 @@
+""" Host benchmarks of the door controller hot paths.
+Run from the repository root:
+    python -m benchmarks.run
+    python -m benchmarks.run --output new.json --baseline benchmarks/baseline.json
+"""
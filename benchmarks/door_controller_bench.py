@@ -0,0 +1,31 @@
+""" Door controller wake-up and boot benchmarks on the simulator. """
+# coop_door is found from the repository root, see __init__.py.
+# pylint: disable=import-error, no-name-in-module
+from coop_door.sim import Simulation
+from coop_door.door_controller import DoorController
+from coop_door.timer import Timer, TimerScheduler
+
+def _wakeup(hour):
+    """ A wake-up of a controller that has settled by the hour. """
+    sim = Simulation()
+    sim.run_until(hour * 3600 * 1000)
+    return sim.controller._wakeup # pylint: disable=protected-access
+
+def _boot(lazy):
+    """ Construction and start of a controller as in main.py. """
+    def boot():
+        Timer.use_scheduler(TimerScheduler())
+        DoorController.use_lazy_init(lazy)
+        try:
+            DoorController().start()
+        finally:
+            DoorController.use_lazy_init(False)
+            Timer.use_scheduler(None)
+    return boot
+
+BENCHMARKS = [
+    ('door_controller.wakeup_day', lambda: _wakeup(12)),
+    ('door_controller.wakeup_night', lambda: _wakeup(23)),
+    ('door_controller.boot', lambda: _boot(False)),
+    ('door_controller.boot_lazy', lambda: _boot(True)),
+]
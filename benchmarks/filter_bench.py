@@ -0,0 +1,35 @@
+""" Filter benchmarks. """
+from array import array
+# coop_door is found from the repository root, see __init__.py.
+# pylint: disable=import-error, no-name-in-module
+from coop_door.filter import Filter, FilterBank
+
+TRACE = array('f', (1000.0 + i % 7 for i in range(1000)))
+
+def _sample():
+    f = Filter(0.1)
+    return lambda: f.sample(1000.0)
+
+def _sample_loop():
+    f = Filter(0.1)
+    def sample_all():
+        for x in TRACE:
+            f.sample(x)
+    return sample_all
+
+def _sample_many():
+    f = Filter(0.1)
+    out = array('f', bytes(4 * len(TRACE)))
+    return lambda: f.sample_many(TRACE, out)
+
+def _bank_shared():
+    bank = FilterBank([0.01 * (c + 1) for c in range(16)])
+    out = array('d', bytes(8 * 16 * len(TRACE)))
+    return lambda: bank.sample_shared(TRACE, out)
+
+BENCHMARKS = [
+    ('filter.sample', _sample),
+    ('filter.sample_loop_1000', _sample_loop),
+    ('filter.sample_many_1000', _sample_many),
+    ('filter_bank.shared_16x1000', _bank_shared),
+]
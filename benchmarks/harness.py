@@ -0,0 +1,90 @@
+""" Time and allocation measurement, result files. """
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+ROUNDS = 5
+ROUND_NS = 20000000
+
+def measure(operation, rounds=ROUNDS, round_ns=ROUND_NS):
+    """ Return (ns per call, bytes allocated per call) of operation().
+    The loop count is calibrated for a round to take round_ns, the
+    fastest of the rounds is kept. Allocations are the tracemalloc
+    peak over a separate round, freed memory is not subtracted.
+    """
+    operation()
+    loops = 1
+    while True:
+        start = time.perf_counter_ns()
+        for _ in range(loops):
+            operation()
+        elapsed = time.perf_counter_ns() - start
+        if elapsed >= round_ns / 10:
+            break
+        loops *= 10
+    loops = max(1, loops * round_ns // max(elapsed, 1))
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter_ns()
+        for _ in range(loops):
+            operation()
+        elapsed = time.perf_counter_ns() - start
+        best = elapsed if best is None else min(best, elapsed)
+    tracemalloc.start()
+    before, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    for _ in range(loops):
+        operation()
+    _current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best / loops, (peak - before) / loops
+
+def run(benchmarks, name_filter=None, rounds=ROUNDS, round_ns=ROUND_NS):
+    """ Run (name, setup) benchmarks, setup() returns the operation.
+    Return the result dictionary.
+    """
+    results = {}
+    for name, setup in benchmarks:
+        if name_filter and name_filter not in name:
+            continue
+        ns_per_op, bytes_per_op = measure(setup(), rounds, round_ns)
+        results[name] = {'ns_per_op' : round(ns_per_op, 1),
+                         'bytes_per_op' : round(bytes_per_op, 1)}
+    return {'python' : sys.version.split()[0],
+            'machine' : platform.machine(),
+            'results' : results}
+
+def save(report, path):
+    """ Write a result file. """
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(report, file, indent=2, sort_keys=True)
+        file.write('\n')
+
+def load(path):
+    """ Read a result file. """
+    with open(path, encoding='utf-8') as file:
+        return json.load(file)
+
+def compare(report, baseline, threshold):
+    """ Compare the times of a report to a baseline.
+    Return a list of (name, baseline ns, ns, ratio, is regression).
+    A benchmark regresses when it is more than threshold (0.2 is
+    20 %) slower than the baseline.
+    """
+    rows = []
+    for name, result in report['results'].items():
+        base = baseline['results'].get(name)
+        if base is None:
+            continue
+        ratio = result['ns_per_op'] / base['ns_per_op']
+        rows.append((name, base['ns_per_op'], result['ns_per_op'], ratio,
+                     ratio > 1 + threshold))
+    return rows
+
+def same_host(report, baseline):
+    """ Return True if the baseline ran on the machine type and the
+    python version of the report, only then are the times comparable.
+    """
+    return (report['machine'], report['python']) == (baseline['machine'], baseline['python'])
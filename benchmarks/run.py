@@ -0,0 +1,59 @@
+""" Run the benchmarks, compare them to a baseline.
+Exit with 1 if any benchmark is slower than the baseline by more
+than the threshold. A baseline of another machine type or python
+version is compared for information only, it never fails. Refresh
+the stored baseline with
+    python -m benchmarks.run --output benchmarks/baseline.json
+"""
+import argparse
+import sys
+# coop_door is found from the repository root, see __init__.py.
+# pylint: disable=import-error, no-name-in-module
+from coop_door import log
+from coop_door.sim import Board, VirtualClock, install
+install()
+Board(VirtualClock(), {}).activate()
+# As on the board, see main.py.
+log.set_level(log.INFO)
+# pylint: disable=wrong-import-position
+from benchmarks import harness
+from benchmarks import state_machine_bench, filter_bench, door_controller_bench
+
+BENCHMARKS = state_machine_bench.BENCHMARKS\
+    + filter_bench.BENCHMARKS\
+    + door_controller_bench.BENCHMARKS
+
+def main():
+    """ Run, save and compare. """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--output', help='write the results to a JSON file')
+    parser.add_argument('--baseline', help='JSON results to compare with')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='allowed slow down, 0.2 is 20 %%')
+    parser.add_argument('--filter', help='run benchmarks with this in the name')
+    parser.add_argument('--rounds', type=int, default=harness.ROUNDS)
+    parser.add_argument('--round-ns', type=int, default=harness.ROUND_NS,
+                        help='time of a round, sets the calls per round')
+    args = parser.parse_args()
+    report = harness.run(BENCHMARKS, args.filter, args.rounds, args.round_ns)
+    for name, result in report['results'].items():
+        print(f'{name:32s} {result["ns_per_op"]:10.0f} ns {result["bytes_per_op"]:8.1f} B')
+    if args.output:
+        harness.save(report, args.output)
+    if args.baseline:
+        baseline = harness.load(args.baseline)
+        regressions = 0
+        print()
+        if not harness.same_host(report, baseline):
+            print(f'baseline of {baseline["machine"]} python {baseline["python"]},'
+                  ' not failing on regressions')
+        for name, base_ns, new_ns, ratio, is_regression in harness.compare(
+                report, baseline, args.threshold):
+            regressions += is_regression
+            print(f'{name:32s} {base_ns:10.0f} -> {new_ns:10.0f} ns {ratio:6.2f}x'
+                  + ('  REGRESSION' if is_regression else ''))
+        if regressions and harness.same_host(report, baseline):
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
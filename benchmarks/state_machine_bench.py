@@ -0,0 +1,69 @@
+""" State machine dispatch benchmarks. """
+# coop_door is found from the repository root, see __init__.py.
+# pylint: disable=import-error, no-name-in-module
+from coop_door.state_machine import StateMachine, State, Signal, Choice
+
+def _flat():
+    machine = StateMachine('flat')
+    a = State('a', machine)
+    b = State('b', machine)
+    toggle = Signal('toggle')
+    a.on_signal(toggle).go_to(b)
+    b.on_signal(toggle).go_to(a)
+    machine.set_init_state(a)
+    machine.start()
+    def dispatch():
+        machine.send_signal(toggle)
+        machine.process_signal()
+    return dispatch
+
+def _deep(depth):
+    """ Toggle between the leaves of two branches depth states deep. """
+    machine = StateMachine('deep')
+    toggle = Signal('toggle')
+    tops = []
+    leaves = []
+    for branch in 'ab':
+        parent = machine
+        for level in range(depth):
+            state = State(f'{branch}{level}', parent)
+            if parent is machine:
+                tops.append(state)
+            else:
+                parent.set_init_state(state)
+            parent = state
+        leaves.append(parent)
+    leaves[0].on_signal(toggle).go_to(leaves[1])
+    leaves[1].on_signal(toggle).go_to(leaves[0])
+    machine.set_init_state(tops[0])
+    machine.start()
+    def dispatch():
+        machine.send_signal(toggle)
+        machine.process_signal()
+    return dispatch
+
+def _choice(fan_out):
+    """ Enter a choice of fan_out branches, the last one is taken. """
+    machine = StateMachine('choice')
+    idle = State('idle', machine)
+    choice = Choice('choice', machine)
+    go = Signal('go')
+    idle.on_signal(go).go_to(choice)
+    for i in range(fan_out - 1):
+        choice.go_to_if(State(f'target{i}', machine), lambda: False)
+    choice.go_to_if(idle, lambda: True)
+    machine.set_init_state(idle)
+    machine.start()
+    def dispatch():
+        machine.send_signal(go)
+        machine.process_signal()
+    return dispatch
+
+BENCHMARKS = [
+    ('state_machine.flat', _flat),
+    ('state_machine.deep_4', lambda: _deep(4)),
+    ('state_machine.deep_8', lambda: _deep(8)),
+    ('choice.fan_out_2', lambda: _choice(2)),
+    ('choice.fan_out_8', lambda: _choice(8)),
+    ('choice.fan_out_32', lambda: _choice(32)),
+]
@@ -0,0 +1,40 @@
+""" Burst ADC acquisition. """
+
+class BurstAdc():
+    """ Oversample an ADC input.
+    Take a burst of 2^samples_log2 readings in a tight loop and
+    reduce them with integer arithmetic only: the mean (sum and
+    shift, rounded) or the median, which also rejects spikes.
+    The median buffer is allocated once. Provides read_u16 so it
+    can stand in for the ADC.
+    """
+    def __init__(self, adc, samples_log2, median=False):
+        self.adc = adc
+        self.shift = samples_log2
+        self.samples = 1 << samples_log2
+        self.buffer = [0] * self.samples if median else None
+
+    @staticmethod
+    def oversample(adc, samples_log2, median=False):
+        """ Return the ADC to read a burst of 2^samples_log2 samples
+        per reading from. The burst is reduced to its mean, or median
+        if requested, in integers before any conversion.
+        0 takes a single sample, the adc itself is returned.
+        """
+        if samples_log2 > 0:
+            return BurstAdc(adc, samples_log2, median)
+        return adc
+
+    def read_u16(self):
+        """ Return the reduced reading of a burst. """
+        read = self.adc.read_u16
+        if self.buffer is not None:
+            buffer = self.buffer
+            for i in range(self.samples):
+                buffer[i] = read()
+            buffer.sort()
+            return buffer[self.samples >> 1]
+        total = 0
+        for _ in range(self.samples):
+            total += read()
+        return (total + (self.samples >> 1)) >> self.shift
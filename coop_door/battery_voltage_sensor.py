@@ -1,16 +1,24 @@
 """ Voltage reading on resistor divider. """
-import logging
 from machine import ADC, Pin # pylint: disable=import-error
+from . import log
 from .timer import Timer
+from .adc_burst import BurstAdc
+from .trace import Recorder, BATTERY_ADC
 
-logger = logging.getLogger(__name__)
+logger = log.getLogger(__name__)
 
 class BatteryVoltageSensor():
-    """ Read the voltage and provide new reading notification. """
+    # pylint: disable=too-many-instance-attributes
+    """ Read the voltage and provide new reading notification.
+    In fixed point the voltage is reported in integer millivolts,
+    scaled from the ADC count with a precomputed integer factor.
+    """
+    MV_SHIFT = 16
     def __init__(self, pin_num):
         self.slots = []
         pin = Pin(pin_num)
-        self.adc = ADC(pin)
+        self.raw_adc = ADC(pin)
+        self.adc = self.raw_adc
         self.r_up_ohm = 15e3
         self.r_down_ohm = 5e3
         # Only to filter hight frequency noise, there is a already huge cap on battery
@@ -18,26 +26,44 @@ class BatteryVoltageSensor():
         c_f = 10e-9
         self.adc_max = 65535
         self.vcc_v = 3.2
+        self.fixed_point = False
+        # mV = (adc * mv_scale) >> MV_SHIFT, fits a micropython small int.
+        self.mv_scale = round((self.r_up_ohm + self.r_down_ohm) * self.vcc_v * 1000
+                              * (1 << self.MV_SHIFT) / (self.r_down_ohm * self.adc_max))
         init_delay_ms = round(1000 * c_f * self.r_up_ohm * 5)
         self.init_timer = Timer(init_delay_ms, None, Timer.SINGLE_SHOT)
         self.init_timer.start()
+        self.recorder = Recorder.instance
 
     def read(self):
         """ Read the battery voltage
         Perform the ADC reading and return the voltage in
-        Volts. Return None first init_delay_ms milliseconds
-        to let the input settle (charge caps).
+        Volts (millivolts in fixed point). Return None first
+        init_delay_ms milliseconds to let the input settle (charge caps).
         """
         if self.init_timer.active():
             return None
         adc = self.adc.read_u16()
-        v = ((self.r_up_ohm + self.r_down_ohm) * adc * self.vcc_v)\
-            / (self.r_down_ohm * self.adc_max)
+        if self.recorder is not None:
+            self.recorder.record(BATTERY_ADC, 0, adc)
+        if self.fixed_point:
+            v = (adc * self.mv_scale + (1 << (self.MV_SHIFT - 1))) >> self.MV_SHIFT
+        else:
+            v = ((self.r_up_ohm + self.r_down_ohm) * adc * self.vcc_v)\
+                / (self.r_down_ohm * self.adc_max)
 
         for slot in self.slots:
             slot(v)
         return v
 
+    def set_fixed_point(self, enabled):
+        """ Report integer millivolts instead of float volts. """
+        self.fixed_point = enabled
+
+    def set_oversampling(self, samples_log2, median=False):
+        """ Oversample the readings, see BurstAdc.oversample. """
+        self.adc = BurstAdc.oversample(self.raw_adc, samples_log2, median)
+
     def register_slot(self, slot):
         """ Register voltage slot
         A callback to provide a new voltage reading.
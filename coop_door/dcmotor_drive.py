@@ -1,51 +1,255 @@
 """ Driver of a DC motor. """
-import logging
-from machine import Pin, PWM # pylint: disable=import-error
+from array import array
+from machine import Pin, PWM, mem32 # pylint: disable=import-error
+from . import log
+from .timer import Timer
 
-logger = logging.getLogger(__name__)
+logger = log.getLogger(__name__)
+
+# RP2040 PWM registers, a slice drives a pair of pins (channels A, B).
+PWM_BASE = 0x40050000
+PWM_SLICE_SIZE = 0x14
+PWM_CC = 0x0c
+PWM_SLICES = 8
+
+def pwm_slice(gpio):
+    """ Return the PWM slice and channel (0 A, 1 B) of a pin. """
+    return (gpio >> 1) % PWM_SLICES, gpio & 1
 
 class Motor():
+    # pylint: disable=too-many-instance-attributes
     """ Drive motor back and forth or stop it.
-    Control the motor voltage via a duty cycle. """
+    Control the motor voltage via a duty cycle.
+    In fixed point the voltage callback returns integer millivolts
+    and the duty cycle is computed in integers.
+    The PWM frequency is set once, a change only writes the duty
+    cycles, and an unchanged direction and duty cycle nothing at
+    all. The off channel goes low before the other one changes.
+    If the two pins are the channels of one PWM slice, the stop
+    brakes both low by a single compare register write.
+    In tracking mode (see set_tracking) the duty cycle follows the
+    voltage readings during a move.
+    With ramps (see set_ramp) go starts, reverses and stops (go(0))
+    the motor along precomputed duty cycle steps, stop cuts it off
+    at once, a ramp in progress included.
+    """
 
     VOLTAGE_NOMINAL_V = 6
     VOLTAGE_MIN_V = 4
     VOLTAGE_MAX_V = 12
     FREQ_HZ = 10000
     DUTY_MAX = 65535
+    # Duty cycle changes smaller than 1 % are not applied,
+    # a reading changes it by 5 % at most.
+    TRACK_HYSTERESIS = 655
+    TRACK_STEP_MAX = 3277
+    # Ramp profiles
+    LINEAR = 0
+    S_CURVE = 1
+    RAMP_STEP_MS = 20
+    # Ramp fractions are 14 bit, a duty cycle change times a
+    # fraction stays a small int (31 bits) on the board.
+    RAMP_SHIFT = 14
+    RAMP_SCALE = 1 << RAMP_SHIFT
     def __init__(self,
                  gpio0, gpio1,
                  gpio_en,
                  voltage_callback):
-        self.drive_value = [False, False]
         self._direction = 0
         pin0 = Pin(gpio0, Pin.OUT)
         pin1 = Pin(gpio1, Pin.OUT)
         self.enable_pin = Pin(gpio_en, Pin.OUT)
         self.drive = [PWM(pin0), PWM(pin1)]
+        for pwm in self.drive:
+            pwm.init(freq=Motor.FREQ_HZ, duty_u16=0)
+        self.brake_register = None
+        slice0, channel0 = pwm_slice(gpio0)
+        slice1, channel1 = pwm_slice(gpio1)
+        if slice0 == slice1 and channel0 != channel1:
+            self.brake_register = PWM_BASE + slice0 * PWM_SLICE_SIZE + PWM_CC
+        # Direction and duty cycle on the outputs, unknown first.
+        self.output_direction = None
+        self.output_duty = 0
         self.voltage_callback = voltage_callback
         self.duty = 0
+        self.fixed_point = False
+        self.voltage_min = Motor.VOLTAGE_MIN_V
+        self.voltage_max = Motor.VOLTAGE_MAX_V
+        self.duty_numerator = Motor.DUTY_MAX * Motor.VOLTAGE_NOMINAL_V * 1000
+        self.tracking = False
+        self.track_hysteresis = Motor.TRACK_HYSTERESIS
+        self.track_step_max = Motor.TRACK_STEP_MAX
+        self.ramp_up = None
+        self.ramp_down = None
+        self.ramp_timer = None
+        self.ramp_duties = None
+        self.ramp_length = 0
+        self.ramp_index = 0
+        self.ramp_channel = None
+        self.is_ramping = False
+
+    def set_fixed_point(self, enabled):
+        """ Take the motor voltage in integer millivolts
+        instead of float volts.
+        """
+        self.fixed_point = enabled
+        scale = 1000 if enabled else 1
+        self.voltage_min = Motor.VOLTAGE_MIN_V * scale
+        self.voltage_max = Motor.VOLTAGE_MAX_V * scale
+
+    @staticmethod
+    def ramp_fractions(profile, steps):
+        """ Return the steps of a ramp profile from 0 to 1 [1/RAMP_SCALE],
+        the first step above 0, the last one exactly 1.
+        """
+        fractions = array('H', [0] * steps)
+        for k in range(1, steps + 1):
+            x = k / steps
+            if profile == Motor.S_CURVE:
+                x = x * x * (3 - 2 * x)
+            fractions[k - 1] = round(x * Motor.RAMP_SCALE)
+        return fractions
+
+    def set_ramp(self, up_ms, down_ms=None, profile=LINEAR):
+        """ Ramp the duty cycle up on start and down on go(0) or
+        reversal in steps of RAMP_STEP_MS along a profile, LINEAR or
+        S_CURVE. down_ms is up_ms unless given, 0 does not ramp.
+        The steps are on a timer, each of them a single duty cycle
+        write.
+        """
+        if down_ms is None:
+            down_ms = up_ms
+        up_steps = up_ms // Motor.RAMP_STEP_MS
+        down_steps = down_ms // Motor.RAMP_STEP_MS
+        self.ramp_up = Motor.ramp_fractions(profile, up_steps) if up_steps else None
+        self.ramp_down = Motor.ramp_fractions(profile, down_steps) if down_steps else None
+        self.ramp_duties = array('H', [0] * max(up_steps, down_steps, 1))
+        if self.ramp_timer is None:
+            self.ramp_timer = Timer(Motor.RAMP_STEP_MS, self._ramp_step)
+
+    def set_tracking(self, enabled, hysteresis=TRACK_HYSTERESIS, step_max=TRACK_STEP_MAX):
+        """ Follow the voltage readings passed to track during a move.
+        The duty cycle moves towards the one of the reading by at most
+        step_max, unless they differ by hysteresis or less [duty_u16].
+        """
+        self.tracking = enabled
+        self.track_hysteresis = hysteresis
+        self.track_step_max = step_max
+
+    def track(self, v):
+        """ Take a voltage reading, same units as the voltage callback.
+        In tracking mode a running motor keeps its effective voltage,
+        the motor stops if the voltage leaves the window.
+        """
+        if not self.tracking or self._direction == 0:
+            return
+        if not self._is_voltage_ok(v):
+            logger.warning('Motor voltage %s out of range, stopping', v)
+            self.stop()
+            return
+        if self.is_ramping:
+            return
+        delta = self._v_to_duty(v) - self.duty
+        if -self.track_hysteresis <= delta <= self.track_hysteresis:
+            return
+        if delta > self.track_step_max:
+            delta = self.track_step_max
+        elif delta < -self.track_step_max:
+            delta = -self.track_step_max
+        self.duty += delta
+        self._drive()
 
     def _drive(self):
-        self.enable_pin.value(self._direction != 0)
-        if self._direction > 0:
-            self.drive[0].init(freq=Motor.FREQ_HZ,
-                               duty_u16=self.duty)
-            self.drive[1].init(freq=Motor.FREQ_HZ, duty_u16=0)
-        elif self._direction < 0:
-            self.drive[0].init(freq=Motor.FREQ_HZ, duty_u16=0)
-            self.drive[1].init(freq=Motor.FREQ_HZ,
-                               duty_u16=self.duty)
+        if self.is_ramping:
+            self._stop_ramp()
+        direction = self._direction
+        self._output(direction, self.duty if direction else 0)
+
+    def _output(self, direction, duty):
+        if direction == self.output_direction:
+            if duty == self.output_duty:
+                return
         else:
-            self.drive[0].init(freq=Motor.FREQ_HZ, duty_u16=0)
-            self.drive[1].init(freq=Motor.FREQ_HZ, duty_u16=0)
+            self.enable_pin.value(direction != 0)
+        self.output_direction = direction
+        self.output_duty = duty
+        if direction > 0:
+            self.drive[1].duty_u16(0)
+            self.drive[0].duty_u16(duty)
+        elif direction < 0:
+            self.drive[0].duty_u16(0)
+            self.drive[1].duty_u16(duty)
+        elif self.brake_register is not None:
+            mem32[self.brake_register] = 0
+        else:
+            self.drive[0].duty_u16(0)
+            self.drive[1].duty_u16(0)
+
+    def _ramp_to(self, direction):
+        output_direction = self.output_direction or 0
+        if output_direction not in (0, direction) and self.ramp_down is not None:
+            if not (self.is_ramping and self.ramp_duties[self.ramp_length - 1] == 0):
+                self._start_ramp(self.ramp_down, output_direction, 0)
+            return
+        if direction == 0:
+            self._drive()
+            return
+        start_duty = self.output_duty if output_direction == direction else 0
+        if self.is_ramping and output_direction == direction\
+           and self.ramp_duties[self.ramp_length - 1] == self.duty:
+            return
+        if self.ramp_up is None or start_duty == self.duty:
+            self._drive()
+            return
+        self._output(direction, start_duty)
+        self._start_ramp(self.ramp_up, direction, self.duty)
+
+    def _start_ramp(self, fractions, direction, end_duty):
+        start_duty = self.output_duty
+        duties = self.ramp_duties
+        for k, fraction in enumerate(fractions):
+            duties[k] = start_duty + ((end_duty - start_duty) * fraction >> Motor.RAMP_SHIFT)
+        self.ramp_length = len(fractions)
+        self.ramp_index = 0
+        self.ramp_channel = self.drive[0] if direction > 0 else self.drive[1]
+        if not self.is_ramping:
+            self.is_ramping = True
+            self.ramp_timer.start()
+        self._ramp_step()
+
+    def _ramp_step(self):
+        if not self.is_ramping:
+            # Stopped meanwhile, expired in the same timer tick.
+            return
+        i = self.ramp_index
+        duty = self.ramp_duties[i]
+        self.ramp_channel.duty_u16(duty)
+        self.output_duty = duty
+        i += 1
+        if i < self.ramp_length:
+            self.ramp_index = i
+            return
+        self._stop_ramp()
+        if duty == 0:
+            # Ramped down, brake, or ramp up the other way.
+            self._output(0, 0)
+            if self._direction:
+                self._ramp_to(self._direction)
+
+    def _stop_ramp(self):
+        self.ramp_timer.stop()
+        self.is_ramping = False
 
     def _is_voltage_ok(self, v):
         return v is not None and \
-            Motor.VOLTAGE_MIN_V <= v <= Motor.VOLTAGE_MAX_V
+            self.voltage_min <= v <= self.voltage_max
 
     def _v_to_duty(self, volts):
-        duty = round(Motor.DUTY_MAX * Motor.VOLTAGE_NOMINAL_V / volts)
+        if self.fixed_point:
+            # volts are millivolts here
+            duty = (self.duty_numerator + (volts >> 1)) // volts
+        else:
+            duty = round(Motor.DUTY_MAX * Motor.VOLTAGE_NOMINAL_V / volts)
         duty = min(duty, Motor.DUTY_MAX)
         return duty
 
@@ -53,16 +257,19 @@ class Motor():
         """ Run the motor in a given direction (+/-1) """
         self._direction = direction
         v = self.voltage_callback()
-        logger.debug('v = %f V', v)
+        logger.debug('v = %s %s', v, 'mV' if self.fixed_point else 'V')
         if not self._is_voltage_ok(v):
             self.stop()
             return
         self.duty = self._v_to_duty(v)
         logger.debug('duty = %d', self.duty)
-        self._drive()
+        if self.ramp_timer is None:
+            self._drive()
+        else:
+            self._ramp_to(direction)
 
     def stop(self):
-        """ Stop the motor. """
+        """ Stop the motor at once. """
         self._direction = 0
         self._drive()
 
@@ -1,18 +1,84 @@
 """ Control coop door. Close it in dark, open it in light. """
-import logging
 from machine import PWM, Pin, freq # pylint: disable=import-error
+from . import log
 from .dcmotor_drive import Motor
 from .light_sensor import LightSensor
 from .end_switch import EndSwitch
-from .state_machine import StateMachine, State, Signal, Choice
+from .state_machine import State, Signal, SignalFamily, Choice, MachineScheduler, Graph, Timeout
 from .timer import Timer
+from .ticks import ticks_ms, ticks_us, ticks_diff
 from .battery_voltage_sensor import BatteryVoltageSensor
-
-logger = logging.getLogger(__name__)
+from .trace import Recorder
+
+logger = log.getLogger(__name__)
+
+# @startuml{door_move_controller.png}
+# [*] --> idle
+# idle --> active : start_request
+# active --> idle : stop_request
+# state active {
+#   state is_stop_switch_on <<choice>>
+#   [*] --> is_stop_switch_on
+#   is_stop_switch_on --> end : [stop sw on]
+#   is_stop_switch_on --> drive_to_end : [stop sw off]
+#   state drive_to_end {
+#      state is_start_switch_on <<choice>>
+#      state is_max_trials <<choice>>
+#      [*] --> is_start_switch_on
+#      is_start_switch_on --> wait_start_sw_off : [start sw on]
+#      is_start_switch_on --> go : [start sw off]
+#      wait_start_sw_off --> is_max_trials : timeout / ++trials, dir = -dir
+#      is_max_trials --> wait_start_sw_off : [trials <= max]
+#      is_max_trials --> end : [trials > max] : report error
+#      wait_start_sw_off : entry : motor.go(dir)
+#      wait_start_sw_off --> go : start sw off
+#      go : entry : motor.go(dir)
+#      drive_to_end : entry : trials = 0
+#      go --> end : timeout : report error
+#   }
+#   drive_to_end --> end : stop sw on
+#   end : entry : motor.stop() (ramp down unless at the stop switch), report finished
+# }
+# @enduml
+MOVE_GRAPH = Graph(
+    'DoorMoveControllerStateMachine',
+    states=(('idle', None, State),
+            ('active', None, State),
+            ('is_stop_switch_on', 'active', Choice),
+            ('drive_to_end', 'active', State),
+            ('end', 'active', State),
+            ('is_start_switch_on', 'drive_to_end', Choice),
+            ('wait_start_sw_off', 'drive_to_end', State),
+            ('go', 'drive_to_end', State),
+            ('is_trials_max', 'drive_to_end', Choice)),
+    initial=((None, 'idle'),
+             ('active', 'is_stop_switch_on'),
+             ('drive_to_end', 'is_start_switch_on')),
+    transitions=(
+        ('idle', 'start_request', 'active', None, None),
+        ('active', 'stop_request', 'idle', None, None),
+        ('is_stop_switch_on', None, 'end', '_is_stop_switch_on', None),
+        ('is_stop_switch_on', None, 'drive_to_end', '_is_stop_switch_off', None),
+        ('drive_to_end', 'stop_switch_on', 'end', None, None),
+        ('is_start_switch_on', None, 'wait_start_sw_off', '_is_start_switch_on', None),
+        ('is_start_switch_on', None, 'go', '_is_start_switch_off', None),
+        ('wait_start_sw_off', Timeout('DETACH_FROM_END_TIMEOUT_MS'), 'is_trials_max',
+         None, '_detach_timed_out'),
+        ('is_trials_max', None, 'wait_start_sw_off', '_is_trial_left', None),
+        ('is_trials_max', None, 'end', '_is_out_of_trials', '_detach_failed'),
+        ('wait_start_sw_off', 'start_switch_off', 'go', None, None),
+        ('go', Timeout('drive_timeout_ms'), 'end', None, '_drive_timed_out')),
+    actions=(('end', '_end_entry', None),
+             ('drive_to_end', '_clear_detach_trials', None),
+             ('wait_start_sw_off', '_go', None),
+             ('go', '_go', None)))
 
 class DoorMoveController():
     # pylint: disable=too-many-instance-attributes
-    """ Control the motor on the way to the end stop. """
+    """ Control the motor on the way to the end stop.
+    The stop switch stops the motor at once, a timed out or failed
+    move ramps it down (go(0), see Motor.set_ramp).
+    """
     DETACH_FROM_END_TIMEOUT_MS = 2000
     DETACH_TRIAL_MAX = 4
     def __init__(self, end_sw, motor,
@@ -23,90 +89,69 @@ class DoorMoveController():
         self.default_direction = direction
         self.direction = direction
         self.detach_trials = 0
+        self.detach_trials_total = 0
+        self.failures = 0
+        self.is_soft_stop = False
         self.finish_slots = []
         self.drive_timeout_ms = drive_timeout_ms
 
-        # @startuml{door_move_controller.png}
-        # [*] --> idle
-        # idle --> active : start_request
-        # active --> idle : stop_request
-        # state active {
-        #   state is_stop_switch_on <<choice>>
-        #   [*] --> is_stop_switch_on
-        #   is_stop_switch_on --> end : [stop sw on]
-        #   is_stop_switch_on --> drive_to_end : [stop sw off]
-        #   state drive_to_end {
-        #      state is_start_switch_on <<choice>>
-        #      state is_max_trials <<choice>>
-        #      [*] --> is_start_switch_on
-        #      is_start_switch_on --> wait_start_sw_off : [start sw on]
-        #      is_start_switch_on --> go : [start sw off]
-        #      wait_start_sw_off --> is_max_trials : timeout / ++trials, dir = -dir
-        #      is_max_trials --> wait_start_sw_off : [trials <= max]
-        #      is_max_trials --> end : [trials > max] : report error
-        #      wait_start_sw_off : entry : motor.go(dir)
-        #      wait_start_sw_off --> go : start sw off
-        #      go : entry : motor.go(dir)
-        #      drive_to_end : entry : trials = 0
-        #      go --> end : timeout : report error
-        #   }
-        #   drive_to_end --> end : stop sw on
-        #   end : entry : motor.stop(), report finished
-        # }
-        # @enduml
-        self.start_switch_on = Signal('start_switch_on')
-        self.start_switch_off = Signal('start_switch_off')
-        self.stop_switch_off = Signal('stop_switch_off')
-        self.stop_switch_on = Signal('stop_switch_on')
+        # Only the latest start switch state matters. Reaching the
+        # stop switch stops the motor, it goes first and is never
+        # replaced by the switch going off again.
+        start_switch = SignalFamily()
+        self.start_switch_on = Signal('start_switch_on', family=start_switch)
+        self.start_switch_off = Signal('start_switch_off', family=start_switch)
+        self.stop_switch_off = Signal('stop_switch_off', family=SignalFamily())
+        self.stop_switch_on = Signal('stop_switch_on', Signal.URGENT, SignalFamily())
         self.start_request = Signal('start_request')
         self.stop_request = Signal('stop_request')
 
-        self.state_machine = StateMachine('DoorMoveControllerStateMachine')
-
-        idle = State('idle', self.state_machine)
-        self.state_machine.set_init_state(idle)
-        active = State('active', self.state_machine)
-        idle.on_signal(self.start_request).go_to(active)
-        active.on_signal(self.stop_request).go_to(idle)
-        is_stop_switch_on = Choice('is_stop_switch_on', active)
-        active.set_init_state(is_stop_switch_on)
-        drive_to_end = State('drive_to_end', active)
-        end = State('end', active)
-        is_start_switch_on = Choice('is_start_switch_on', drive_to_end)
-        wait_start_sw_off = State('wait_start_sw_off', drive_to_end)
-        go = State('go', drive_to_end)
-        is_trials_max = Choice('is_trials_max', drive_to_end)
-
-        is_stop_switch_on.go_to_if(end, self.stop_switch.is_on)
-        is_stop_switch_on.go_to_if(drive_to_end, lambda:not self.stop_switch.is_on())
-        end.do_on_entry(self._end_entry)
-        drive_to_end.on_signal(self.stop_switch_on).go_to(end)
-        drive_to_end.set_init_state(is_start_switch_on)
-        drive_to_end.do_on_entry(self._clear_detach_trials)
-        is_start_switch_on.go_to_if(wait_start_sw_off, self.start_switch.is_on)
-        is_start_switch_on.go_to_if(go, lambda:not self.start_switch.is_on())
-        wait_start_sw_off.do_on_entry(lambda:self.motor.go(self.direction))
-        wait_start_sw_off.on_timeout(DoorMoveController.DETACH_FROM_END_TIMEOUT_MS)\
-            .go_to(is_trials_max).do(lambda:[self._inc_detach_trials(), self._reverse_direction()])
-        is_trials_max.go_to_if(
-            wait_start_sw_off,
-            lambda:self.detach_trials <= DoorMoveController.DETACH_TRIAL_MAX)
-        is_trials_max.go_to_if(
-            end,
-            lambda:self.detach_trials > DoorMoveController.DETACH_TRIAL_MAX)\
-                     .do(lambda:[self._reset_direction(),
-                                 logger.debug('Maximum end-detach trials reached.')])
-        wait_start_sw_off.on_signal(self.start_switch_off).go_to(go)
-        go.do_on_entry(lambda:self.motor.go(self.direction))
-        go.on_timeout(self.drive_timeout_ms)\
-          .do(lambda:logger.debug('Failed to close/open the door in time.'))\
-          .go_to(end)
-
+        self.state_machine = MOVE_GRAPH.instantiate(self)
         self.state_machine.start()
 
+    def _is_stop_switch_on(self):
+        return self.stop_switch.is_on()
+
+    def _is_stop_switch_off(self):
+        return not self.stop_switch.is_on()
+
+    def _is_start_switch_on(self):
+        return self.start_switch.is_on()
+
+    def _is_start_switch_off(self):
+        return not self.start_switch.is_on()
+
+    def _is_trial_left(self):
+        return self.detach_trials <= DoorMoveController.DETACH_TRIAL_MAX
+
+    def _is_out_of_trials(self):
+        return self.detach_trials > DoorMoveController.DETACH_TRIAL_MAX
+
+    def _go(self):
+        self.motor.go(self.direction)
+
+    def _detach_timed_out(self):
+        self._inc_detach_trials()
+        self._reverse_direction()
+
+    def _detach_failed(self):
+        self._reset_direction()
+        self._fail()
+        self.is_soft_stop = True
+        logger.debug('Maximum end-detach trials reached.')
+
+    def _drive_timed_out(self):
+        self._fail()
+        self.is_soft_stop = True
+        logger.debug('Failed to close/open the door in time.')
+
     def _end_entry(self):
         logger.debug('stopping motor')
-        self.motor.stop()
+        if self.is_soft_stop:
+            self.is_soft_stop = False
+            self.motor.go(0)
+        else:
+            self.motor.stop()
         self._report_finished()
 
     def _report_finished(self):
@@ -115,6 +160,10 @@ class DoorMoveController():
 
     def _inc_detach_trials(self):
         self.detach_trials += 1
+        self.detach_trials_total += 1
+
+    def _fail(self):
+        self.failures += 1
 
     def _clear_detach_trials(self):
         self.detach_trials = 0
@@ -149,133 +198,274 @@ class DoorMoveController():
         logger.debug('stop')
         self.state_machine.send_signal(self.stop_request)
 
+    def failure_count(self):
+        """ Return the number of moves that failed to reach the
+        end stop, in time or off the start end stop.
+        """
+        return self.failures
+
+    def detach_trial_count(self):
+        """ Return the number of end-detach trials of all moves. """
+        return self.detach_trials_total
+
     def register_finish_slot(self, slot):
         """ Register finished slot.
         Slot is called when the controller stops.
         """
         self.finish_slots.append(slot)
 
+# @startuml{door_controller.png}
+# state start
+# [*] --> start
+# start --> day : light
+# start --> night : dark
+# day --> night : dark
+# state day {
+#    state "finish" as finish_day
+#    [*] --> open_door
+#    open_door : entry: start motor_control
+#    open_door : exit : stop motor_control
+#    open_door --> finish_day : finished
+#    finish_day : entry : sleep, slow wake-up
+#    finish_day : exit : fast wake-up
+# }
+# night --> day : light
+# state night {
+#    state "finish" as finish_night
+#    [*] --> close_door
+#    close_door : entry : start motor_control
+#    close_door : exit : stop motor_control
+#    close_door --> finish_night : finished
+#    finish_night : entry : sleep, slow wake-up
+#    finish_night : exit : fast wake-up
+# }
+# @enduml
+CONTROLLER_GRAPH = Graph(
+    'DoorControllerStateMachine',
+    states=(('start', None, State),
+            ('day', None, State),
+            ('open_door', 'day', State),
+            ('finish_day', 'day', State),
+            ('night', None, State),
+            ('close_door', 'night', State),
+            ('finish_night', 'night', State)),
+    initial=((None, 'start'),
+             ('day', 'open_door'),
+             ('night', 'close_door')),
+    transitions=(
+        ('start', 'light', 'day', None, None),
+        ('day', 'dark', 'night', None, None),
+        ('open_door', 'finished', 'finish_day', None, None),
+        ('start', 'dark', 'night', None, None),
+        ('night', 'light', 'day', None, None),
+        ('close_door', 'finished', 'finish_night', None, None)),
+    actions=(('start', '_start_entry', '_start_exit'),
+             ('open_door', '_open_door_entry', '_open_door_exit'),
+             ('finish_day', '_finish_entry', '_finish_exit'),
+             ('close_door', '_close_door_entry', '_close_door_exit'),
+             ('finish_night', '_finish_entry', '_finish_exit')))
+
 class DoorController():
     # pylint: disable=too-many-instance-attributes
     """ The door controller.
     Open close the door using a dc motor based on open/close
     end stop switches and a signal from a light sensor.
+    With lazy init (see use_lazy_init) only the light sensor is set
+    up on construction, the time to the first day/night decision
+    is what the board pays on every power-up by the sleep circuit.
+    The battery voltage sensor and the end switches are created on
+    the first wake-up and settle while the light sensor does, the
+    motor and the move controllers on the first move, the sleep pin
+    on the first sleep. Until then the pins keep their reset state,
+    inputs pulled down.
     """
+    WAKEUP_BUDGET_US = 20000
+    MOTOR_RAMP_UP_MS = 300
+    MOTOR_RAMP_DOWN_MS = 200
+    IDLE_WAKE_UP_PERIOD_MS = 60000
+    # The shortest period the hardware timer takes.
+    KICK_WAKE_UP_MS = 1
+    ADC_OVERSAMPLING_LOG2 = 4
+    lazy_init = False
     def __init__(self, wake_up_period_ms=100,
-                 door_move_timeout_ms=30000):
-        motor = Motor(8, 9, 14, self.motor_voltage)
+                 door_move_timeout_ms=30000,
+                 idle_wake_up_period_ms=IDLE_WAKE_UP_PERIOD_MS,
+                 wakeup_budget_us=WAKEUP_BUDGET_US):
+        self.created_us = ticks_us()
+        self.decision_us = None
+        # Peripheral clocks derive from the system clock, set it first.
+        freq(48000000)
+        # The light sensor takes the longest to settle, wake it up first.
         self.light_sensor = LightSensor(27, 28)
+        self.light_sensor.set_oversampling(DoorController.ADC_OVERSAMPLING_LOG2, median=True)
+        # Repeating the condition does nothing in any state, only
+        # changes are signalled.
+        self.light_sensor.set_change_only(True)
         self.light_sensor.wakeup()
-        open_switch = EndSwitch(7)
-        close_switch = EndSwitch(6)
         self.light_sensor.register_light_slot(self.light_slot)
-        open_switch.register_slot(self.open_switch_slot)
-        close_switch.register_slot(self.close_switch_slot)
-        self.drive_open_controller = DoorMoveController({'start' : close_switch,
-                                                         'stop' : open_switch},
-                                                        motor,
-                                                        -1,
-                                                        door_move_timeout_ms)
-        self.drive_close_controller = DoorMoveController({'start' : open_switch,
-                                                          'stop' : close_switch},
-                                                         motor,
-                                                         +1,
-                                                         door_move_timeout_ms)
-        self.sleep_pin = Pin(18, Pin.OUT)
-        self.sleep_pin.value(0)
-        self.voltage_sensor = BatteryVoltageSensor(26)
-        self.voltage_sensor.register_slot(self.battery_voltage_slot)
-        self.battery_voltage_v = None
+        self.door_move_timeout_ms = door_move_timeout_ms
+        self.battery_voltage_mv = None
+        self.voltage_sensor = None
+        self.motor = None
+        self.open_switch = None
+        self.close_switch = None
+        self.drive_open_controller = None
+        self.drive_close_controller = None
+        self.sleep_pin = None
+        self.recorder = Recorder.instance
+
+        # Repeats are coalesced, a change of the light is not.
+        self.light = Signal('light', family=SignalFamily())
+        self.dark = Signal('dark', family=SignalFamily())
+        self.finished = Signal('finished')
+        self.state_machine = CONTROLLER_GRAPH.instantiate(self)
+
+        # Wake up fast while the door moves, slow down once it is
+        # finished. Any signal queued outside of a wake-up (end switch,
+        # state timeout) wakes the controller up at once, the wake-up
+        # brings the fast period back.
+        self.wake_up_period_ms = wake_up_period_ms
+        self.idle_wake_up_period_ms = idle_wake_up_period_ms
+        self.is_idle = False
+        self.is_awake = False
+        # A wake-up leaves the rest of the signals to the next one
+        # after this much time [us], None lets it handle them all.
+        self.wakeup_budget_us = wakeup_budget_us
+        self.timer = Timer(wake_up_period_ms, self._wakeup)
 
-        freq(48000000)
+        # Move controllers are put first once created, they stop the motor.
+        self.scheduler = MachineScheduler([self.state_machine])
+        self.state_machine.register_signal_slot(self._kick)
 
-        # State Machine
-        # @startuml{door_controller.png}
-        # state start
-        # [*] --> start
-        # start --> day : light
-        # start --> night : dark
-        # day --> night : dark
-        # state day {
-        #    state "finish" as finish_day
-        #    [*] --> open_door
-        #    open_door : entry: start motor_control
-        #    open_door : exit : stop motor_control
-        #    open_door --> finish_day : finished
-        #    finish_day : entry : sleep
-        # }
-        # night --> day : light
-        # state night {
-        #    state "finish" as finish_night
-        #    [*] --> close_door
-        #    close_door : entry : start motor_control
-        #    close_door : exit : stop motor_control
-        #    close_door --> finish_night : finished
-        #    finish_night : entry : sleep
-        # }
-        # @enduml
-        self.state_machine = StateMachine('DoorControllerStateMachine')
-        start = State('start', self.state_machine)
-        self.state_machine.set_init_state(start)
-
-        day = State('day', self.state_machine)
-        open_door = State('open_door', day)
-        finish_day = State('finish_day', day)
-        day.set_init_state(open_door)
-
-        night = State('night', self.state_machine)
-        close_door = State('close_door', night)
-        finish_night = State('finish_night', night)
-        night.set_init_state(close_door)
-
-        self.light = Signal('light')
-        self.dark = Signal('dark')
-        self.finished = Signal('finished')
+        if not DoorController.lazy_init:
+            self._create_inputs()
+            self._create_drive()
+            self._create_sleep_pin()
 
-        self.timer = Timer(wake_up_period_ms, self._wakeup)
+    @staticmethod
+    def use_lazy_init(enabled):
+        """ Create the peripherals of controllers created from
+        now on when they are first needed, not on construction.
+        """
+        DoorController.lazy_init = enabled
 
-        start.do_on_entry(lambda:( self.timer.start(), logger.info('Starting door controller')))
-        start.on_signal(self.light).go_to(day)
-        day.on_signal(self.dark).go_to(night)
-        open_door.on_signal(self.finished).go_to(finish_day)
-        open_door.do_on_entry(self.drive_open_controller.start)
-        open_door.do_on_exit(self.drive_open_controller.stop)
-        finish_day.do_on_entry(self._sleep)
-
-        start.on_signal(self.dark).go_to(night)
-        night.on_signal(self.light).go_to(day)
-        close_door.on_signal(self.finished).go_to(finish_night)
-        close_door.do_on_entry(self.drive_close_controller.start)
-        close_door.do_on_exit(self.drive_close_controller.stop)
-        finish_night.do_on_entry(self._sleep)
+    def _create_inputs(self):
+        self.open_switch = EndSwitch(7)
+        self.close_switch = EndSwitch(6)
+        self.open_switch.register_slot(self.open_switch_slot)
+        self.close_switch.register_slot(self.close_switch_slot)
+        self.voltage_sensor = BatteryVoltageSensor(26)
+        self.voltage_sensor.set_oversampling(DoorController.ADC_OVERSAMPLING_LOG2)
+        self.voltage_sensor.set_fixed_point(True)
+        self.voltage_sensor.register_slot(self.battery_voltage_slot)
 
+    def _create_drive(self):
+        if self.open_switch is None:
+            self._create_inputs()
+        self.motor = Motor(8, 9, 14, self.motor_voltage)
+        self.motor.set_fixed_point(True)
+        # Keep the motor voltage as the battery sags under load.
+        self.motor.set_tracking(True)
+        # No inrush current on start and reversal, a failed move
+        # ramps down, the end stop stops the motor at once.
+        self.motor.set_ramp(DoorController.MOTOR_RAMP_UP_MS, DoorController.MOTOR_RAMP_DOWN_MS,
+                            Motor.S_CURVE)
+        self.drive_open_controller = DoorMoveController({'start' : self.close_switch,
+                                                         'stop' : self.open_switch},
+                                                        self.motor,
+                                                        -1,
+                                                        self.door_move_timeout_ms)
+        self.drive_close_controller = DoorMoveController({'start' : self.open_switch,
+                                                          'stop' : self.close_switch},
+                                                         self.motor,
+                                                         +1,
+                                                         self.door_move_timeout_ms)
         self.drive_close_controller.register_finish_slot(
             lambda:self.state_machine.send_signal(self.finished))
         self.drive_open_controller.register_finish_slot(
             lambda:self.state_machine.send_signal(self.finished))
+        for machine in (self.drive_close_controller.state_machine,
+                        self.drive_open_controller.state_machine):
+            self.scheduler.insert(0, machine)
+            machine.register_signal_slot(self._kick)
+
+    def _create_sleep_pin(self):
+        self.sleep_pin = Pin(18, Pin.OUT)
+        self.sleep_pin.value(0)
+
+    def _start_entry(self):
+        self.timer.start()
+        logger.info('Starting door controller')
+
+    def _start_exit(self):
+        # Left on the first day/night decision.
+        self.decision_us = ticks_diff(ticks_us(), self.created_us)
+        logger.info('First decision %d ms after start-up, %d us after construction',
+                    ticks_ms(), self.decision_us)
+
+    def _open_door_entry(self):
+        if self.drive_open_controller is None:
+            self._create_drive()
+        self.drive_open_controller.start()
+
+    def _open_door_exit(self):
+        self.drive_open_controller.stop()
+
+    def _close_door_entry(self):
+        if self.drive_close_controller is None:
+            self._create_drive()
+        self.drive_close_controller.start()
+
+    def _close_door_exit(self):
+        self.drive_close_controller.stop()
 
     def _sleep(self):
+        if self.sleep_pin is None:
+            self._create_sleep_pin()
+        # Nothing happens till the next wake-up, write the log out now,
+        # the first sleep pulse may cut the power.
+        log.flush()
+        if self.recorder is not None:
+            self.recorder.flush()
         # Do PWM on sleep pin for the sleep circuit not to miss it. It detects
         # the rising edge, minimum pulse width is 100ns.
         PWM(self.sleep_pin, freq=100, duty_u16=round(0.5*0xFFFF))
 
+    def _finish_entry(self):
+        self._sleep()
+        self.is_idle = True
+
+    def _finish_exit(self):
+        self.is_idle = False
+
+    def _set_wake_up_period(self, period_ms):
+        if self.timer.timeout_ms != period_ms:
+            self.timer.set_timeout(period_ms)
+            self.timer.start()
+
+    def _kick(self):
+        # Signals queued during a wake-up are handled by it.
+        if not self.is_awake:
+            self._set_wake_up_period(DoorController.KICK_WAKE_UP_MS)
+
     def _wakeup(self):
+        self.is_awake = True
+        if self.voltage_sensor is None:
+            self._create_inputs()
         self.light_sensor.read()
         self.voltage_sensor.read()
-        self.drive_open_controller.state_machine.process_signal()
-        self.drive_close_controller.state_machine.process_signal()
-        self.state_machine.process_signal()
+        self.scheduler.run(self.wakeup_budget_us)
+        if self.is_idle and not self.scheduler.anything_to_do():
+            self._set_wake_up_period(self.idle_wake_up_period_ms)
+        else:
+            self._set_wake_up_period(self.wake_up_period_ms)
+        if self.recorder is not None:
+            self.recorder.flush_blocks()
+        self.is_awake = False
 
     def do_all(self):
         """ Handle all signals accumulated so far. """
-        anything_to_do = True
-        while anything_to_do:
-            self.drive_open_controller.state_machine.process_signal()
-            self.drive_close_controller.state_machine.process_signal()
-            self.state_machine.process_signal()
-            anything_to_do = self.drive_open_controller.state_machine.anything_to_do()\
-                or self.drive_close_controller.state_machine.anything_to_do()\
-                or self.state_machine.anything_to_do()
+        self.scheduler.run()
 
     def light_slot(self, is_light):
         """ Slot called on light condition change. """
@@ -287,22 +477,39 @@ class DoorController():
     def open_switch_slot(self, is_on):
         """ Slot called on open end stop switch state change. """
         logger.debug('open switch = %s', is_on)
-        self.drive_open_controller.stop_switch_slot(is_on)
-        self.drive_close_controller.start_switch_slot(is_on)
+        self._end_switch_changed(is_on, self.drive_open_controller, self.drive_close_controller)
 
     def close_switch_slot(self, is_on):
         """ Slot called on close end stop switch state change. """
         logger.debug('close switch = %s', is_on)
-        self.drive_open_controller.start_switch_slot(is_on)
-        self.drive_close_controller.stop_switch_slot(is_on)
+        self._end_switch_changed(is_on, self.drive_close_controller, self.drive_open_controller)
+
+    @staticmethod
+    def _end_switch_changed(is_on, stopped, started):
+        """ Pass an end switch change to the move it stops and to the
+        move it starts.
+        """
+        if stopped is None:
+            # Not moving yet, a move reads the switches on start.
+            return
+        stopped.stop_switch_slot(is_on)
+        started.start_switch_slot(is_on)
 
-    def battery_voltage_slot(self, voltage_v):
+    def battery_voltage_slot(self, voltage_mv):
         """ Slot called on battery voltage change. """
-        self.battery_voltage_v = voltage_v
+        self.battery_voltage_mv = voltage_mv
+        if self.motor is not None:
+            self.motor.track(voltage_mv)
 
     def motor_voltage(self):
-        """ Return the latest motor voltage [V]. """
-        return self.battery_voltage_v
+        """ Return the latest motor voltage [mV]. """
+        return self.battery_voltage_mv
+
+    def decision_time_us(self):
+        """ Return the time from the construction to the first
+        day/night decision [us], None before the decision.
+        """
+        return self.decision_us
 
     def start(self):
         """ Start the controller. """
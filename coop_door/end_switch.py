@@ -1,20 +1,55 @@
 """ End switch """
-import logging
+from array import array
 import machine # pylint: disable=import-error
 from machine import Pin # pylint: disable=import-error
+from . import log
+from .irq_dispatcher import IrqDispatcher
+from .ticks import ticks_us
+from .timer import Timer
+from .trace import Recorder, EDGE
 
-logger = logging.getLogger(__name__)
+logger = log.getLogger(__name__)
 
 class EndSwitch:
+    # pylint: disable=too-many-instance-attributes
     """ Read and report end switch state.
     Read the state of a switch hooked up to a gpio pin.
     Call a user slot on switch state change.
+    Edges are debounced: the first edge is reported at once, further
+    edges within debounce_ms are collapsed and the pin is sampled
+    again once the window is over. Edges are time stamped with
+    ticks_us.
+    With an IrqDispatcher in use the interrupt only records the pin
+    level and the edge time in a ring of EDGE_STAMPS entries, slots
+    are called later in thread context with the time of their own
+    edge.
     """
-    def __init__(self, pin_number):
+    DEBOUNCE_MS = 20
+    # As many as the dispatcher buffers, the ring index and the
+    # level fit the 8 bit event value.
+    EDGE_STAMPS = IrqDispatcher.CAPACITY
+    def __init__(self, pin_number, debounce_ms=DEBOUNCE_MS):
         self.pin = Pin(pin_number, Pin.IN, Pin.PULL_UP)
-        self.pin.irq(handler=self._irq_handler, trigger=Pin.IRQ_FALLING | Pin.IRQ_RISING)
+        self.pin_number = pin_number
+        self.recorder = Recorder.instance
         self.last_state = None
         self.slots = []
+        self.settle_timer = None
+        self.is_settling = False
+        if debounce_ms > 0:
+            self.settle_timer = Timer(debounce_ms, self._settled, Timer.SINGLE_SHOT)
+        self.change_us = None
+        self.edges = 0
+        self.changes = 0
+        self.dispatcher = IrqDispatcher.instance
+        if self.dispatcher is not None:
+            self.source = self.dispatcher.register(self._deferred_edge)
+            self.edge_stamps_us = array('l', [0] * EndSwitch.EDGE_STAMPS)
+            self.pin.irq(handler=self._deferred_irq_handler,
+                         trigger=Pin.IRQ_FALLING | Pin.IRQ_RISING)
+        else:
+            self.pin.irq(handler=self._irq_handler,
+                         trigger=Pin.IRQ_FALLING | Pin.IRQ_RISING)
 
     def is_on(self):
         """ Return True if end switch is active (closed). """
@@ -22,17 +57,68 @@ class EndSwitch:
 
     def read(self):
         """ Perform end switch reading. """
-        for slot in self.slots:
-            if self.is_on() is not self.last_state:
-                logger.debug('end switch@%s = %s', self.pin, self.is_on())
-                slot(self.is_on())
-        self.last_state = self.is_on()
+        self._report(self.pin.value())
 
     def register_slot(self, slot):
         """ Register a slot to report switch state change. """
         self.slots.append(slot)
 
+    def edge_count(self):
+        """ Return the number of raw pin edges. """
+        return self.edges
+
+    def change_count(self):
+        """ Return the number of state changes reported to slots. """
+        return self.changes
+
+    def last_change_us(self):
+        """ Return ticks_us of the edge that caused the latest
+        reported change, None if nothing was reported yet.
+        """
+        return self.change_us
+
+    def _report(self, value):
+        is_on = not value
+        if is_on is not self.last_state:
+            self.changes += 1
+            logger.debug('end switch@%d = %s', self.pin_number, is_on)
+            for slot in self.slots:
+                slot(is_on)
+        self.last_state = is_on
+
+    def _edge(self, value, edge_us):
+        if self.recorder is not None:
+            self.recorder.record(EDGE, self.pin_number, value)
+        if self.is_settling:
+            # Bouncing, the settle timer samples the pin later.
+            return
+        if (not value) is not self.last_state:
+            self._change(value, edge_us)
+
+    def _change(self, value, edge_us):
+        self.change_us = edge_us
+        self._report(value)
+        if self.settle_timer is not None:
+            self.is_settling = True
+            self.settle_timer.start()
+
+    def _settled(self):
+        self.is_settling = False
+        value = self.pin.value()
+        if (not value) is not self.last_state:
+            self._change(value, ticks_us())
+
     def _irq_handler(self, _pin):
         irq_enabled = machine.disable_irq()
-        self.read()
+        self.edges += 1
+        self._edge(self.pin.value(), ticks_us())
         machine.enable_irq(irq_enabled)
+
+    def _deferred_irq_handler(self, _pin):
+        stamp = self.edges % EndSwitch.EDGE_STAMPS
+        self.edges += 1
+        self.edge_stamps_us[stamp] = ticks_us()
+        self.dispatcher.post(self.source, (stamp << 1) | self.pin.value())
+
+    def _deferred_edge(self, value):
+        self._edge(value & 1, self.edge_stamps_us[value >> 1])
@@ -1,5 +1,57 @@
 """ Exponential average digital filter. """
 import math
+from array import array
+
+def _first_nan(out, first, count, step):
+    """ Return n of the first nan of out[first + n * step], n < count,
+    the outputs being nan from it on.
+    """
+    low = 0
+    high = count - 1
+    while low < high:
+        middle = (low + high) // 2
+        if math.isnan(out[first + middle * step]):
+            high = middle
+        else:
+            low = middle + 1
+    return low
+
+def _average(k, y, samples, out, *, first=0, step=1, out_first=0, out_step=1):
+    """ Filter samples[first::step] into out[out_first::out_step]
+    from the output y, as Filter.sample does: a nan output is followed
+    by the next sample. The recurrence runs on locals with no check
+    per sample, a nan sticks in it. Its end is checked once and the
+    first nan is found by bisection.
+    Return the last output.
+    """
+    # pylint: disable=too-many-arguments
+    isnan = math.isnan
+    i = first
+    j = out_first
+    while i < len(samples):
+        xs = iter(samples) if i == 0 and step == 1 else iter(samples[i::step])
+        if isnan(y):
+            # Start over from the first number.
+            for x in xs:
+                y = x
+                out[j] = y
+                i += step
+                j += out_step
+                if not isnan(y):
+                    break
+        run_j = j
+        for x in xs:
+            # y(n) = y(n - 1) + k * (x(n) - y(n - 1))
+            y = y + k * (x - y)
+            out[j] = y
+            j += out_step
+        if not isnan(y):
+            break
+        # A nan came in and stuck, start over after the first one.
+        n = _first_nan(out, run_j, (j - run_j) // out_step, out_step) + 1
+        i += n * step
+        j = run_j + n * out_step
+    return y
 
 class Filter:
     """ Sample and filter a given quantity. """
@@ -23,6 +75,20 @@ class Filter:
             self.y = self.y + self.k * (x - self.y)
         return self.y
 
+    def sample_many(self, samples, out=None):
+        """ Take a sequence of samples and filter them.
+        Same as calling sample for each of them, bit for bit: the
+        recurrence runs in a plain loop on locals, no calls per
+        sample. The outputs go to out, any buffer at least as long
+        as samples (e.g. array('f'), stored values are rounded to the
+        buffer type), or to a new array('d').
+        Return the output buffer.
+        """
+        if out is None:
+            out = array('d', [0.0] * len(samples))
+        self.y = _average(self.k, self.y, samples, out)
+        return out
+
     def set_coefficient(self, k):
         """ Set the filter coefficient.
         The coeffieint range shall be (0, 1].
@@ -41,3 +107,53 @@ class Filter:
         nan is returned.
         """
         self.y = math.nan
+
+class FilterBank:
+    """ Filters of several channels, a coefficient per channel.
+    Channel c gives the same outputs as a Filter with the
+    coefficient coefficients[c] would.
+    """
+    def __init__(self, coefficients):
+        self.k = array('d', coefficients)
+        self.y = array('d', [math.nan] * len(self.k))
+
+    def channels(self):
+        """ Return the number of channels. """
+        return len(self.k)
+
+    def output(self):
+        """ Return the latest outputs of all channels. """
+        return self.y
+
+    def reset(self):
+        """ Reset the memory of all channels. """
+        for c, _y in enumerate(self.y):
+            self.y[c] = math.nan
+
+    def sample_many(self, frames, out=None):
+        """ Filter interleaved frames, one sample per channel:
+        frames[f * channels + c] is sample f of channel c.
+        The outputs are interleaved the same way into out or into
+        a new array('d'). Return the output buffer.
+        """
+        n = len(self.k)
+        if out is None:
+            out = array('d', [0.0] * len(frames))
+        for c in range(n):
+            self.y[c] = _average(self.k[c], self.y[c], frames, out,
+                                 first=c, step=n, out_first=c, out_step=n)
+        return out
+
+    def sample_shared(self, samples, out=None):
+        """ Filter one sequence of samples by every channel, e.g. to
+        compare coefficients. The outputs are interleaved into out or
+        into a new array('d'): out[f * channels + c] is the output of
+        channel c to samples[f]. Return the output buffer.
+        """
+        n = len(self.k)
+        if out is None:
+            out = array('d', [0.0] * (len(samples) * n))
+        for c in range(n):
+            self.y[c] = _average(self.k[c], self.y[c], samples, out,
+                                 out_first=c, out_step=n)
+        return out
@@ -0,0 +1,81 @@
+""" Deferred dispatch of interrupt work to thread context. """
+from .signal_queue import SignalQueue
+
+try:
+    from micropython import schedule # pylint: disable=import-error
+except ImportError:
+    # Host python shim. Scheduled callbacks are kept until
+    # run_scheduled is called, the way the micropython VM runs
+    # them between bytecodes.
+    _scheduled = []
+
+    def schedule(func, arg):
+        """ Queue func(arg) to run later in thread context. """
+        _scheduled.append((func, arg))
+
+    def run_scheduled():
+        """ Run all callbacks queued by schedule. """
+        while _scheduled:
+            func, arg = _scheduled.pop(0)
+            func(arg)
+else:
+    def run_scheduled():
+        """ Scheduled callbacks run on their own on micropython. """
+
+class IrqDispatcher():
+    """ Record interrupt events, handle them later.
+    An interrupt handler only posts a source id and a small value
+    (0 - 255) to a preallocated ring buffer, nothing is allocated.
+    The first post schedules a soft callback that drains the buffer
+    and calls the handler of each source in thread context.
+    Events posted to a full buffer are dropped and counted.
+    """
+    CAPACITY = 32
+    instance = None
+    def __init__(self, capacity=CAPACITY):
+        self.handlers = []
+        self.events = SignalQueue(capacity)
+        self.is_scheduled = False
+        # Bound once, a bound method is an allocation.
+        self._run_ref = self._run
+
+    @staticmethod
+    def use(dispatcher):
+        """ Defer interrupt work of timers and end switches
+        created from now on to the dispatcher. None handles
+        it in the interrupt again.
+        """
+        IrqDispatcher.instance = dispatcher
+
+    def register(self, handler):
+        """ Register an event handler, handler(value).
+        Return the source id to post events with.
+        """
+        self.handlers.append(handler)
+        return len(self.handlers) - 1
+
+    def post(self, source, value=0):
+        """ Record an event, safe to call from an interrupt. """
+        self.events.put((source << 8) | value)
+        if not self.is_scheduled:
+            try:
+                schedule(self._run_ref, None)
+                self.is_scheduled = True
+            except RuntimeError:
+                # Schedule queue full, the next post retries.
+                pass
+
+    def _run(self, _arg):
+        self.is_scheduled = False
+        self.run()
+
+    def run(self):
+        """ Handle all recorded events. """
+        event = self.events.get()
+        while event is not None:
+            self.handlers[event >> 8](event & 0xFF)
+            event = self.events.get()
+
+    def overflow_count(self):
+        """ Return the number of dropped events. """
+        return self.events.overflow_count()
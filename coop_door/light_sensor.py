@@ -1,14 +1,22 @@
 """ Light sensor based on photeresistor. """
-import logging
 from machine import ADC, Pin # pylint: disable=import-error
+from . import log
 from .timer import Timer
+from .adc_burst import BurstAdc
+from .ticks import ticks_ms, ticks_diff
+from .trace import Recorder, LIGHT_ADC
 
-logger = logging.getLogger(__name__)
+logger = log.getLogger(__name__)
 
 class LightSensor():
+    # pylint: disable=too-many-instance-attributes
     """ Read light sensor and report light/dark condition.
     Read the resistance of a photoresistor and when a threshold
     is tripped report light/dark condition via a slot.
+    The resistance thresholds are converted to ADC counts once,
+    a reading is compared in counts without float maths.
+    The slots are called on every reading unless set to change
+    only (see set_change_only).
     """
     R_UP_OHM = 10e3
     R_DARK_OHM = 0.5e6
@@ -19,13 +27,61 @@ class LightSensor():
     def __init__(self, adc_pin_num, en_pin):
         self.slots = []
         adc_pin = Pin(adc_pin_num)
-        self.adc = ADC(adc_pin)
-        self.day_night_threshold_ohm = self.R_LIGHT_OHM
+        self.raw_adc = ADC(adc_pin)
+        self.adc = self.raw_adc
         self._is_day = None
+        self.set_thresholds(self.R_LIGHT_OHM, self.R_HYSTERESIS_OHM)
+        self.filter = None
         self.en_pin = Pin(en_pin, Pin.OUT)
         wakeup_delay_ms = 50 * round(1000 * self.C_F * self.R_UP_OHM * 5 / 50)
         self.wakeup_timer = Timer(wakeup_delay_ms, None, Timer.SINGLE_SHOT)
-        self.r_sensor = None
+        self.adc_sensor = None
+        self.recorder = Recorder.instance
+        self.change_only = False
+        self.dwell_ms = 0
+        self.reported_is_day = None
+        self.change_since_ms = None
+        self.suppressed = 0
+
+    @classmethod
+    def ohm_to_adc(cls, r_ohm):
+        """ Return the ADC count of a sensor resistance.
+        Not truncated, an integer count compares the same with the
+        exact threshold as with its floor.
+        """
+        return r_ohm * cls.ADC_MAX / (r_ohm + cls.R_UP_OHM)
+
+    @classmethod
+    def thresholds_adc(cls, r_light_ohm, r_hysteresis_ohm):
+        """ Return the (day, night) thresholds [ADC counts].
+        Day holds while a reading is at or below the day threshold,
+        night turns to day at or below the night threshold.
+        The divider is monotonic: r <= threshold <=> adc <= threshold count.
+        """
+        return (cls.ohm_to_adc(r_light_ohm + r_hysteresis_ohm),
+                cls.ohm_to_adc(r_light_ohm - r_hysteresis_ohm))
+
+    def set_thresholds(self, r_light_ohm, r_hysteresis_ohm):
+        """ Set the day/night resistance threshold and its hysteresis [Ohm]. """
+        self.day_threshold_adc, self.night_threshold_adc =\
+            self.thresholds_adc(r_light_ohm, r_hysteresis_ohm)
+        if self._is_day is None:
+            self.day_night_threshold_adc = self.ohm_to_adc(r_light_ohm)
+        elif self._is_day:
+            self.day_night_threshold_adc = self.day_threshold_adc
+        else:
+            self.day_night_threshold_adc = self.night_threshold_adc
+
+    def set_filter(self, k):
+        """ Filter the readings by an exponential average of the
+        coefficient k before comparing them, None or 1 does not filter.
+        """
+        if k is None or k >= 1:
+            self.filter = None
+            return
+        # Not imported before needed, the default sensor does not filter.
+        from .filter import Filter # pylint: disable=import-outside-toplevel
+        self.filter = Filter(k)
 
     def read(self):
         """ Return the light intensity in %.
@@ -36,23 +92,71 @@ class LightSensor():
         if self.wakeup_timer.active():
             return
         adc_sensor = self.adc.read_u16()
-        if adc_sensor >= self.ADC_MAX:
-            self.r_sensor = self.R_DARK_OHM
-        else:
-            self.r_sensor = adc_sensor * self.R_UP_OHM / (self.ADC_MAX - adc_sensor)
+        if self.recorder is not None:
+            self.recorder.record(LIGHT_ADC, 0, adc_sensor)
+        if self.filter is not None:
+            adc_sensor = self.filter.sample(adc_sensor)
+        self.adc_sensor = adc_sensor
 
-        self.r_sensor = max(self.r_sensor, 0)
-
-        if self.r_sensor <= self.day_night_threshold_ohm:
+        if adc_sensor <= self.day_night_threshold_adc:
             self._is_day = True
-            self.day_night_threshold_ohm = self.R_LIGHT_OHM + self.R_HYSTERESIS_OHM
+            self.day_night_threshold_adc = self.day_threshold_adc
         else:
             self._is_day = False
-            self.day_night_threshold_ohm = self.R_LIGHT_OHM - self.R_HYSTERESIS_OHM
+            self.day_night_threshold_adc = self.night_threshold_adc
 
+        if self.change_only and not self._is_change():
+            self.suppressed += 1
+            return
         for slot in self.slots:
             slot(self._is_day)
 
+    def _is_change(self):
+        is_day = self._is_day
+        if is_day is self.reported_is_day:
+            self.change_since_ms = None
+            return False
+        if self.reported_is_day is not None and self.dwell_ms:
+            now_ms = ticks_ms()
+            if self.change_since_ms is None:
+                self.change_since_ms = now_ms
+            if ticks_diff(now_ms, self.change_since_ms) < self.dwell_ms:
+                return False
+        self.change_since_ms = None
+        self.reported_is_day = is_day
+        return True
+
+    def resistance_ohm(self):
+        """ Return the latest sensor resistance [Ohm].
+        Converted on request only, e.g. for logging.
+        """
+        if self.adc_sensor is None:
+            return None
+        if self.adc_sensor >= self.ADC_MAX:
+            return self.R_DARK_OHM
+        return max(self.adc_sensor * self.R_UP_OHM / (self.ADC_MAX - self.adc_sensor), 0)
+
+    def set_change_only(self, enabled, dwell_ms=0):
+        """ Call the slots only when the day/night condition changes.
+        The first condition is reported right away, a change once
+        the readings have kept it for dwell_ms. A change going back
+        before then is not reported at all.
+        """
+        self.change_only = enabled
+        self.dwell_ms = dwell_ms
+        self.reported_is_day = None
+        self.change_since_ms = None
+
+    def suppressed_count(self):
+        """ Return the number of readings not reported as they did
+        not change the condition (see set_change_only).
+        """
+        return self.suppressed
+
+    def set_oversampling(self, samples_log2, median=False):
+        """ Oversample the readings, see BurstAdc.oversample. """
+        self.adc = BurstAdc.oversample(self.raw_adc, samples_log2, median)
+
     def wakeup(self):
         """ Sample the sensor.
         Wake up to collect a sensor reading
@@ -0,0 +1,205 @@
+""" Lightweight logging facade.
+Log calls store the level, a time stamp, the logger, the format
+string and up to two arguments in a preallocated binary ring buffer,
+nothing is formatted. Loggers and format strings are stored by their
+index in a table, numbers, bools and None as binary values and
+converted only when dumped, so log calls pass ints (a pin number, not
+the Pin) and strings. Any other argument is converted by str() when
+logged, which allocates, the buffer keeps no reference to it and
+prints the state it had then.
+Records are formatted and passed to the standard logging module
+only when dumped: on a full buffer, on a warning or an error, or on
+an explicit dump() (e.g. before sleep), so handlers like a flash file
+are written in batches. The time of a logging record is the dump
+time, set_time_stamps(True) puts the ticks_ms of the log call before
+the message as '(@<ticks>) ', other messages are passed as logged.
+
+Levels below the module level are dropped in the log call with a
+single branch.
+"""
+import logging
+from array import array
+from .ticks import ticks_ms
+
+DEBUG = logging.DEBUG
+INFO = logging.INFO
+WARNING = logging.WARNING
+ERROR = logging.ERROR
+
+CAPACITY = 64
+_NO_ARG = object()
+
+# Argument kinds
+ABSENT = 0
+INT = 1
+FLOAT = 2
+BOOL = 3
+NONE = 4
+TEXT = 5
+
+class RecordBuffer():
+    # pylint: disable=too-many-instance-attributes
+    """ Ring buffer of unformatted log records. """
+    def __init__(self, capacity=CAPACITY):
+        self.capacity = capacity
+        self.levels = array('B', bytes(capacity))
+        self.times = array('L', [0] * capacity)
+        self.logger_ids = array('H', [0] * capacity)
+        self.format_ids = array('H', [0] * capacity)
+        # Two arguments per record.
+        self.kinds = array('B', bytes(2 * capacity))
+        self.ints = array('l', [0] * (2 * capacity))
+        self.floats = array('d', [0] * (2 * capacity))
+        self.texts = [None] * (2 * capacity)
+        # Loggers and format strings by index.
+        self.table = []
+        self.table_ids = {}
+        self.start = 0
+        self.count = 0
+        self.dumps = 0
+        self.stamped = False
+
+    def _index(self, item):
+        index = self.table_ids.get(item)
+        if index is None:
+            index = len(self.table)
+            self.table.append(item)
+            self.table_ids[item] = index
+        return index
+
+    def _put_arg(self, j, arg):
+        if arg is _NO_ARG:
+            self.kinds[j] = ABSENT
+        elif arg is None:
+            self.kinds[j] = NONE
+        elif arg is True or arg is False:
+            self.kinds[j] = BOOL
+            self.ints[j] = arg
+        elif isinstance(arg, int):
+            try:
+                self.ints[j] = arg
+                self.kinds[j] = INT
+            except OverflowError:
+                self.texts[j] = str(arg)
+                self.kinds[j] = TEXT
+        elif isinstance(arg, float):
+            self.kinds[j] = FLOAT
+            self.floats[j] = arg
+        else:
+            self.kinds[j] = TEXT
+            self.texts[j] = arg if isinstance(arg, str) else str(arg)
+
+    def _arg(self, j):
+        kind = self.kinds[j]
+        if kind == INT:
+            return self.ints[j]
+        if kind == FLOAT:
+            return self.floats[j]
+        if kind == BOOL:
+            return self.ints[j] != 0
+        if kind == NONE:
+            return None
+        text = self.texts[j]
+        self.texts[j] = None
+        return text
+
+    def put(self, record_level, logger, fmt, arg1, arg2):
+        """ Store a record. Return True if the buffer is full. """
+        i = self.start + self.count
+        if i >= self.capacity:
+            i -= self.capacity
+        self.levels[i] = record_level
+        self.times[i] = ticks_ms()
+        self.logger_ids[i] = self._index(logger)
+        self.format_ids[i] = self._index(fmt)
+        self._put_arg(2 * i, arg1)
+        self._put_arg(2 * i + 1, arg2)
+        self.count += 1
+        return self.count == self.capacity
+
+    def dump(self):
+        """ Format all records through the standard logging module. """
+        if self.count:
+            self.dumps += 1
+        while self.count:
+            i = self.start
+            if self.kinds[2 * i] == ABSENT:
+                args = ()
+            elif self.kinds[2 * i + 1] == ABSENT:
+                args = (self._arg(2 * i),)
+            else:
+                args = (self._arg(2 * i), self._arg(2 * i + 1))
+            fmt = self.table[self.format_ids[i]]
+            if self.stamped:
+                self.table[self.logger_ids[i]].log(self.levels[i], '(@%d) ' + fmt,
+                                                   self.times[i], *args)
+            else:
+                self.table[self.logger_ids[i]].log(self.levels[i], fmt, *args)
+            self.start = i + 1 if i + 1 < self.capacity else 0
+            self.count -= 1
+
+_records = RecordBuffer()
+level = DEBUG # pylint: disable=invalid-name
+debug_on = True # pylint: disable=invalid-name
+
+def set_level(new_level):
+    """ Drop records below the level. """
+    global level, debug_on # pylint: disable=global-statement
+    level = new_level
+    debug_on = new_level <= DEBUG
+
+def set_time_stamps(enabled):
+    """ Put the ticks_ms of the log call before dumped messages. """
+    _records.stamped = enabled
+
+def dump():
+    """ Format and emit all buffered records. """
+    _records.dump()
+
+def flush():
+    """ Dump all buffered records and flush the root logger
+    handlers, e.g. a buffered flash log file. Handlers without
+    a flush (micropython-lib's StreamHandler) are skipped.
+    """
+    _records.dump()
+    for handler in logging.getLogger().handlers:
+        handler_flush = getattr(handler, 'flush', None)
+        if handler_flush is not None:
+            handler_flush()
+
+def records():
+    """ Return the record buffer. """
+    return _records
+
+class Logger():
+    """ A named logger of the facade. """
+    def __init__(self, name):
+        self.logger = logging.getLogger(name)
+
+    def _put(self, record_level, fmt, arg1, arg2):
+        if _records.put(record_level, self.logger, fmt, arg1, arg2)\
+           or record_level >= WARNING:
+            _records.dump()
+
+    def debug(self, fmt, arg1=_NO_ARG, arg2=_NO_ARG):
+        """ Record a debug message. """
+        if debug_on:
+            self._put(DEBUG, fmt, arg1, arg2)
+
+    def info(self, fmt, arg1=_NO_ARG, arg2=_NO_ARG):
+        """ Record an info message. """
+        if level <= INFO:
+            self._put(INFO, fmt, arg1, arg2)
+
+    def warning(self, fmt, arg1=_NO_ARG, arg2=_NO_ARG):
+        """ Record a warning and dump the buffer. """
+        if level <= WARNING:
+            self._put(WARNING, fmt, arg1, arg2)
+
+    def error(self, fmt, arg1=_NO_ARG, arg2=_NO_ARG):
+        """ Record an error and dump the buffer. """
+        self._put(ERROR, fmt, arg1, arg2)
+
+def getLogger(name): # pylint: disable=invalid-name
+    """ Return a facade logger, mirrors logging.getLogger. """
+    return Logger(name)
@@ -0,0 +1,110 @@
+""" Buffered, rotating log file on flash. """
+import logging
+import os
+
+class FileSystem():
+    """ The board filesystem, replaceable by a fake one. """
+    @staticmethod
+    def open(name, mode):
+        """ Open a file. """
+        return open(name, mode) # pylint: disable=unspecified-encoding
+
+    @staticmethod
+    def size(name):
+        """ Return the file size, 0 if there is no such file. """
+        try:
+            return os.stat(name)[6]
+        except OSError:
+            return 0
+
+    @staticmethod
+    def rename(old, new):
+        """ Rename a file. """
+        os.rename(old, new)
+
+    @staticmethod
+    def remove(name):
+        """ Remove a file if it exists. """
+        try:
+            os.remove(name)
+        except OSError:
+            pass
+
+class RotatingFlashHandler(logging.Handler):
+    # pylint: disable=too-many-instance-attributes
+    """ Log handler writing flash in blocks.
+    Formatted records are collected in RAM and written to the file
+    a block at a time, the file is opened, appended and closed once
+    per block. Records of level ERROR and up and flush() write the
+    partial block out at once.
+    The log is kept in segments: name, name.1, ... name.(segments-1).
+    A segment that would grow past segment_size is rotated, the
+    oldest one is removed, so the log never takes more than about
+    segments * segment_size of flash.
+    """
+    BLOCK_SIZE = 4096
+    SEGMENT_SIZE = 32 * 1024
+    SEGMENTS = 4
+    def __init__(self, name, block_size=BLOCK_SIZE, segment_size=SEGMENT_SIZE,
+                 segments=SEGMENTS, fs=None):
+        # pylint: disable=too-many-arguments
+        super().__init__()
+        self.name = name
+        self.block_size = block_size
+        self.segment_size = segment_size
+        self.segments = segments
+        self.fs = fs if fs is not None else FileSystem()
+        self.buffer = bytearray()
+        self.segment_bytes = self.fs.size(name)
+        self.writes = 0
+        self.bytes_written = 0
+        self.rotations = 0
+
+    def emit(self, record):
+        """ Buffer a record, write full blocks out. """
+        self.buffer.extend((self.format(record) + '\n').encode())
+        if record.levelno >= logging.ERROR:
+            self.flush()
+        elif len(self.buffer) >= self.block_size:
+            self._write(self.block_size * (len(self.buffer) // self.block_size))
+
+    def flush(self):
+        """ Write all buffered records out. """
+        if self.buffer:
+            self._write(len(self.buffer))
+
+    def close(self):
+        """ Flush and close the handler. """
+        self.flush()
+        super().close()
+
+    def write_count(self):
+        """ Return the number of file writes. """
+        return self.writes
+
+    def byte_count(self):
+        """ Return the number of bytes written. """
+        return self.bytes_written
+
+    def _write(self, length):
+        if self.segment_bytes and self.segment_bytes + length > self.segment_size:
+            self._rotate()
+        data = self.buffer[:length]
+        file = self.fs.open(self.name, 'ab')
+        try:
+            file.write(data)
+        finally:
+            file.close()
+        self.buffer = self.buffer[length:]
+        self.segment_bytes += length
+        self.writes += 1
+        self.bytes_written += length
+
+    def _rotate(self):
+        self.fs.remove(f'{self.name}.{self.segments - 1}')
+        for i in range(self.segments - 2, 0, -1):
+            if self.fs.size(f'{self.name}.{i}'):
+                self.fs.rename(f'{self.name}.{i}', f'{self.name}.{i + 1}')
+        self.fs.rename(self.name, f'{self.name}.1')
+        self.segment_bytes = 0
+        self.rotations += 1
@@ -0,0 +1,81 @@
+""" Fixed capacity ring buffer queue of state machine signals. """
+
+class SignalQueue():
+    """ Single producer, single consumer ring buffer.
+    Storage is allocated once on construction, put and get only
+    move indices, so they do not allocate and put may be called
+    from an interrupt handler. The producer owns the tail index,
+    the consumer owns the head index. A signal put to a full queue
+    is dropped and counted as an overflow.
+    """
+    DEFAULT_CAPACITY = 16
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        assert capacity > 0
+        # One slot is kept empty to tell full from empty
+        # without a shared counter.
+        self.size = capacity + 1
+        self.buffer = [None] * self.size
+        self.head = 0
+        self.tail = 0
+        self.overflows = 0
+        self.max_length = 0
+
+    def put(self, signal):
+        """ Enqueue a signal.
+        Return False if the queue is full and the signal was dropped.
+        """
+        tail = self.tail + 1
+        if tail == self.size:
+            tail = 0
+        if tail == self.head:
+            self.overflows += 1
+            return False
+        self.buffer[self.tail] = signal
+        self.tail = tail
+        length = tail - self.head
+        if length < 0:
+            length += self.size
+        self.max_length = max(self.max_length, length)
+        return True
+
+    def get(self):
+        """ Dequeue the oldest signal.
+        Return None if the queue is empty.
+        """
+        head = self.head
+        if head == self.tail:
+            return None
+        signal = self.buffer[head]
+        self.buffer[head] = None
+        head += 1
+        if head == self.size:
+            head = 0
+        self.head = head
+        return signal
+
+    def __len__(self):
+        length = self.tail - self.head
+        if length < 0:
+            length += self.size
+        return length
+
+    def is_empty(self):
+        """ Return True if there is no signal in the queue. """
+        return self.head == self.tail
+
+    def capacity(self):
+        """ Return the maximum number of queued signals. """
+        return self.size - 1
+
+    def overflow_count(self):
+        """ Return the number of signals dropped on a full queue. """
+        return self.overflows
+
+    def high_water_mark(self):
+        """ Return the maximum queue length seen so far. """
+        return self.max_length
+
+    def reset_stats(self):
+        """ Clear the overflow counter and the high water mark. """
+        self.overflows = 0
+        self.max_length = len(self)
@@ -0,0 +1,14 @@
+""" Host simulator of the door controller.
+A fake machine module on a virtual clock runs the real
+DoorController: ADC inputs follow scriptable waveforms, the motor
+PWM moves a door model that operates the end switches. A simulated
+year takes seconds:
+    python -m coop_door.sim --days 365 --seasons
+Many sites at once are run by coop_door.sim.fleet.
+Host python only, not meant for the board.
+"""
+from .clock import VirtualClock
+from .door import Door
+from .machine import Board, install
+from .simulation import Simulation, DayMetrics
+from . import waveforms
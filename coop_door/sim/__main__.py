@@ -0,0 +1,43 @@
+""" Print the per day metrics of a simulated period. """
+import argparse
+import logging
+from .simulation import Simulation, DayMetrics
+from .waveforms import light_adc, sun
+
+def main():
+    """ Run the simulation and print the per day metrics. """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--days', type=int, default=1)
+    parser.add_argument('--seasons', action='store_true',
+                        help='day length follows the seasons')
+    parser.add_argument('--battery', type=float, default=6.5,
+                        help='battery voltage [V]')
+    parser.add_argument('--fixed', action='store_true',
+                        help='keep the fast wake-up period all the time')
+    parser.add_argument('--timer-per-instance', action='store_true',
+                        help='give each timer its own hardware timer')
+    parser.add_argument('--quiet', action='store_true',
+                        help='print the totals only')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+    kwargs = {'idle_wake_up_period_ms' : 100} if args.fixed else {}
+    sim = Simulation(light_adc(sun(swing_h=4.0 if args.seasons else 0.0)),
+                     args.battery, not args.timer_per_instance, **kwargs)
+    report = sim.run_days(args.days)
+    if not args.quiet:
+        print('day ' + ' '.join(f'{name:>10s}' for name in DayMetrics._fields))
+        for day, metrics in enumerate(report):
+            print(f'{day:3d} ' + ' '.join(f'{value:10.1f}' for value in metrics))
+    totals = DayMetrics(*(sum(column) for column in zip(*report)))
+    print(' '.join(f'{name} {value / len(report):.1f}/day'
+                   for name, value in zip(DayMetrics._fields, totals)))
+    moves = sim.moves()
+    if moves:
+        peaks_a = [peak_a for peak_a, _energy_j in moves]
+        print(f'moves: peak current {sum(peaks_a) / len(moves):.2f} A mean'
+              f' {max(peaks_a):.2f} A max,'
+              f' energy {sum(energy_j for _peak_a, energy_j in moves) / len(moves):.1f} J/move')
+    print(f'hardware timers: {sim.hardware_timers()}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,33 @@
+""" Virtual time and discrete events. """
+import heapq
+
+class VirtualClock():
+    """ Virtual time and a queue of pending events. """
+    def __init__(self):
+        self.now_ms = 0
+        self.events = []
+        self.seq = 0
+
+    def schedule(self, due_ms, callback):
+        """ Call the callback at due_ms. Return the event handle. """
+        self.seq += 1
+        event = [due_ms, self.seq, callback]
+        heapq.heappush(self.events, event)
+        return event
+
+    @staticmethod
+    def cancel(event):
+        """ Cancel a scheduled event. """
+        event[2] = None
+
+    def next_due_ms(self):
+        """ Return the time of the next pending event or None. """
+        while self.events and self.events[0][2] is None:
+            heapq.heappop(self.events)
+        return self.events[0][0] if self.events else None
+
+    def run_next(self):
+        """ Advance the time to the next event and fire it. """
+        due_ms, _seq, callback = heapq.heappop(self.events)
+        self.now_ms = due_ms
+        callback()
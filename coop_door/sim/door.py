@@ -0,0 +1,140 @@
+""" Door position model. """
+import math
+from array import array
+
+class Door():
+    # pylint: disable=too-many-instance-attributes
+    """ Door driven by the motor, operating the end switches.
+    Position 0 is closed, travel_ms is open. Motor direction +1
+    (first PWM pin) closes the door. The motor draws current_a
+    times the PWM duty from a supply of supply_v(now_ms) volts.
+    The motor speed follows the signed duty with the spin_up_ms
+    time constant, until it does the motor draws stall_current_a
+    times the difference on top, times the duty. The door moves
+    at the same speed whatever the duty.
+    The peak current and the energy of each move, from the motor
+    start to its stop, are kept in peak_currents_a and
+    move_energies_j.
+    """
+    PINS = {'open' : 9, 'close' : 8, 'enable' : 14,
+            'open_switch' : 7, 'close_switch' : 6}
+    TRAVEL_MS = 15000
+    def __init__(self, clock, pins=None, travel_ms=TRAVEL_MS, switch_margin_ms=300, *,
+                 current_a=0.5, supply_v=lambda now_ms: 6.5,
+                 stall_current_a=3.0, spin_up_ms=150):
+        # pylint: disable=too-many-arguments
+        self.clock = clock
+        self.pins = pins if pins is not None else Door.PINS
+        self.board = None
+        self.travel_ms = travel_ms
+        self.margin_ms = switch_margin_ms
+        self.current_a = current_a
+        self.supply_v = supply_v
+        self.stall_current_a = stall_current_a
+        self.spin_up_ms = spin_up_ms
+        self.speed = 0.0
+        self.move_peak_a = 0.0
+        self.move_energy_j = 0.0
+        self.peak_currents_a = array('d')
+        self.move_energies_j = array('d')
+        self.position_ms = 0.0
+        self.velocity = 0
+        self.duty = 0
+        self.updated_ms = 0
+        self.event = None
+        self.motor_on_ms = 0
+        self.energy_j = 0.0
+        self.moves = 0
+
+    def _drive(self):
+        duty = self.board.pwm_duty
+        enable = self.board.pins.get(self.pins['enable'])
+        if enable is None or not enable.level:
+            return 0, 0
+        if duty.get(self.pins['close'], 0) > 0:
+            return -1, duty[self.pins['close']]
+        if duty.get(self.pins['open'], 0) > 0:
+            return +1, duty[self.pins['open']]
+        return 0, 0
+
+    def pin_level(self, num, level):
+        """ Return the level of a pin, end switches pull it low. """
+        if num == self.pins['open_switch']:
+            return int(self.position_ms < self.travel_ms - self.margin_ms)
+        if num == self.pins['close_switch']:
+            return int(self.position_ms > self.margin_ms)
+        return level
+
+    def update(self, now_ms):
+        """ Move the door up to now_ms and plan the next switch edge. """
+        if self.board is None:
+            return
+        elapsed_ms = now_ms - self.updated_ms
+        self.updated_ms = now_ms
+        decay = math.exp(-elapsed_ms / self.spin_up_ms)
+        if self.velocity:
+            self.motor_on_ms += elapsed_ms
+            duty = self.velocity * self.duty / 65535
+            # The speed difference decays over the interval.
+            stall_ms = abs(duty - self.speed) * self.spin_up_ms * (1 - decay)
+            energy_j = self.supply_v(now_ms) * abs(duty)\
+                * (self.current_a * elapsed_ms + self.stall_current_a * stall_ms) / 1000
+            self.energy_j += energy_j
+            self.move_energy_j += energy_j
+            self.speed = duty + (self.speed - duty) * decay
+            self.position_ms = min(self.travel_ms,
+                                   max(0.0, self.position_ms + self.velocity * elapsed_ms))
+        else:
+            self.speed *= decay
+        velocity, self.duty = self._drive()
+        if velocity and not self.velocity:
+            self.moves += 1
+            self.move_peak_a = 0.0
+            self.move_energy_j = 0.0
+        elif self.velocity and not velocity:
+            self.peak_currents_a.append(self.move_peak_a)
+            self.move_energies_j.append(self.move_energy_j)
+        changed = velocity != self.velocity
+        self.velocity = velocity
+        if velocity:
+            # The current is the highest right after a change.
+            self.move_peak_a = max(self.move_peak_a, self.current())
+        if self.event is not None:
+            # The speed does not depend on the duty, the planned edge
+            # holds until the direction changes.
+            if not changed:
+                return
+            self.clock.cancel(self.event)
+            self.event = None
+        edges = [self.margin_ms, self.travel_ms - self.margin_ms]
+        if self.velocity > 0:
+            ahead = [e for e in edges if e > self.position_ms]
+            if ahead:
+                self.event = self.clock.schedule(now_ms + ahead[0] - self.position_ms + 1,
+                                                 self._edge)
+        elif self.velocity < 0:
+            behind = [e for e in edges if e < self.position_ms]
+            if behind:
+                self.event = self.clock.schedule(now_ms + self.position_ms - behind[-1] + 1,
+                                                 self._edge)
+
+    def current(self):
+        """ Return the motor current [A] at the last update. """
+        duty = self.velocity * self.duty / 65535
+        return abs(duty) * (self.current_a + self.stall_current_a * abs(duty - self.speed))
+
+    def is_open(self):
+        """ Return True if the door is fully open. """
+        return self.position_ms >= self.travel_ms - self.margin_ms
+
+    def is_closed(self):
+        """ Return True if the door is fully closed. """
+        return self.position_ms <= self.margin_ms
+
+    def _edge(self):
+        self.event = None
+        self.update(self.clock.now_ms)
+        for name in ('open_switch', 'close_switch'):
+            pin = self.board.pins.get(self.pins[name])
+            if pin is not None and pin.handler is not None:
+                pin.handler(pin)
@@ -0,0 +1,189 @@
+""" Run a fleet of simulated door controllers.
+Every site replays its light and battery traces through the real
+DoorController on its own simulated board. Sites are sharded over a
+multiprocessing pool, each worker runs its sites one after another,
+and the per door metrics are gathered column by column.
+
+    python -m coop_door.sim.fleet --doors 200 --days 3
+    python -m coop_door.sim.fleet --traces recorded/ --csv fleet.csv
+
+A trace file is a CSV of t_ms,light_adc,battery_v rows with a header,
+one file per site.
+"""
+import argparse
+import csv
+import logging
+import math
+import multiprocessing
+import os
+import random
+from array import array
+from collections import namedtuple
+from .door import Door
+from .simulation import Simulation
+from .waveforms import DAY_MS, R_DAY_OHM, R_NIGHT_OHM, R_LIGHT_UP_OHM, piecewise
+
+Site = namedtuple('Site', ('name', 'light', 'battery_v', 'period_ms', 'travel_ms'))
+Site.__doc__ = """ A door site.
+light are (t [ms], light ADC) and battery_v (t [ms], volts) points,
+repeated every period_ms or holding the end values if it is None.
+travel_ms is the door travel time.
+"""
+
+class FleetResult():
+    """ Per door metrics, one array per metric. """
+    COLUMNS = ('wakeups_per_day', 'motor_on_s_per_day', 'energy_j_per_day',
+               'moves', 'failed_moves',
+               'detach_trials', 'open_latency_s', 'close_latency_s',
+               'max_open_latency_s', 'max_close_latency_s')
+    def __init__(self):
+        self.names = []
+        self.columns = {name : array('d') for name in FleetResult.COLUMNS}
+
+    def __len__(self):
+        return len(self.names)
+
+    def append(self, name, row):
+        """ Add a door, row holds the metrics in COLUMNS order. """
+        self.names.append(name)
+        for column, value in zip(FleetResult.COLUMNS, row):
+            self.columns[column].append(value)
+
+    def extend(self, other):
+        """ Add all doors of another result. """
+        self.names.extend(other.names)
+        for column in FleetResult.COLUMNS:
+            self.columns[column].extend(other.columns[column])
+
+    def column(self, name):
+        """ Return the values of a metric of all doors. """
+        return self.columns[name]
+
+    def summary(self):
+        """ Return {metric : (mean, max)} over the doors, nan skipped. """
+        result = {}
+        for name in FleetResult.COLUMNS:
+            values = [v for v in self.columns[name] if not math.isnan(v)]
+            result[name] = (sum(values) / len(values), max(values))\
+                if values else (math.nan, math.nan)
+        return result
+
+    def write_csv(self, file):
+        """ Write one row per door. """
+        writer = csv.writer(file)
+        writer.writerow(('site',) + FleetResult.COLUMNS)
+        for i, name in enumerate(self.names):
+            writer.writerow([name] + [self.columns[c][i] for c in FleetResult.COLUMNS])
+
+def _mean(values):
+    return sum(values) / len(values) if values else math.nan
+
+def simulate_site(site, days, controller_kwargs=None):
+    """ Run a site for a number of days, return its metrics row. """
+    light = piecewise(site.light, site.period_ms)
+    battery_v = piecewise(site.battery_v, site.period_ms)
+    sim = Simulation(light, battery_v, **(controller_kwargs or {}))
+    sim.door.travel_ms = site.travel_ms
+    report = sim.run_days(days)
+    open_s = [ms / 1000 for ms in sim.open_latencies_ms]
+    close_s = [ms / 1000 for ms in sim.close_latencies_ms]
+    return (sum(day.wakeups for day in report) / days,
+            sum(day.motor_on_s for day in report) / days,
+            sum(day.energy_j for day in report) / days,
+            sum(day.moves for day in report),
+            sim.failed_moves(),
+            sim.detach_trials(),
+            _mean(open_s),
+            _mean(close_s),
+            max(open_s, default=math.nan),
+            max(close_s, default=math.nan))
+
+def run_shard(shard):
+    """ Run the sites of a shard one after another. """
+    sites, days, controller_kwargs = shard
+    result = FleetResult()
+    for site in sites:
+        result.append(site.name, simulate_site(site, days, controller_kwargs))
+    return result
+
+def run_fleet(sites, days, processes=None, shard_size=None, controller_kwargs=None):
+    """ Run all sites, in a pool of processes unless processes is 1.
+    Return a FleetResult in the order of the sites.
+    """
+    if processes is None:
+        processes = os.cpu_count() or 1
+    if shard_size is None:
+        shard_size = max(1, math.ceil(len(sites) / (4 * processes)))
+    shards = [(sites[i:i + shard_size], days, controller_kwargs)
+              for i in range(0, len(sites), shard_size)]
+    result = FleetResult()
+    if processes == 1:
+        results = map(run_shard, shards)
+    else:
+        with multiprocessing.Pool(processes) as pool:
+            results = pool.map(run_shard, shards)
+    for shard_result in results:
+        result.extend(shard_result)
+    return result
+
+def _light_adc(r_ohm):
+    return 65535 * r_ohm / (r_ohm + R_LIGHT_UP_OHM)
+
+def synthetic_site(name, seed):
+    """ Return a site with a random day length, dusk, battery and door. """
+    rng = random.Random(seed)
+    sunrise_ms = rng.uniform(5, 8) * 3600e3
+    sunset_ms = rng.uniform(18, 21) * 3600e3
+    dusk_ms = rng.uniform(10, 60) * 60e3
+    day_adc = _light_adc(R_DAY_OHM)
+    night_adc = _light_adc(R_NIGHT_OHM)
+    light = [(0, night_adc),
+             (sunrise_ms - dusk_ms / 2, night_adc), (sunrise_ms + dusk_ms / 2, day_adc),
+             (sunset_ms - dusk_ms / 2, day_adc), (sunset_ms + dusk_ms / 2, night_adc),
+             (DAY_MS, night_adc)]
+    volts = rng.uniform(5.8, 7.2)
+    sag_v = rng.uniform(0, 0.4)
+    battery_v = [(0, volts - sag_v), (sunrise_ms, volts - sag_v),
+                 ((sunrise_ms + sunset_ms) / 2, volts), (DAY_MS, volts - sag_v)]
+    return Site(name, light, battery_v, DAY_MS, rng.uniform(12000, 18000))
+
+def load_site(path):
+    """ Return a site of a t_ms,light_adc,battery_v trace file. """
+    light = []
+    battery_v = []
+    with open(path, newline='', encoding='utf-8') as file:
+        reader = csv.reader(file)
+        next(reader)
+        for t_ms, light_adc, volts in reader:
+            light.append((float(t_ms), float(light_adc)))
+            battery_v.append((float(t_ms), float(volts)))
+    name = os.path.splitext(os.path.basename(path))[0]
+    return Site(name, light, battery_v, None, Door.TRAVEL_MS)
+
+def main():
+    """ Run the fleet and print the metric summary. """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--doors', type=int, default=100,
+                        help='number of synthetic sites')
+    parser.add_argument('--traces', help='directory of recorded site traces')
+    parser.add_argument('--days', type=int, default=1)
+    parser.add_argument('--processes', type=int)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--csv', help='write the per door metrics here')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+    if args.traces:
+        sites = [load_site(os.path.join(args.traces, name))
+                 for name in sorted(os.listdir(args.traces)) if name.endswith('.csv')]
+    else:
+        sites = [synthetic_site(f'site{i}', args.seed + i) for i in range(args.doors)]
+    result = run_fleet(sites, args.days, args.processes)
+    if args.csv:
+        with open(args.csv, 'w', newline='', encoding='utf-8') as file:
+            result.write_csv(file)
+    print(f'{len(result)} doors, {args.days} days')
+    for name, (mean, peak) in result.summary().items():
+        print(f'{name:20s} mean {mean:10.2f} max {peak:10.2f}')
+
+if __name__ == '__main__':
+    main()
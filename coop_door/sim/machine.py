@@ -0,0 +1,217 @@
+""" Fake micropython machine module on simulated boards.
+There is a single fake module per process, the coop_door modules
+bind its classes on import. Every Pin, ADC, PWM and Timer belongs to
+the board that is active when it is created, so any number of boards
+can share the process as long as each is activated while its
+controller is built and while its events run.
+"""
+import sys
+import types
+
+TICKS_PERIOD = 1 << 30
+# RP2040 PWM compare registers, see Mem32.
+PWM_BASE = 0x40050000
+PWM_SLICE_SIZE = 0x14
+PWM_CC = 0x0c
+PWM_SLICES = 8
+
+class Board():
+    # pylint: disable=too-many-instance-attributes
+    """ Simulated hardware of one controller. """
+    active = None
+    def __init__(self, clock, adc_sources):
+        self.clock = clock
+        self.adc_sources = adc_sources
+        self.door = None
+        self.pins = {}
+        self.pwm_duty = {}
+        self.registers = {}
+        self.timers = []
+
+    def activate(self):
+        """ Make the board the one new hardware objects belong to. """
+        Board.active = self
+
+    def attach(self, door):
+        """ Let the door read the motor outputs and drive the switches. """
+        self.door = door
+        door.board = self
+
+    def pin_level(self, num, level):
+        """ Return the level of an input pin. """
+        if self.door is not None:
+            return self.door.pin_level(num, level)
+        return level
+
+    def outputs_changed(self):
+        """ Let the door follow the motor outputs. """
+        if self.door is not None:
+            self.door.update(self.clock.now_ms)
+
+def ticks_ms():
+    """ ticks_ms of the active board. """
+    return int(Board.active.clock.now_ms) & (TICKS_PERIOD - 1)
+
+def ticks_us():
+    """ ticks_us of the active board. """
+    return int(1000 * Board.active.clock.now_ms) & (TICKS_PERIOD - 1)
+
+def _build_module():
+    # pylint: disable=too-many-statements
+    fake = types.ModuleType('machine')
+
+    class Pin():
+        """ GPIO pin """
+        IN = 0
+        OUT = 1
+        PULL_UP = 2
+        IRQ_FALLING = 4
+        IRQ_RISING = 8
+        def __init__(self, num, mode=None, pull=None):
+            # pylint: disable=unused-argument
+            self.board = Board.active
+            self.num = num
+            self.level = 0
+            self.handler = None
+            self.board.pins[num] = self
+
+        def value(self, level=None):
+            """ Read or drive the pin. """
+            if level is None:
+                return self.board.pin_level(self.num, self.level)
+            self.level = int(bool(level))
+            self.board.outputs_changed()
+            return None
+
+        def irq(self, handler=None, trigger=None):
+            """ Hook an edge handler. """
+            # pylint: disable=unused-argument
+            self.handler = handler
+
+        def __repr__(self):
+            return f'Pin({self.num})'
+
+    class ADC():
+        # pylint: disable=too-few-public-methods
+        """ Analog input """
+        def __init__(self, pin):
+            self.board = Board.active
+            self.source = self.board.adc_sources.get(pin.num, lambda _t: 0)
+            self.read_ms = None
+            self.value = 0
+
+        def read_u16(self):
+            """ Read the input at the current virtual time. """
+            # Time stands still during a burst, sample the waveform once.
+            now_ms = self.board.clock.now_ms
+            if now_ms != self.read_ms:
+                self.read_ms = now_ms
+                self.value = min(65535, max(0, round(self.source(now_ms))))
+            return self.value
+
+    class PWM():
+        """ PWM output """
+        def __init__(self, pin, freq=None, duty_u16=None):
+            # pylint: disable=redefined-outer-name
+            self.board = Board.active
+            self.pin = pin
+            if freq is not None:
+                self.init(freq=freq, duty_u16=duty_u16)
+
+        def init(self, freq=None, duty_u16=0):
+            """ Configure the output. """
+            # pylint: disable=unused-argument, redefined-outer-name
+            self.board.pwm_duty[self.pin.num] = duty_u16 or 0
+            self.board.outputs_changed()
+
+        def duty_u16(self, duty=None):
+            """ Read or set the duty cycle. """
+            if duty is None:
+                return self.board.pwm_duty.get(self.pin.num, 0)
+            self.board.pwm_duty[self.pin.num] = duty
+            self.board.outputs_changed()
+            return None
+
+        def deinit(self):
+            """ Release the output. """
+            self.board.pwm_duty[self.pin.num] = 0
+            self.board.outputs_changed()
+
+    class Mem32():
+        """ 32 bit register access of the active board.
+        A PWM compare register write sets the duty cycles of the
+        slice's PWM pins, channel A in the low half, B in the high
+        one, a level is taken as a duty_u16. Other registers only
+        keep their values.
+        """
+        def __getitem__(self, address):
+            return Board.active.registers.get(address, 0)
+
+        def __setitem__(self, address, value):
+            board = Board.active
+            board.registers[address] = value
+            offset = address - PWM_BASE - PWM_CC
+            if 0 <= offset < PWM_SLICES * PWM_SLICE_SIZE and offset % PWM_SLICE_SIZE == 0:
+                pwm_slice = offset // PWM_SLICE_SIZE
+                for num in board.pwm_duty:
+                    if (num >> 1) % PWM_SLICES == pwm_slice:
+                        board.pwm_duty[num] = value >> 16 if num & 1 else value & 0xFFFF
+                board.outputs_changed()
+
+    class Timer():
+        """ Hardware timer on the virtual clock. """
+        PERIODIC = 0
+        ONE_SHOT = 1
+        def __init__(self, _id=-1):
+            self.board = Board.active
+            self.event = None
+            self.fired = 0
+            self.board.timers.append(self)
+
+        def init(self, mode=PERIODIC, period=0, callback=None):
+            """ (Re)start the timer. """
+            self.deinit()
+            clock = self.board.clock
+            def fire():
+                self.fired += 1
+                if mode == Timer.PERIODIC:
+                    self.event = clock.schedule(clock.now_ms + period, fire)
+                else:
+                    self.event = None
+                if callback is not None:
+                    callback(self)
+            self.event = clock.schedule(clock.now_ms + max(period, 1), fire)
+
+        def deinit(self):
+            """ Stop the timer. """
+            if self.event is not None:
+                self.board.clock.cancel(self.event)
+                self.event = None
+
+    fake.Pin = Pin
+    fake.ADC = ADC
+    fake.PWM = PWM
+    fake.Timer = Timer
+    fake.mem32 = Mem32()
+    fake.freq = lambda hz=None: None
+    fake.disable_irq = lambda: 0
+    fake.enable_irq = lambda state: None
+    return fake
+
+module = _build_module()
+
+def install():
+    """ Install the fake machine module and the virtual ticks.
+    Call before the first coop_door hardware module is imported.
+    """
+    # pylint: disable=import-outside-toplevel
+    sys.modules['machine'] = module
+    from .. import timer, end_switch, state_machine, log, trace, door_controller, light_sensor
+    timer.ticks_ms = ticks_ms
+    log.ticks_ms = ticks_ms
+    trace.ticks_ms = ticks_ms
+    end_switch.ticks_us = ticks_us
+    state_machine.ticks_us = ticks_us
+    door_controller.ticks_ms = ticks_ms
+    door_controller.ticks_us = ticks_us
+    light_sensor.ticks_ms = ticks_ms
@@ -0,0 +1,156 @@
+""" DoorController on a simulated board. """
+from collections import namedtuple
+from .clock import VirtualClock
+from .door import Door
+from .machine import Board, install
+from .waveforms import DAY_MS, constant, light_adc, battery_adc
+
+DayMetrics = namedtuple('DayMetrics', ('wakeups', 'motor_on_s', 'energy_j',
+                                       'moves', 'open_h'))
+
+class Simulation():
+    # pylint: disable=too-many-instance-attributes
+    """ Run the real DoorController in virtual time.
+    The light and battery inputs are waveforms of the virtual time,
+    the door follows the motor outputs and operates the end switches.
+    Each simulation has its own board, timer scheduler and interrupt
+    dispatcher, so several can live in one process.
+    """
+    LIGHT_PIN = 27
+    BATTERY_PIN = 26
+    def __init__(self, light=None, battery_v=6.5, shared_timer=True,
+                 door=None, trace=None, **controller_kwargs):
+        """ light is a light sensor ADC waveform, battery_v the battery
+        voltage or its waveform, trace the host file to record a binary
+        event trace to, the rest goes to DoorController.
+        """
+        # pylint: disable=import-outside-toplevel, too-many-arguments
+        install()
+        from ..door_controller import DoorController
+        from ..irq_dispatcher import IrqDispatcher, run_scheduled
+        from ..timer import Timer, TimerScheduler
+        from ..trace import Recorder
+        self.run_scheduled = run_scheduled
+        self.clock = VirtualClock()
+        volts = battery_v if callable(battery_v) else constant(battery_v)
+        self.board = Board(self.clock, {
+            Simulation.LIGHT_PIN : light if light is not None else light_adc(),
+            Simulation.BATTERY_PIN : battery_adc(volts)})
+        self.door = door if door is not None else Door(self.clock, supply_v=volts)
+        self.board.activate()
+        self.recorder = Recorder(trace) if trace is not None else None
+        # In use whenever the simulation runs, by lazily created objects too.
+        self.setups = ((IrqDispatcher.use, IrqDispatcher()),
+                       (Timer.use_scheduler, TimerScheduler() if shared_timer else None),
+                       (Recorder.use, self.recorder))
+        self._use(True)
+        try:
+            self.controller = DoorController(**controller_kwargs)
+        finally:
+            self._use(False)
+        self.board.attach(self.door)
+        self.wakeups = 0
+        self._count_wakeups()
+        self.open_ms = 0
+        self.is_started = False
+        # Light change to end stop latencies
+        self.is_day = None
+        self.light_change_ms = None
+        self.open_latencies_ms = []
+        self.close_latencies_ms = []
+        self.controller.light_sensor.register_light_slot(self._light)
+
+    def _count_wakeups(self):
+        wakeup_slot = self.controller.timer.timeout_slot
+        def counting_wakeup_slot():
+            self.wakeups += 1
+            wakeup_slot()
+        self.controller.timer.timeout_slot = counting_wakeup_slot
+
+    def _use(self, enabled):
+        for use, instance in self.setups:
+            use(instance if enabled else None)
+
+    def _light(self, is_day):
+        if is_day is not self.is_day:
+            self.is_day = is_day
+            self.light_change_ms = self.clock.now_ms
+
+    def _end_stop(self, latencies_ms):
+        if self.light_change_ms is not None:
+            latencies_ms.append(self.clock.now_ms - self.light_change_ms)
+            self.light_change_ms = None
+
+    def failed_moves(self):
+        """ Return the number of moves that did not reach the end stop. """
+        return self.controller.drive_open_controller.failure_count()\
+            + self.controller.drive_close_controller.failure_count()
+
+    def detach_trials(self):
+        """ Return the number of end-detach trials. """
+        return self.controller.drive_open_controller.detach_trial_count()\
+            + self.controller.drive_close_controller.detach_trial_count()
+
+    def moves(self):
+        """ Return (peak current [A], energy [J]) of the finished moves. """
+        return list(zip(self.door.peak_currents_a, self.door.move_energies_j))
+
+    def hardware_timers(self):
+        """ Return the number of hardware timers in use. """
+        return len(self.board.timers)
+
+    def run_until(self, end_ms):
+        """ Run all events due up to end_ms. """
+        self.board.activate()
+        self._use(True)
+        try:
+            self._run_until(end_ms)
+        finally:
+            self._use(False)
+
+    def _run_until(self, end_ms):
+        if not self.is_started:
+            self.is_started = True
+            self.controller.start()
+            self.run_scheduled()
+        clock = self.clock
+        door = self.door
+        while True:
+            due_ms = clock.next_due_ms()
+            if due_ms is None or due_ms > end_ms:
+                break
+            was_open = door.is_open()
+            was_closed = door.is_closed()
+            since_ms = clock.now_ms
+            clock.run_next()
+            self.run_scheduled()
+            if was_open:
+                self.open_ms += clock.now_ms - since_ms
+            elif door.is_open():
+                self._end_stop(self.open_latencies_ms)
+            if not was_closed and door.is_closed():
+                self._end_stop(self.close_latencies_ms)
+        if door.is_open():
+            self.open_ms += end_ms - clock.now_ms
+        clock.now_ms = end_ms
+        door.update(end_ms)
+        if self.recorder is not None:
+            self.recorder.flush()
+
+    def run_day(self):
+        """ Run the next day, return its DayMetrics. """
+        wakeups = self.wakeups
+        motor_on_ms = self.door.motor_on_ms
+        energy_j = self.door.energy_j
+        moves = self.door.moves
+        open_ms = self.open_ms
+        self.run_until((self.clock.now_ms // DAY_MS + 1) * DAY_MS)
+        return DayMetrics(self.wakeups - wakeups,
+                          (self.door.motor_on_ms - motor_on_ms) / 1000,
+                          self.door.energy_j - energy_j,
+                          self.door.moves - moves,
+                          (self.open_ms - open_ms) / 3600e3)
+
+    def run_days(self, days):
+        """ Run a number of days, return a list of DayMetrics. """
+        return [self.run_day() for _ in range(days)]
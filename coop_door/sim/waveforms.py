@@ -0,0 +1,76 @@
+""" ADC input waveforms of the virtual time [ms]. """
+import math
+
+DAY_MS = 24 * 3600 * 1000
+YEAR_DAYS = 365
+
+R_LIGHT_UP_OHM = 10e3
+R_DAY_OHM = 10e3
+R_NIGHT_OHM = 1e6
+
+def constant(value):
+    """ Return a waveform of a constant value. """
+    return lambda now_ms: value
+
+def piecewise(points, period_ms=None):
+    """ Return a waveform interpolating (time [ms], value) points.
+    Before the first and after the last point the end values hold,
+    or the points repeat every period_ms.
+    """
+    times = [t for t, _v in points]
+    values = [v for _t, v in points]
+    def waveform(now_ms):
+        if period_ms is not None:
+            now_ms %= period_ms
+        if now_ms <= times[0]:
+            return values[0]
+        for i in range(1, len(times)):
+            if now_ms <= times[i]:
+                span = times[i] - times[i - 1]
+                return values[i - 1] + (values[i] - values[i - 1])\
+                    * (now_ms - times[i - 1]) / span
+        return values[-1]
+    return waveform
+
+def day_length_h(day, mean_h=12.0, swing_h=4.0):
+    """ Return the day length of a day of the year, longest on day 172. """
+    return mean_h + swing_h * math.cos(2 * math.pi * (day - 172) / YEAR_DAYS)
+
+def sun(sunrise_h=6.0, sunset_h=20.0, noon_h=None, swing_h=0.0):
+    """ Return a waveform of 1 between sunrise and sunset, 0 otherwise.
+    With swing_h the day length follows the seasons around noon_h,
+    day 0 is January 1st.
+    """
+    if noon_h is None:
+        noon_h = (sunrise_h + sunset_h) / 2
+    mean_h = sunset_h - sunrise_h
+    def waveform(now_ms):
+        hour = (now_ms % DAY_MS) / 3600e3
+        half_h = day_length_h(now_ms // DAY_MS % YEAR_DAYS, mean_h, swing_h) / 2
+        return 1 if noon_h - half_h <= hour < noon_h + half_h else 0
+    return waveform
+
+def light_adc(daylight=None):
+    """ Return the light sensor ADC waveform of a daylight
+    waveform (1 day, 0 night, anything in between for dusk).
+    """
+    if daylight is None:
+        daylight = sun()
+    def adc(now_ms):
+        r_ohm = R_NIGHT_OHM + (R_DAY_OHM - R_NIGHT_OHM) * daylight(now_ms)
+        return 65535 * r_ohm / (r_ohm + R_LIGHT_UP_OHM)
+    return adc
+
+BATTERY_V_PER_ADC = 20e3 * 3.2 / (5e3 * 65535)
+
+def battery_adc(volts=6.5):
+    """ Return the battery ADC waveform of a voltage [V] or
+    of a voltage waveform.
+    """
+    if not callable(volts):
+        volts = constant(volts)
+    return lambda now_ms: volts(now_ms) / BATTERY_V_PER_ADC
+
+def battery_volts(adc):
+    """ Return the battery voltage [V] of an ADC count. """
+    return adc * BATTERY_V_PER_ADC
@@ -1,8 +1,11 @@
 """ Finite state machine. """
-import logging
+from . import log
 from .timer import Timer
+from .signal_queue import SignalQueue
+from .ticks import ticks_us, ticks_add, ticks_diff
+from .trace import Recorder, SIGNAL, ENTER, EXIT
 
-logger = logging.getLogger(__name__)
+logger = log.getLogger(__name__)
 
 def _find_common_parent(state1, state2):
     """ Find a common parent of two state.
@@ -29,6 +32,8 @@ class Transition():
         self.target = target
         self.action = action
         self.condition = None
+        self.exit_state = None
+        self.entry_path = None
 
     def go_to(self, target, condition=None):
         """ Define the target state with an optional
@@ -36,6 +41,7 @@ class Transition():
         """
         self.condition = condition
         self.target = target
+        self.entry_path = None
         return self
 
     def do(self, action):
@@ -43,6 +49,25 @@ class Transition():
         self.action = action
         return self
 
+    def compile(self):
+        """ Freeze the transition path.
+        Find the common parent of the source and the target once and
+        keep the state to exit and the tuple of states to enter
+        (outermost first, target excluded).
+        """
+        common_parent = _find_common_parent(self.source, self.target)
+        exit_state = self.source
+        while exit_state.parent is not common_parent:
+            exit_state = exit_state.parent
+        entry_path = []
+        state = self.target
+        while state.parent is not common_parent:
+            state = state.parent
+            entry_path.append(state)
+        entry_path.reverse()
+        self.exit_state = exit_state
+        self.entry_path = tuple(entry_path)
+
 class State():
     # pylint: disable=too-many-instance-attributes
     """ Finite state machine state.
@@ -58,8 +83,14 @@ class State():
         self.exit_action = None
         self.current_state = None
         self.parent = parent
+        self.substates = []
+        if parent is not None:
+            parent.substates.append(self)
         self.timeout = Signal('timeout')
         self.timer = None
+        self.recorder = Recorder.instance
+        self.trace_id = self.recorder.name_id(name) if self.recorder is not None else 0
+        self.machine_id = parent.machine_id if parent is not None else 0
 
     def on_signal(self, signal):
         """ Create a transition triggerred by a signal. """
@@ -81,6 +112,8 @@ class State():
         Entry action is performed. Timer is started.
         """
         logger.debug('entering %s', self.name)
+        if self.recorder is not None:
+            self.recorder.record(ENTER, self.machine_id, self.trace_id)
         if self.timer:
             logger.debug('starting the %s state timer', self.name)
             self.timer.start()
@@ -112,6 +145,8 @@ class State():
             logger.debug('exit action of %s', self.name)
             self.exit_action()
         self.current_state = None
+        if self.recorder is not None:
+            self.recorder.record(EXIT, self.machine_id, self.trace_id)
         logger.debug('leaving %s', self.name)
 
     def set_init_state(self, init_state):
@@ -139,81 +174,153 @@ class State():
         the hierarchy. Do the transition. Enter target state and
         its parents if they are not in active branch.
         """
-        for sig, transition in self.transitions.items():
-            if signal == sig:
-                logger.debug('signal %s in state %s', signal.name, self.name)
-                target = transition.target
-                # Transition condition
-                if transition.condition is not None\
-                   and not transition.condition():
-                    return False
-
-                common_parent = _find_common_parent(self, target)
-
-                # Exit
-                common_parent.current_state.exit()
-
-                # Transition
-                if transition.action:
-                    transition.action()
-
-                # Enter
-                target_path = [target]
-                while target.parent is not common_parent:
-                    target = target.parent
-                    # Keep track of parents to call entry actions
-                    # when entering a target state.
-                    target_path.append(target)
-                target_path.reverse()
-                for state in target_path[:-1]:
-                    state.enter()
-                target_path[-1].start()
-
-                return True
-        return False
+        transition = self.transitions.get(signal)
+        if transition is None:
+            return False
+        logger.debug('signal %s in state %s', signal.name, self.name)
+        # Transition condition
+        if transition.condition is not None\
+           and not transition.condition():
+            return False
+
+        if transition.entry_path is None:
+            transition.compile()
+
+        # Exit
+        transition.exit_state.exit()
+
+        # Transition
+        if transition.action:
+            transition.action()
+
+        # Enter
+        for state in transition.entry_path:
+            state.enter()
+        transition.target.start()
+
+        return True
+
+    def compile(self):
+        """ Compile transitions of the state and all its substates.
+        Transitions compiled already are kept.
+        """
+        for transition in self.transitions.values():
+            if transition.target is not None and transition.entry_path is None:
+                transition.compile()
+        for state in self.substates:
+            state.compile()
 
 class Signal(): # pylint: disable=too-few-public-methods
     """ State machine signal.
     Send the signal to the state to do some actions
     and to jump to another state.
+    An URGENT signal is handled before any NORMAL one queued.
+    Signals of a family (see SignalFamily) are coalesced on the
+    queue.
     """
-    def __init__(self, name='noname'):
+    NORMAL = 0
+    URGENT = 1
+    def __init__(self, name='noname', priority=NORMAL, family=None):
         self.name = name
+        self.priority = priority
+        self.family = family
+        recorder = Recorder.instance
+        self.trace_id = recorder.name_id(name) if recorder is not None else 0
+
+class SignalFamily(): # pylint: disable=too-few-public-methods
+    """ Signals of which only the latest sent one matters, e.g. the
+    on and off of a switch or the repeats of a single signal.
+    A family is queued once, at the place of its first signal sent
+    since it was last handled, and is handled as the latest one.
+    A family belongs to a single state machine, its signals are
+    of the same priority.
+    """
+    def __init__(self):
+        self.latest = None
+        self.is_queued = False
+
+    def take(self):
+        """ Return the latest signal, the family is no longer queued.
+        A signal sent by an interrupt meanwhile queues the family
+        again and may be handled twice, it is never lost.
+        """
+        self.is_queued = False
+        return self.latest
 
 class StateMachine(State):
     """ Finite state machine.
     Super state that wraps the entired hierarchical state
     machine. Send signal to it to do anything.
-    Signal is put on the stack. On process_signal a single
-    signal from the stack is handled. Start the machine
+    Signal is put on the queue. On process_signal a single
+    signal from the queue is handled. Start the machine
     before trying to process a signal.
+    Urgent signals have a queue of their own, emptied first.
     """
-    def __init__(self, name='StateMachine'):
+    URGENT_QUEUE_CAPACITY = 4
+    def __init__(self, name='StateMachine',
+                 queue_capacity=SignalQueue.DEFAULT_CAPACITY):
         super().__init__(name)
-        self.signal_stack = []
+        if self.recorder is not None:
+            self.trace_id = self.machine_id = self.recorder.machine_id(name)
+        self.signal_queue = SignalQueue(queue_capacity)
+        self.urgent_queue = SignalQueue(StateMachine.URGENT_QUEUE_CAPACITY)
+        self.signal_slots = []
+        self.coalesced = 0
 
     def start(self):
         """ Start the machine.
-        Do all initial transitions.
+        Compile the transition paths of the whole hierarchy
+        and do all initial transitions.
         """
         assert self.init_state
+        self.compile()
         super().start()
 
     def send_signal(self, signal):
-        """ Put a signal on a stack.
+        """ Put a signal on a queue.
         Call process_signal to dequeue the oldest
         signal and handle it (do transition, perform action, ...).
+        The signal is dropped if the queue is full.
+        A signal of a family queued already replaces the family's
+        previous one and is counted as coalesced.
+        Safe to call from an interrupt handler, so are
+        the signal slots.
         """
-        self.signal_stack.append(signal)
+        queue = self.urgent_queue if signal.priority else self.signal_queue
+        family = signal.family
+        if family is None:
+            queued = queue.put(signal)
+        else:
+            family.latest = signal
+            if family.is_queued:
+                self.coalesced += 1
+                queued = True
+            else:
+                family.is_queued = True
+                queued = family.is_queued = queue.put(family)
+        for slot in self.signal_slots:
+            slot()
+        return queued
+
+    def register_signal_slot(self, slot):
+        """ Register a slot called whenever a signal is queued. """
+        self.signal_slots.append(slot)
 
     def process_signal(self):
         """ Handle single signal in queue.
-        Process the oldest signal from queue.
+        Process the oldest urgent signal, or the oldest signal
+        from queue if there is none.
         Go through active state machine branch, try find the state
         that accepts the given signal.
         """
-        if self.anything_to_do():
-            signal = self.signal_stack.pop(0)
+        signal = self.urgent_queue.get()
+        if signal is None:
+            signal = self.signal_queue.get()
+        if signal is not None:
+            if signal.__class__ is SignalFamily:
+                signal = signal.take()
+            if self.recorder is not None:
+                self.recorder.record(SIGNAL, self.trace_id, signal.trace_id)
             state = self.current_state
             while state is not None:
                 if state.send_signal(signal):
@@ -221,10 +328,77 @@ class StateMachine(State):
                 state = state.current_state
         return False
 
+    def process_all(self, max_signals=None, deadline_us=None):
+        """ Handle signals until the queue is empty.
+        Signals queued while processing are handled too.
+        Stop early after max_signals signals or once the ticks_us
+        deadline_us passed. Return the number of processed signals.
+        """
+        count = 0
+        while self.anything_to_do():
+            if max_signals is not None and count >= max_signals:
+                break
+            if deadline_us is not None and ticks_diff(deadline_us, ticks_us()) <= 0:
+                break
+            self.process_signal()
+            count += 1
+        return count
+
     def anything_to_do(self):
         """ Return True if any signals are left
-        on the signal stack."""
-        return len(self.signal_stack) > 0
+        on the signal queue."""
+        return not (self.signal_queue.is_empty() and self.urgent_queue.is_empty())
+
+    def coalesced_count(self):
+        """ Return the number of signals that replaced a queued
+        signal of their family.
+        """
+        return self.coalesced
+
+class MachineScheduler():
+    """ Run several state machines to completion.
+    Machines are given in priority order, the first one
+    is the most important. A single signal of the highest
+    priority busy machine is handled at a time, so signals sent
+    from one machine to another are handled within the same run
+    and before lower priority work continues.
+    """
+    def __init__(self, machines):
+        self.machines = tuple(machines)
+
+    def run(self, budget_us=None):
+        """ Process signals of all machines until all are idle
+        or the time budget [us] runs out.
+        Return the number of processed signals.
+        """
+        deadline_us = None
+        if budget_us is not None:
+            deadline_us = ticks_add(ticks_us(), budget_us)
+        count = 0
+        machine = self._next_busy()
+        while machine is not None:
+            if deadline_us is not None and ticks_diff(deadline_us, ticks_us()) <= 0:
+                break
+            machine.process_signal()
+            count += 1
+            machine = self._next_busy()
+        return count
+
+    def insert(self, index, machine):
+        """ Add a machine at the index of the priority order.
+        A run in progress takes it into account.
+        """
+        self.machines = self.machines[:index] + (machine,) + self.machines[index:]
+
+    def anything_to_do(self):
+        """ Return True if any machine has a signal queued. """
+        return self._next_busy() is not None
+
+    def _next_busy(self):
+        for machine in self.machines:
+            if machine.anything_to_do():
+                return machine
+        return None
 
 class Choice(State):
     """ State choice.
@@ -247,3 +421,102 @@ class Choice(State):
         super().enter()
         for s in self.entered:
             self.send_signal(s)
+
+class Timeout(): # pylint: disable=too-few-public-methods
+    """ Graph transition trigger: the state timeout, its length [ms]
+    is the owner attribute of the given name.
+    """
+    def __init__(self, attribute):
+        self.attribute = attribute
+
+class Graph():
+    """ Frozen state machine graph.
+    States, transitions and actions are given by name, signals,
+    conditions, actions and timeouts by the name of an owner
+    attribute. The hierarchy is resolved and the transition paths
+    compiled once, when the graph is created, typically at module
+    level. instantiate builds a machine of the graph for an owner
+    with no lookups of parents or paths left to do.
+
+    states: (name, parent name or None, State or Choice) in order
+    of creation,
+    initial: (parent name or None for the machine, initial substate),
+    transitions: (source, signal, target, condition, action) with
+    the signal None for a choice branch or a Timeout, the condition
+    and the action None if there is none,
+    actions: (state, entry action, exit action).
+    """
+    # pylint: disable=too-few-public-methods
+    def __init__(self, name, states, initial, transitions, actions=()):
+        # pylint: disable=too-many-arguments
+        self.name = name
+        index = {None : 0}
+        parents = [None]
+        for i, (state, parent, _kind) in enumerate(states):
+            index[state] = i + 1
+            parents.append(index[parent])
+        self.states = tuple((state, index[parent], kind) for state, parent, kind in states)
+        self.initial = tuple((index[parent], index[state]) for parent, state in initial)
+        self.transitions = tuple((index[source], signal, index[target], condition, action)
+                                 + self._path(parents, index[source], index[target])
+                                 for source, signal, target, condition, action in transitions)
+        self.actions = tuple((index[state], entry, exit_) for state, entry, exit_ in actions)
+
+    @staticmethod
+    def _path(parents, source, target):
+        """ Return the state to exit and the states to enter, as Transition.compile. """
+        ancestors = []
+        state = parents[source]
+        while state is not None:
+            ancestors.append(state)
+            state = parents[state]
+        common = parents[target]
+        while common not in ancestors:
+            common = parents[common]
+        exit_state = source
+        while parents[exit_state] != common:
+            exit_state = parents[exit_state]
+        entry_path = []
+        state = target
+        while parents[state] != common:
+            state = parents[state]
+            entry_path.append(state)
+        entry_path.reverse()
+        return exit_state, tuple(entry_path)
+
+    def instantiate(self, owner):
+        """ Return a new machine of the graph for the owner. """
+        machine = StateMachine(self.name)
+        states = [machine]
+        for name, parent, kind in self.states:
+            states.append(kind(name, states[parent]))
+        for parent, state in self.initial:
+            states[parent].set_init_state(states[state])
+        for transition in self.transitions:
+            self._connect(states, owner, transition)
+        for state, entry, exit_ in self.actions:
+            if entry is not None:
+                states[state].do_on_entry(getattr(owner, entry))
+            if exit_ is not None:
+                states[state].do_on_exit(getattr(owner, exit_))
+        return machine
+
+    @staticmethod
+    def _connect(states, owner, transition):
+        """ Create a transition of the graph between the instantiated states. """
+        source, signal, target, condition, action, exit_state, entry_path = transition
+        state = states[source]
+        if condition is not None:
+            condition = getattr(owner, condition)
+        if signal is None:
+            transition = state.go_to_if(states[target], condition)
+        elif isinstance(signal, Timeout):
+            transition = state.on_timeout(getattr(owner, signal.attribute))\
+                              .go_to(states[target], condition)
+        else:
+            transition = state.on_signal(getattr(owner, signal))\
+                              .go_to(states[target], condition)
+        if action is not None:
+            transition.do(getattr(owner, action))
+        transition.exit_state = states[exit_state]
+        transition.entry_path = tuple(states[i] for i in entry_path)
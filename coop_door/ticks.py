@@ -0,0 +1,29 @@
+""" Wrapping millisecond/microsecond ticks.
+Micropython provides them in the time module, on a host python
+they are emulated with the same wrap-around arithmetic.
+"""
+# pylint: disable=unused-import
+try:
+    from time import ticks_ms, ticks_us, ticks_add, ticks_diff
+except ImportError:
+    import time
+
+    TICKS_PERIOD = 1 << 30
+    _TICKS_MAX = TICKS_PERIOD - 1
+    _TICKS_HALFPERIOD = TICKS_PERIOD // 2
+
+    def ticks_ms():
+        """ Return the millisecond counter. """
+        return (time.monotonic_ns() // 1000000) & _TICKS_MAX
+
+    def ticks_us():
+        """ Return the microsecond counter. """
+        return (time.monotonic_ns() // 1000) & _TICKS_MAX
+
+    def ticks_add(ticks, delta):
+        """ Offset ticks by a given (signed) delta. """
+        return (ticks + delta) & _TICKS_MAX
+
+    def ticks_diff(ticks1, ticks2):
+        """ Return the signed difference ticks1 - ticks2. """
+        return ((ticks1 - ticks2 + _TICKS_HALFPERIOD) & _TICKS_MAX) - _TICKS_HALFPERIOD
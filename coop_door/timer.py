@@ -1,33 +1,221 @@
 """ A wrapper to micropython machine timer. """
+import heapq
 from machine import Timer as MachineTimer # pylint: disable=import-error
+from .ticks import ticks_ms, ticks_diff
+from .irq_dispatcher import IrqDispatcher
+
+class TimerScheduler():
+    # pylint: disable=too-many-instance-attributes
+    """ Drive many timers from a single hardware timer.
+    Pending expirations are kept in a min-heap ordered by due time.
+    The hardware timer is armed as a single shot for the earliest
+    one only, so there is no periodic tick when nothing is due.
+    Start and expiry cost O(log n), stop is O(1): a stopped timer
+    leaves its heap entry behind and the entry is skipped when popped.
+    With an IrqDispatcher in use the expirations are handled
+    in thread context.
+    """
+    # Keep the virtual time a small int on micropython.
+    REBASE_MS = 1 << 28
+    def __init__(self):
+        self.machine_timer = MachineTimer()
+        self.heap = []
+        self.seq = 0
+        self.now_ms = 0
+        self.last_ticks_ms = ticks_ms()
+        self.armed_due_ms = None
+        self.timers = 0
+        self.active = 0
+        self.peak_active = 0
+        self.dispatcher = IrqDispatcher.instance
+        if self.dispatcher is not None:
+            self.source = self.dispatcher.register(self._expire_due)
+
+    def register(self, _timer):
+        """ Account a new timer driven by the scheduler. """
+        self.timers += 1
+
+    def _update_now(self):
+        ticks = ticks_ms()
+        self.now_ms += ticks_diff(ticks, self.last_ticks_ms)
+        self.last_ticks_ms = ticks
+        if self.now_ms >= TimerScheduler.REBASE_MS:
+            self._rebase()
+        return self.now_ms
+
+    def _rebase(self):
+        # Shifting all due times by a constant keeps the heap order.
+        base = self.now_ms
+        heap = []
+        for entry in self.heap:
+            due_ms, seq, timer = entry
+            if timer.entry is entry:
+                timer.entry = (due_ms - base, seq, timer)
+                heap.append(timer.entry)
+        self.heap = heap
+        if self.armed_due_ms is not None:
+            self.armed_due_ms -= base
+        self.now_ms = 0
+
+    def start(self, timer):
+        """ (Re)start the timer. """
+        if timer.entry is None:
+            self.active += 1
+            self.peak_active = max(self.peak_active, self.active)
+        now_ms = self._update_now()
+        self._push(timer, now_ms + timer.timeout_ms)
+        self._arm(now_ms)
+
+    def stop(self, timer):
+        """ Stop the timer, its heap entry is dropped lazily. """
+        if timer.entry is not None:
+            timer.entry = None
+            self.active -= 1
+        if self.active == 0:
+            self.heap = []
+            self.armed_due_ms = None
+            self.machine_timer.deinit()
+
+    def _push(self, timer, due_ms):
+        self.seq += 1
+        timer.entry = (due_ms, self.seq, timer)
+        heapq.heappush(self.heap, timer.entry)
+
+    def _pop_stale(self):
+        heap = self.heap
+        while heap and heap[0][2].entry is not heap[0]:
+            heapq.heappop(heap)
+
+    def _arm(self, now_ms):
+        self._pop_stale()
+        if not self.heap:
+            self.armed_due_ms = None
+            self.machine_timer.deinit()
+            return
+        due_ms = self.heap[0][0]
+        if due_ms == self.armed_due_ms:
+            return
+        self.armed_due_ms = due_ms
+        self.machine_timer.init(mode=self.machine_timer.ONE_SHOT,
+                                period=max(due_ms - now_ms, 1),
+                                callback=self._tick)
+
+    def _tick(self, _t):
+        if self.dispatcher is not None:
+            self.dispatcher.post(self.source)
+        else:
+            self._expire_due()
+
+    def _expire_due(self, _value=0):
+        self.armed_due_ms = None
+        now_ms = self._update_now()
+        heap = self.heap
+        expired = []
+        self._pop_stale()
+        while heap and heap[0][0] <= now_ms:
+            due_ms, _seq, timer = heapq.heappop(heap)
+            if timer.periodic:
+                # Do not drift, but do not try to catch up either.
+                self._push(timer, max(due_ms + timer.timeout_ms, now_ms + 1))
+            else:
+                timer.entry = None
+                self.active -= 1
+            expired.append(timer)
+            self._pop_stale()
+        self._arm(now_ms)
+        for timer in expired:
+            timer.expire()
+
+    def timer_count(self):
+        """ Return the number of timers driven by the scheduler. """
+        return self.timers
+
+    def active_count(self):
+        """ Return the number of running timers. """
+        return self.active
+
+    def peak_active_count(self):
+        """ Return the maximum number of timers running at once. """
+        return self.peak_active
 
 class Timer():
+    # pylint: disable=too-many-instance-attributes
     """ A periodic or a single shot timer.
     Single shot timer once expired stops.
     Periodic timer starts from the beginning.
     On expiration the defined timeout slot is called.
+    Each timer owns a hardware timer unless a shared scheduler
+    is set with use_scheduler before the timer is created.
+    The timeout slot is called in thread context if an
+    IrqDispatcher is in use.
     """
     PERIODIC = 0
     SINGLE_SHOT = 1
+    scheduler = None
     def __init__(self, timeout_ms, timeout_slot=None, mode=PERIODIC):
-        self.machine_timer = MachineTimer()
         self.timeout_slot = timeout_slot
         self.timeout_ms = timeout_ms
-        if mode == self.PERIODIC:
-            self.mode = self.machine_timer.PERIODIC
-        elif mode == self.SINGLE_SHOT:
-            self.mode = self.machine_timer.ONE_SHOT
+        self.periodic = mode == self.PERIODIC
+        self.entry = None
+        self.dispatcher = None
+        self.scheduler = Timer.scheduler
+        if self.scheduler is not None:
+            self.machine_timer = None
+            self.mode = mode
+            self.scheduler.register(self)
         else:
-            self.mode = None
+            self.machine_timer = MachineTimer()
+            if mode == self.PERIODIC:
+                self.mode = self.machine_timer.PERIODIC
+            elif mode == self.SINGLE_SHOT:
+                self.mode = self.machine_timer.ONE_SHOT
+            else:
+                self.mode = None
+            self.dispatcher = IrqDispatcher.instance
+            if self.dispatcher is not None:
+                self.source = self.dispatcher.register(self._deferred_expire)
         self.is_active = False
+        self.is_running = False
+
+    @staticmethod
+    def use_scheduler(scheduler):
+        """ Drive timers created from now on by a shared
+        TimerScheduler. None gives each new timer its own
+        hardware timer again.
+        """
+        Timer.scheduler = scheduler
 
     def start(self):
         """ Start the timer. """
         self.is_active = True
+        self.is_running = True
+        if self.scheduler is not None:
+            self.scheduler.start(self)
+            return
         self.machine_timer.init(mode=self.mode,
                                 period=self.timeout_ms,
                                 callback=self._timeout)
+
+    def set_timeout(self, timeout_ms):
+        """ Change the timeout [ms].
+        The new timeout takes effect on the next start.
+        """
+        self.timeout_ms = timeout_ms
+
     def _timeout(self, _t):
+        if self.dispatcher is not None:
+            self.dispatcher.post(self.source)
+        else:
+            self.expire()
+
+    def _deferred_expire(self, _value):
+        # The timer may have been stopped since the interrupt.
+        if self.is_running:
+            self.is_running = self.periodic
+            self.expire()
+
+    def expire(self):
+        """ Handle the timer expiration. """
         self.is_active = False
         if self.timeout_slot is not None:
             self.timeout_slot()
@@ -36,8 +224,12 @@ class Timer():
         """ Stop the timer.
         Deinitialize the HW stuff.
         """
-        self.machine_timer.deinit()
+        if self.scheduler is not None:
+            self.scheduler.stop(self)
+        else:
+            self.machine_timer.deinit()
         self.is_active = False
+        self.is_running = False
 
     def active(self):
         """ Return True if ticking. """
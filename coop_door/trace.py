@@ -0,0 +1,146 @@
+""" Binary event trace. """
+import struct
+from .ticks import ticks_ms
+from .log_sink import FileSystem
+
+# Event types
+BOOT = 0
+LIGHT_ADC = 1
+BATTERY_ADC = 2
+EDGE = 3
+SIGNAL = 4
+ENTER = 5
+EXIT = 6
+
+# ticks_ms, event, source, value
+RECORD_FORMAT = '<IBBH'
+RECORD_SIZE = 8
+MAX_NAMES = 255
+
+class Recorder():
+    # pylint: disable=too-many-instance-attributes
+    """ Record events to a RAM ring buffer, write them to flash in blocks.
+    A record is 8 bytes: ticks_ms, event type, source and a 16 bit
+    value, packed into a preallocated buffer, nothing is allocated.
+    Names of states and signals are recorded as ids, name_id hands
+    them out, the names go to name + '.names', one per line, id 1
+    first. A state machine has an id of its own, machine_id, the
+    source of its SIGNAL, ENTER and EXIT records.
+    Recording never writes to flash, safe in an interrupt.
+    flush_blocks writes full blocks, flush everything, both in thread
+    context. Unwritten records overwritten by new ones are counted as
+    dropped. The file is kept in two segments, name and name.1,
+    each up to segment_size.
+    """
+    CAPACITY = 1024
+    BLOCK = 256
+    SEGMENT_SIZE = 64 * 1024
+    instance = None
+    def __init__(self, name='trace.bin', capacity=CAPACITY, block=BLOCK,
+                 segment_size=SEGMENT_SIZE, fs=None):
+        # pylint: disable=too-many-arguments
+        self.name = name
+        self.capacity = capacity
+        self.block = block
+        self.segment_size = segment_size
+        self.fs = fs if fs is not None else FileSystem()
+        self.buffer = bytearray(capacity * RECORD_SIZE)
+        self.view = memoryview(self.buffer)
+        self.write_index = 0
+        self.count = 0
+        self.dropped = 0
+        self.names = []
+        self.name_ids = {}
+        self.machines = {}
+        self.names_written = 0
+        self.segment_bytes = self.fs.size(name)
+        self.record(BOOT, 0, 0)
+
+    @staticmethod
+    def use(recorder):
+        """ Record the events of sensors, switches and state
+        machines created from now on. None records nothing.
+        """
+        Recorder.instance = recorder
+
+    def name_id(self, name):
+        """ Return the id of a name, 0 if there are too many names. """
+        name_id = self.name_ids.get(name)
+        if name_id is None:
+            if len(self.names) >= MAX_NAMES:
+                return 0
+            self.names.append(name)
+            name_id = len(self.names)
+            self.name_ids[name] = name_id
+        return name_id
+
+    def machine_id(self, name):
+        """ Return the id of a new state machine. Machines of the same
+        name are told apart as name, name#2, name#3...
+        """
+        number = self.machines.get(name, 0) + 1
+        self.machines[name] = number
+        return self.name_id(name if number == 1 else f'{name}#{number}')
+
+    def record(self, event, source, value):
+        """ Record an event. """
+        i = self.write_index
+        struct.pack_into(RECORD_FORMAT, self.buffer, i * RECORD_SIZE,
+                         ticks_ms(), event, source, value)
+        i += 1
+        self.write_index = i if i < self.capacity else 0
+        if self.count < self.capacity:
+            self.count += 1
+        else:
+            self.dropped += 1
+
+    def pending(self):
+        """ Return the number of records not written yet. """
+        return self.count
+
+    def dropped_count(self):
+        """ Return the number of records lost before being written. """
+        return self.dropped
+
+    def flush_blocks(self):
+        """ Write full blocks of records. """
+        while self.count >= self.block:
+            self._write(self.block)
+
+    def flush(self):
+        """ Write all records. """
+        if self.count:
+            self._write(self.count)
+
+    def _write(self, count):
+        start = self.write_index - self.count
+        if start < 0:
+            start += self.capacity
+        length = count * RECORD_SIZE
+        if self.segment_bytes and self.segment_bytes + length > self.segment_size:
+            self.fs.remove(self.name + '.1')
+            self.fs.rename(self.name, self.name + '.1')
+            self.segment_bytes = 0
+        file = self.fs.open(self.name, 'ab')
+        try:
+            end = start + count
+            if end <= self.capacity:
+                file.write(self.view[start * RECORD_SIZE:end * RECORD_SIZE])
+            else:
+                file.write(self.view[start * RECORD_SIZE:])
+                file.write(self.view[:(end - self.capacity) * RECORD_SIZE])
+        finally:
+            file.close()
+        self.count -= count
+        self.segment_bytes += length
+        if self.names_written != len(self.names):
+            self._write_names()
+
+    def _write_names(self):
+        file = self.fs.open(self.name + '.names', 'wb')
+        try:
+            for name in self.names:
+                file.write(name.encode() + b'\n')
+        finally:
+            file.close()
+        self.names_written = len(self.names)
@@ -1,6 +1,9 @@
+set -e
+# Device modules go as precompiled bytecode, see tools/build_bundle.py.
+python -m tools.build_bundle
 mpr -v rmd --rf /
 mpr -v mkdir coop_door
-mpr -v put coop_door/*.py coop_door/
+mpr -v put build/coop_door/*.mpy coop_door/
 mpr -v put __init__.py main.py /
 mpr -v mip install logging
 mpr -v reset
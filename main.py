@@ -5,6 +5,11 @@ import sys
  # nor it can be relative due to specific micropython folder structure
  # pylint: disable=no-name-in-module, import-error
 from coop_door.door_controller import DoorController
+from coop_door.timer import Timer, TimerScheduler
+from coop_door.irq_dispatcher import IrqDispatcher
+from coop_door.log_sink import RotatingFlashHandler
+from coop_door.trace import Recorder
+from coop_door import log
 
 root_logger = logging.getLogger()
 formatter = logging.Formatter('[%(levelname)s]\t(+%(msecs)s) %(name)s %(message)s')
@@ -13,15 +18,32 @@ console_handler.setFormatter(formatter)
 console_handler.setLevel(logging.INFO)
 root_logger.addHandler(console_handler)
 
-file_handler = logging.FileHandler('app.log')
+# Written to flash in blocks, on errors and before sleep.
+file_handler = RotatingFlashHandler('app.log')
 file_handler.setFormatter(formatter)
 file_handler.setLevel(logging.INFO)
 root_logger.addHandler(file_handler)
 
 root_logger.setLevel(logging.DEBUG)
+# Handlers show INFO and up, do not even record debug messages.
+log.set_level(logging.INFO)
+# Records are formatted in batches, msecs is the batch time. Messages
+# start with '(@<ticks_ms>) ' of the log call, tools/trace_query
+# times app.log lines by it.
+log.set_time_stamps(True)
 
 logger = logging.getLogger(__name__)
 if __name__ == '__main__':
+    # Interrupts only record events, the work is done in thread context.
+    # Set up before any timer or switch is created.
+    IrqDispatcher.use(IrqDispatcher())
+    # All timers share a single hardware timer.
+    Timer.use_scheduler(TimerScheduler())
+    # Sensor readings, switch edges and state changes go to trace.bin.
+    Recorder.use(Recorder())
+    # Peripherals are created when first needed, the light sensor
+    # settles meanwhile. Boot to the first day/night decision is logged.
+    DoorController.use_lazy_init(True)
     c = DoorController()
     logger.info('----------- Starting the application -----------')
     c.start()
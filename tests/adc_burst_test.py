@@ -0,0 +1,44 @@
+import pytest
+from unittest.mock import MagicMock
+
+from ..coop_door.adc_burst import BurstAdc
+
+@pytest.fixture
+def adc_mock():
+    return MagicMock()
+
+def test_burst_size(adc_mock):
+    adc_mock.read_u16.return_value = 100
+    BurstAdc(adc_mock, 3).read_u16()
+    assert adc_mock.read_u16.call_count == 8
+
+def test_mean(adc_mock):
+    adc_mock.read_u16.side_effect = [10, 20, 30, 40]
+    assert BurstAdc(adc_mock, 2).read_u16() == 25
+
+def test_mean_is_rounded(adc_mock):
+    adc_mock.read_u16.side_effect = [1, 2]
+    assert BurstAdc(adc_mock, 1).read_u16() == 2
+    adc_mock.read_u16.side_effect = [1, 1, 1, 2]
+    assert BurstAdc(adc_mock, 2).read_u16() == 1
+
+def test_mean_of_full_scale(adc_mock):
+    adc_mock.read_u16.return_value = 65535
+    assert BurstAdc(adc_mock, 8).read_u16() == 65535
+
+def test_median_rejects_spikes(adc_mock):
+    adc_mock.read_u16.side_effect = [100, 65535, 101, 0, 99, 100, 102, 98]
+    assert BurstAdc(adc_mock, 3, median=True).read_u16() == 100
+
+def test_median_result_is_int(adc_mock):
+    adc_mock.read_u16.side_effect = [5, 3, 4, 4]
+    result = BurstAdc(adc_mock, 2, median=True).read_u16()
+    assert result == 4
+    assert isinstance(result, int)
+
+def test_oversample(adc_mock):
+    assert BurstAdc.oversample(adc_mock, 0) is adc_mock
+    burst = BurstAdc.oversample(adc_mock, 2, median=True)
+    assert burst.adc is adc_mock
+    assert burst.samples == 4
+    assert burst.buffer is not None
@@ -122,4 +122,21 @@ def test_report_voltage(sensor,
     observer_mock.assert_called_once()
     assert is_close_to(observer_mock.call_args.args[0], 6.6)
 
+def test_oversampling(sensor, adc_mock):
+    sensor.set_oversampling(2)
+    adc_mock.read_u16.side_effect = [1000, 1002, 1000, 1002]
+    v = sensor.read()
+    assert adc_mock.read_u16.call_count == 4
+    assert is_close_to(v, (R_UP_OHM + R_DOWN_OHM) * 1001 * VCC_V / (R_DOWN_OHM * ADC_MAX))
+
+def test_fixed_point_millivolts(sensor, adc_mock, observer_mock):
+    sensor.set_fixed_point(True)
+    sensor.register_slot(observer_mock)
+    for v in [0, 2.2, 6.3, 10.256, 12.5]:
+        adc_mock.read_u16.return_value = round(v_to_adc(v))
+        mv = sensor.read()
+        assert isinstance(mv, int)
+        assert abs(mv - 1000 * v) <= 1
+        observer_mock.assert_called_with(mv)
+
 del sys.modules['machine']
@@ -0,0 +1,62 @@
+import json
+import os
+import sys
+from unittest.mock import patch
+import pytest
+
+from .top_level import TopLevel, REPO
+
+top_level = TopLevel()
+bench_run = top_level.import_module('benchmarks.run')
+harness = bench_run.harness
+BASELINE = os.path.join(REPO, 'benchmarks', 'baseline.json')
+# A single call per round.
+QUICK = ['--rounds', '1', '--round-ns', '1']
+
+@pytest.fixture(autouse=True)
+def fake_machine():
+    with top_level:
+        yield
+
+def run(*args):
+    with patch.object(sys, 'argv', ['run'] + QUICK + list(args)):
+        bench_run.main()
+
+def test_run_against_baseline(tmp_path, capsys):
+    output = str(tmp_path / 'new.json')
+    run('--baseline', BASELINE, '--threshold', '1e9', '--output', output)
+    report = harness.load(output)
+    names = [name for name, _setup in bench_run.BENCHMARKS]
+    assert set(report['results']) == set(names)
+    assert set(harness.load(BASELINE)['results']) == set(names)
+    compared = [line.split()[0] for line in capsys.readouterr().out.splitlines()
+                if '->' in line]
+    assert compared == names
+
+@pytest.fixture
+def fast_baseline(tmp_path):
+    """ The baseline of a 1000 times faster run of the same host. """
+    output = str(tmp_path / 'new.json')
+    run('--filter', 'filter.sample_many', '--output', output)
+    baseline = harness.load(output)
+    for result in baseline['results'].values():
+        result['ns_per_op'] /= 1000
+    return baseline
+
+def test_regression_fails(tmp_path, fast_baseline, capsys):
+    path = str(tmp_path / 'baseline.json')
+    harness.save(fast_baseline, path)
+    with pytest.raises(SystemExit) as exit_info:
+        run('--filter', 'filter.sample_many', '--baseline', path)
+    assert exit_info.value.code == 1
+    assert 'REGRESSION' in capsys.readouterr().out
+
+def test_other_host_baseline_does_not_fail(tmp_path, fast_baseline, capsys):
+    fast_baseline['machine'] = 'armv6m'
+    path = str(tmp_path / 'baseline.json')
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(fast_baseline, file)
+    run('--filter', 'filter.sample_many', '--baseline', path)
+    out = capsys.readouterr().out
+    assert 'baseline of armv6m' in out
+    assert 'REGRESSION' in out
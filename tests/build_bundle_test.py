@@ -0,0 +1,60 @@
+import os
+import sys
+import pytest
+
+from .top_level import TopLevel, REPO
+
+top_level = TopLevel()
+build_bundle = top_level.import_module('tools.build_bundle')
+
+STUB = '''
+import sys
+args = sys.argv[1:]
+with open(args[-1], 'rb') as file:
+    size = len(file.read())
+with open(args[args.index('-o') + 1], 'wb') as file:
+    file.write(b'M' + b'.' * (size // 2))
+with open(sys.argv[0] + '.calls', 'a', encoding='utf-8') as file:
+    file.write(' '.join(args) + '\\n')
+'''
+
+@pytest.fixture
+def mpy_cross(tmp_path):
+    """ mpy-cross writing a .mpy of half the source size. """
+    path = tmp_path / 'mpy_cross.py'
+    path.write_text(STUB)
+    return [sys.executable, str(path)]
+
+def read_manifest(path):
+    calls = []
+    def call(name):
+        return lambda *args, **kwargs: calls.append((name, args, kwargs))
+    with open(path, encoding='utf-8') as file:
+        exec(file.read(), {'include' : call('include'), 'require' : call('require'),
+                           'package' : call('package')})
+    return calls
+
+def test_device_modules():
+    modules = build_bundle.device_modules(REPO)
+    assert '__init__.py' in modules and 'door_controller.py' in modules
+    assert modules == sorted(modules)
+    assert all(name.endswith('.py') for name in modules)
+
+def test_build(tmp_path, mpy_cross):
+    build_dir = tmp_path / 'build'
+    (build_dir / 'coop_door').mkdir(parents=True)
+    (build_dir / 'coop_door' / 'removed.mpy').write_bytes(b'M')
+    rows = build_bundle.build(REPO, str(build_dir), mpy_cross, 3)
+    modules = build_bundle.device_modules(REPO)
+    assert [row[0] for row in rows] == [name[:-3] for name in modules]
+    for module, source_bytes, mpy_bytes in rows:
+        assert source_bytes == os.path.getsize(os.path.join(REPO, 'coop_door', module + '.py'))
+        assert mpy_bytes == 1 + source_bytes // 2
+    assert sorted(os.listdir(build_dir / 'coop_door')) ==\
+        sorted(name[:-3] + '.mpy' for name in modules)
+    calls = (tmp_path / 'mpy_cross.py.calls').read_text().splitlines()
+    assert calls[0].split()[:4] == ['-march=armv6m', '-O3', '-s', modules[0]]
+    assert read_manifest(build_dir / 'manifest.py') ==\
+        [('include', ('$(PORT_DIR)/boards/manifest.py',), {}),
+         ('require', ('logging',), {}),
+         ('package', ('coop_door',), {'files' : modules, 'base_path' : REPO, 'opt' : 3})]
@@ -26,10 +26,16 @@ def freq_hz():
 def voltage_to_duty(v):
     return round(65535 * 6 / v)
 
+@pytest.fixture
+def mem32():
+    with patch('coop_door.coop_door.dcmotor_drive.mem32', new={}) as mem32:
+        yield mem32
+
 @pytest.fixture
 def motor(pin_mock,
           pwm_mock,
-          voltage_callback):
+          voltage_callback,
+          mem32):
     with (patch('coop_door.coop_door.dcmotor_drive.Pin') as Pin_mock,
           patch('coop_door.coop_door.dcmotor_drive.PWM') as PWM_mock):
         Pin_mock.side_effect = [pin_mock[0], pin_mock[1], pin_mock[2]]
@@ -60,29 +66,72 @@ def test_enable_driver_while_driving_motor(motor, pin_mock):
     motor.stop()
     pin_mock[2].value.assert_called_once_with(False)
 
-def test_drive_forward(motor, pwm_mock, freq_hz):
-    motor.go(+1)
-    pwm_mock[0].init.assert_called_once_with(freq=freq_hz, duty_u16=65535)
+def test_pwm_frequency_set_once(motor, pwm_mock, freq_hz):
+    pwm_mock[0].init.assert_called_once_with(freq=freq_hz, duty_u16=0)
     pwm_mock[1].init.assert_called_once_with(freq=freq_hz, duty_u16=0)
+    motor.go(+1)
+    motor.go(-1)
+    motor.stop()
+    pwm_mock[0].init.assert_called_once()
+    pwm_mock[1].init.assert_called_once()
+
+def test_drive_forward(motor, pwm_mock):
+    motor.go(+1)
+    pwm_mock[0].duty_u16.assert_called_once_with(65535)
+    pwm_mock[1].duty_u16.assert_called_once_with(0)
 
-def test_drive_backward(motor, pwm_mock, freq_hz):
+def test_drive_backward(motor, pwm_mock):
     motor.go(-1)
-    pwm_mock[0].init.assert_called_once_with(freq=freq_hz, duty_u16=0)
-    pwm_mock[1].init.assert_called_once_with(freq=freq_hz, duty_u16=65535)
+    pwm_mock[0].duty_u16.assert_called_once_with(0)
+    pwm_mock[1].duty_u16.assert_called_once_with(65535)
 
-def test_stop_motor(motor, pwm_mock, freq_hz):
+def test_reverse_turns_off_channel_first(motor, pwm_mock):
+    order = []
+    pwm_mock[0].duty_u16.side_effect = lambda duty: order.append((0, duty))
+    pwm_mock[1].duty_u16.side_effect = lambda duty: order.append((1, duty))
     motor.go(+1)
-    pwm_mock[0].init.reset_mock()
-    pwm_mock[1].init.reset_mock()
-    motor.stop()
-    pwm_mock[0].init.assert_called_once_with(freq=freq_hz, duty_u16=0)
-    pwm_mock[1].init.assert_called_once_with(freq=freq_hz, duty_u16=0)
     motor.go(-1)
-    pwm_mock[0].init.reset_mock()
-    pwm_mock[1].init.reset_mock()
+    assert order == [(1, 0), (0, 65535), (0, 0), (1, 65535)]
+
+def test_stop_motor_brakes_by_single_register_write(motor, pwm_mock, mem32):
+    brake_register = 0x40050000 + 0x0c
+    for direction in [+1, -1]:
+        motor.go(direction)
+        pwm_mock[0].duty_u16.reset_mock()
+        pwm_mock[1].duty_u16.reset_mock()
+        mem32[brake_register] = 0xFFFFFFFF
+        motor.stop()
+        assert mem32[brake_register] == 0
+        pwm_mock[0].duty_u16.assert_not_called()
+        pwm_mock[1].duty_u16.assert_not_called()
+
+def test_stop_motor_pins_of_different_slices(voltage_callback, mem32):
+    pwm_mock = (MagicMock(), MagicMock())
+    with (patch('coop_door.coop_door.dcmotor_drive.Pin'),
+          patch('coop_door.coop_door.dcmotor_drive.PWM') as PWM_mock):
+        PWM_mock.side_effect = [pwm_mock[0], pwm_mock[1]]
+        voltage_callback.return_value = 6
+        motor = Motor(0, 3, 2, voltage_callback)
+    motor.go(+1)
     motor.stop()
-    pwm_mock[0].init.assert_called_once_with(freq=freq_hz, duty_u16=0)
-    pwm_mock[1].init.assert_called_once_with(freq=freq_hz, duty_u16=0)
+    pwm_mock[0].duty_u16.assert_called_with(0)
+    pwm_mock[1].duty_u16.assert_called_with(0)
+    assert not mem32
+
+def test_unchanged_output_is_not_written(motor, pwm_mock, pin_mock, voltage_callback, mem32):
+    motor.go(+1)
+    motor.go(+1)
+    assert pwm_mock[0].duty_u16.call_count == 1
+    assert pin_mock[2].value.call_count == 1
+    voltage_callback.return_value = 7
+    motor.go(+1)
+    pwm_mock[0].duty_u16.assert_called_with(voltage_to_duty(7))
+    assert pwm_mock[0].duty_u16.call_count == 2
+    motor.stop()
+    mem32.clear()
+    motor.stop()
+    assert not mem32
+    assert pin_mock[2].value.call_count == 2
 
 def test_get_direction(motor):
     assert motor.direction() == 0
@@ -111,48 +160,185 @@ def test_go_zero_stops_motor(motor):
 
 def test_pwm(motor,
              pwm_mock,
-             voltage_callback,
-             freq_hz):
+             voltage_callback):
     voltages = [6, 7, 8, 9, 10, 11, 11.99]
     for v in voltages:
         duty = voltage_to_duty(v)
         voltage_callback.return_value = v
-        pwm_mock[0].init.reset_mock()
-        pwm_mock[1].init.reset_mock()
+        pwm_mock[0].duty_u16.reset_mock()
+        pwm_mock[1].duty_u16.reset_mock()
         motor.go(+1)
-        pwm_mock[0].init.assert_called_once_with(freq=freq_hz, duty_u16=duty)
-        pwm_mock[1].init.assert_called_once_with(freq=freq_hz, duty_u16=0)
-        pwm_mock[0].init.reset_mock()
-        pwm_mock[1].init.reset_mock()
+        pwm_mock[0].duty_u16.assert_called_once_with(duty)
+        pwm_mock[1].duty_u16.assert_called_once_with(0)
+        pwm_mock[0].duty_u16.reset_mock()
+        pwm_mock[1].duty_u16.reset_mock()
         motor.go(-1)
-        pwm_mock[0].init.assert_called_once_with(freq=freq_hz, duty_u16=0)
-        pwm_mock[1].init.assert_called_once_with(freq=freq_hz, duty_u16=duty)
+        pwm_mock[0].duty_u16.assert_called_once_with(0)
+        pwm_mock[1].duty_u16.assert_called_once_with(duty)
 
 def test_pwm_max(motor,
                  pwm_mock,
-                 voltage_callback,
-                 freq_hz):
+                 voltage_callback):
     voltage_callback.return_value = 5.9
     motor.go(+1)
-    pwm_mock[0].init.assert_called_once_with(freq=freq_hz, duty_u16=65535)
-    pwm_mock[1].init.assert_called_once_with(freq=freq_hz, duty_u16=0)
+    pwm_mock[0].duty_u16.assert_called_once_with(65535)
+    pwm_mock[1].duty_u16.assert_called_once_with(0)
 
 def test_voltage_low(motor,
                      pwm_mock,
                      voltage_callback,
-                     freq_hz):
+                     mem32):
     voltage_callback.return_value = 3.9
     motor.go(+1)
-    pwm_mock[0].init.assert_called_once_with(freq=freq_hz, duty_u16=0)
-    pwm_mock[1].init.assert_called_once_with(freq=freq_hz, duty_u16=0)
+    assert not motor.is_running()
+    assert mem32[0x40050000 + 0x0c] == 0
+    pwm_mock[0].duty_u16.assert_not_called()
 
 def test_voltage_high(motor,
                       pwm_mock,
                       voltage_callback,
-                      freq_hz):
+                      mem32):
     voltage_callback.return_value = 12.1
     motor.go(+1)
-    pwm_mock[0].init.assert_called_once_with(freq=freq_hz, duty_u16=0)
-    pwm_mock[1].init.assert_called_once_with(freq=freq_hz, duty_u16=0)
+    assert not motor.is_running()
+    assert mem32[0x40050000 + 0x0c] == 0
+    pwm_mock[0].duty_u16.assert_not_called()
+
+def test_fixed_point_pwm(motor,
+                         pwm_mock,
+                         voltage_callback):
+    motor.set_fixed_point(True)
+    for mv in [5900, 6000, 7000, 9000, 11990]:
+        voltage_callback.return_value = mv
+        motor.stop()
+        pwm_mock[0].duty_u16.reset_mock()
+        motor.go(+1)
+        duty = pwm_mock[0].duty_u16.call_args.args[0]
+        assert isinstance(duty, int)
+        assert abs(duty - min(voltage_to_duty(mv / 1000), 65535)) <= 1
+
+def test_fixed_point_voltage_window(motor,
+                                    pwm_mock,
+                                    voltage_callback,
+                                    freq_hz):
+    motor.set_fixed_point(True)
+    for mv in [3999, 12001]:
+        voltage_callback.return_value = mv
+        motor.go(+1)
+        assert not motor.is_running()
+
+def test_no_tracking_by_default(motor, pwm_mock):
+    motor.go(+1)
+    pwm_mock[0].duty_u16.reset_mock()
+    motor.track(7)
+    pwm_mock[0].duty_u16.assert_not_called()
+
+def test_tracking_rate_limited(motor, pwm_mock):
+    motor.set_tracking(True, hysteresis=100, step_max=3000)
+    motor.go(+1)
+    pwm_mock[0].duty_u16.reset_mock()
+    target = voltage_to_duty(7)
+    duties = []
+    for _ in range(4):
+        motor.track(7)
+        duties.append(pwm_mock[0].duty_u16.call_args.args[0])
+    assert duties == [65535 - 3000, 65535 - 6000, 65535 - 9000, target]
+    assert motor.is_running()
+
+def test_tracking_hysteresis(motor, pwm_mock):
+    motor.set_tracking(True, hysteresis=1000)
+    voltage = 6 * 65535 / 64535
+    motor.go(+1)
+    pwm_mock[0].duty_u16.reset_mock()
+    motor.track(voltage)
+    pwm_mock[0].duty_u16.assert_not_called()
+    motor.track(voltage + 0.01)
+    pwm_mock[0].duty_u16.assert_called_once_with(voltage_to_duty(voltage + 0.01))
+
+def test_tracking_stops_out_of_window(motor, mem32):
+    motor.set_tracking(True)
+    motor.go(-1)
+    motor.track(3.9)
+    assert not motor.is_running()
+    assert mem32[0x40050000 + 0x0c] == 0
+
+def test_tracking_stopped_motor(motor, pwm_mock, pin_mock):
+    motor.set_tracking(True)
+    motor.track(7)
+    motor.track(3.9)
+    pwm_mock[0].duty_u16.assert_not_called()
+    pin_mock[2].value.assert_not_called()
+
+@pytest.fixture
+def ramp_timer():
+    with patch('coop_door.coop_door.dcmotor_drive.Timer') as Timer_mock:
+        yield Timer_mock
+
+def ramp_steps(ramp_timer, steps):
+    slot = ramp_timer.call_args.args[1]
+    for _ in range(steps):
+        slot()
+
+def test_ramp_fractions():
+    assert list(Motor.ramp_fractions(Motor.LINEAR, 4)) == [4096, 8192, 12288, 16384]
+    s_curve = Motor.ramp_fractions(Motor.S_CURVE, 4)
+    assert list(s_curve) == [2560, 8192, 13824, 16384]
+    # A full scale duty cycle change times a fraction is a small int.
+    assert Motor.DUTY_MAX * Motor.RAMP_SCALE < 1 << 30
+
+def test_ramp_up(motor, pwm_mock, ramp_timer):
+    motor.set_ramp(80)
+    ramp_timer.assert_called_once_with(Motor.RAMP_STEP_MS, motor._ramp_step)
+    motor.go(+1)
+    ramp_timer.return_value.start.assert_called_once()
+    assert pwm_mock[0].duty_u16.call_args_list == [call(0), call(16383)]
+    pwm_mock[0].duty_u16.reset_mock()
+    ramp_steps(ramp_timer, 3)
+    # A single duty cycle write per step.
+    assert pwm_mock[0].duty_u16.call_args_list == [call(32767), call(49151), call(65535)]
+    ramp_timer.return_value.stop.assert_called_once()
+    assert motor.is_running()
+
+def test_stop_cancels_ramp(motor, pwm_mock, mem32, ramp_timer):
+    motor.set_ramp(80)
+    motor.go(+1)
+    mem32[0x40050000 + 0x0c] = 1
+    motor.stop()
+    ramp_timer.return_value.stop.assert_called_once()
+    assert mem32[0x40050000 + 0x0c] == 0
+    pwm_mock[0].duty_u16.reset_mock()
+    ramp_steps(ramp_timer, 1)
+    pwm_mock[0].duty_u16.assert_not_called()
+
+def test_go_zero_ramps_down(motor, pwm_mock, mem32, ramp_timer):
+    motor.set_ramp(80, 40)
+    motor.go(+1)
+    ramp_steps(ramp_timer, 3)
+    pwm_mock[0].duty_u16.reset_mock()
+    motor.go(0)
+    pwm_mock[0].duty_u16.assert_called_once_with(32767)
+    assert 0x40050000 + 0x0c not in mem32
+    ramp_steps(ramp_timer, 1)
+    pwm_mock[0].duty_u16.assert_called_with(0)
+    assert mem32[0x40050000 + 0x0c] == 0
+    assert not motor.is_running()
+
+def test_reverse_ramps_down_then_up(motor, pwm_mock, ramp_timer):
+    motor.set_ramp(40, 40)
+    motor.go(+1)
+    ramp_steps(ramp_timer, 1)
+    motor.go(-1)
+    pwm_mock[1].duty_u16.reset_mock()
+    ramp_steps(ramp_timer, 1)
+    assert pwm_mock[0].duty_u16.call_args_list[-1] == call(0)
+    assert pwm_mock[1].duty_u16.call_args_list == [call(0), call(32767)]
+    ramp_steps(ramp_timer, 1)
+    pwm_mock[1].duty_u16.assert_called_with(65535)
+    assert motor.direction() == -1
+
+def test_no_ramp_by_default(motor, pwm_mock, ramp_timer):
+    motor.go(+1)
+    ramp_timer.assert_not_called()
+    pwm_mock[0].duty_u16.assert_called_once_with(65535)
 
 del sys.modules['machine']
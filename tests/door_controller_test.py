@@ -103,8 +103,10 @@ def door_controller_factory(light_sensor_mock,
                 return_value.append(timer_mock_factory())
                 return return_value[-1]
             StateTimer_mock.side_effect = side_effect
+            # Wake-ups handle all signals whatever the host speed.
             controller = DoorController(refresh_inputs_period_ms,
-                                        motor_drive_timeout_ms)
+                                        motor_drive_timeout_ms,
+                                        wakeup_budget_us=None)
             timers.extend([
                 ( return_value[i],
                   StateTimer_mock.call_args_list[i].args[0],
@@ -137,10 +139,42 @@ def test_hardware_wiring():
         Pin_mock.assert_called_once_with(18, 333)
         VoltageSensor_mock.assert_called_once_with(26)
 
+def test_wake_up_budget():
+    with (patch('coop_door.coop_door.door_controller.Motor'),
+          patch('coop_door.coop_door.door_controller.LightSensor'),
+          patch('coop_door.coop_door.door_controller.EndSwitch'),
+          patch('coop_door.coop_door.door_controller.Pin'),
+          patch('coop_door.coop_door.door_controller.BatteryVoltageSensor'),
+          patch('coop_door.coop_door.door_controller.Timer') as Timer_mock,
+          patch('coop_door.coop_door.door_controller.MachineScheduler') as Scheduler_mock):
+        DoorController()
+        wakeup = Timer_mock.call_args.args[1]
+        wakeup()
+        Scheduler_mock.return_value.run.assert_called_once_with(DoorController.WAKEUP_BUDGET_US)
+        Scheduler_mock.reset_mock()
+        DoorController(wakeup_budget_us=None)
+        wakeup = Timer_mock.call_args.args[1]
+        wakeup()
+        Scheduler_mock.return_value.run.assert_called_once_with(None)
+
 def test_light_sensor_is_woken_up_on_init(door_controller,
                                           light_sensor_mock):
     light_sensor_mock.wakeup.assert_called_once()
 
+def test_motor_tracks_battery_voltage(door_controller, motor_mock):
+    motor_mock.set_tracking.assert_called_once_with(True)
+    door_controller.battery_voltage_slot(6100)
+    motor_mock.track.assert_called_once_with(6100)
+    assert door_controller.motor_voltage() == 6100
+
+def test_motor_ramps(door_controller, motor_mock):
+    motor_mock.set_ramp.assert_called_once()
+    assert motor_mock.set_ramp.call_args.args[:2] == (DoorController.MOTOR_RAMP_UP_MS,
+                                                      DoorController.MOTOR_RAMP_DOWN_MS)
+
+def test_light_sensor_reports_changes_only(door_controller, light_sensor_mock):
+    light_sensor_mock.set_change_only.assert_called_once_with(True)
+
 def test_refresh_timer_config(door_controller, refresh_inputs_period_ms):
     with patch('coop_door.coop_door.door_controller.Timer') as Timer_mock:
         d = DoorController(refresh_inputs_period_ms)
@@ -229,6 +263,23 @@ def test_motor_stops_when_close_end_switch_hit(door_controller,
     door_controller.do_all()
     motor_mock.stop.assert_called_once()
 
+def test_open_end_switch_hit_goes_before_start_switch_bounces(door_controller,
+                                                              close_end_switch_mock,
+                                                              open_end_switch_mock,
+                                                              motor_mock):
+    close_end_switch_mock.is_on.return_value = False
+    open_end_switch_mock.is_on.return_value = False
+    door_controller.light_slot(True)
+    door_controller.do_all()
+    for is_on in (True, False, True, False):
+        door_controller.close_switch_slot(is_on)
+    door_controller.open_switch_slot(True)
+    machine = door_controller.drive_open_controller.state_machine
+    assert len(machine.signal_queue) == 1
+    assert machine.coalesced_count() == 3
+    machine.process_signal()
+    motor_mock.stop.assert_called_once()
+
 def test_night_comes_close_door(door_controller,
                                 close_end_switch_mock,
                                 open_end_switch_mock,
@@ -353,7 +404,60 @@ def test_reverse_motor_limited_times_on_stuck_end(door_controller,
     motor_mock.reset_mock()
     fake_time_elapsed(timers, detach_from_end_timeout_ms)
     door_controller.do_all()
-    motor_mock.go.assert_not_called()
+    # Not at the end stop, the motor ramps down.
+    motor_mock.go.assert_called_once_with(0)
+    motor_mock.stop.assert_not_called()
+
+def test_failed_detach_from_end_counted(door_controller,
+                                        open_end_switch_mock,
+                                        close_end_switch_mock,
+                                        detach_from_end_timeout_ms,
+                                        timers):
+    open_end_switch_mock.is_on.return_value = True
+    close_end_switch_mock.is_on.return_value = False
+    door_controller.light_slot(False)
+    door_controller.do_all()
+    for _ in range(5):
+        fake_time_elapsed(timers, detach_from_end_timeout_ms)
+        door_controller.do_all()
+    assert door_controller.drive_close_controller.detach_trial_count() == 5
+    assert door_controller.drive_close_controller.failure_count() == 1
+    assert door_controller.drive_open_controller.failure_count() == 0
+
+def test_drive_timeout_counted(door_controller,
+                               open_end_switch_mock,
+                               close_end_switch_mock,
+                               motor_drive_timeout_ms,
+                               timers):
+    open_end_switch_mock.is_on.return_value = False
+    close_end_switch_mock.is_on.return_value = False
+    door_controller.light_slot(True)
+    door_controller.do_all()
+    fake_time_elapsed(timers, motor_drive_timeout_ms)
+    door_controller.do_all()
+    assert door_controller.drive_open_controller.failure_count() == 1
+    assert door_controller.drive_open_controller.detach_trial_count() == 0
+
+def test_drive_timeout_ramps_motor_down(door_controller,
+                                        open_end_switch_mock,
+                                        close_end_switch_mock,
+                                        motor_mock,
+                                        motor_drive_timeout_ms,
+                                        timers):
+    open_end_switch_mock.is_on.return_value = False
+    close_end_switch_mock.is_on.return_value = False
+    door_controller.light_slot(True)
+    door_controller.do_all()
+    motor_mock.reset_mock()
+    fake_time_elapsed(timers, motor_drive_timeout_ms)
+    door_controller.do_all()
+    motor_mock.go.assert_called_once_with(0)
+    motor_mock.stop.assert_not_called()
+    # The next move stops at the end stop at once.
+    door_controller.light_slot(False)
+    door_controller.do_all()
+    door_controller.close_switch_slot(True)
+    door_controller.do_all()
     motor_mock.stop.assert_called_once()
 
 def test_sleep_pin_is_disabled_on_init(door_controller,
@@ -380,4 +484,143 @@ def test_sleep_after_door_close(door_controller,
         door_controller.do_all()
         PWM_mock.assert_called_once_with(sleep_pin_mock, freq=100, duty_u16=round(0.5 * 65535))
 
+def test_log_flushed_before_sleep_pulse(door_controller,
+                                        close_end_switch_mock):
+    order = []
+    with (patch('coop_door.coop_door.door_controller.PWM') as PWM_mock,
+          patch('coop_door.coop_door.door_controller.log.flush') as flush_mock):
+        flush_mock.side_effect = lambda: order.append('flush')
+        PWM_mock.side_effect = lambda *args, **kwargs: order.append('pwm')
+        close_end_switch_mock.read.side_effect = lambda:door_controller.close_switch_slot(False)
+        door_controller.light_slot(False)
+        door_controller.close_switch_slot(True)
+        door_controller.do_all()
+    assert order == ['flush', 'pwm']
+
+def test_slow_wake_up_when_door_opened(door_controller,
+                                       open_end_switch_mock,
+                                       timer_mock,
+                                       refresh_inputs_period_ms):
+    open_end_switch_mock.is_on.return_value = True
+    door_controller.light_slot(True)
+    refresh_inputs_callback()
+    timer_mock.set_timeout.assert_called_with(DoorController.IDLE_WAKE_UP_PERIOD_MS)
+
+def test_fast_wake_up_while_door_moves(door_controller,
+                                       open_end_switch_mock,
+                                       close_end_switch_mock,
+                                       timer_mock,
+                                       refresh_inputs_period_ms):
+    open_end_switch_mock.is_on.return_value = False
+    close_end_switch_mock.is_on.return_value = False
+    door_controller.light_slot(True)
+    refresh_inputs_callback()
+    timer_mock.set_timeout.assert_called_with(refresh_inputs_period_ms)
+
+def test_signal_outside_wake_up_brings_fast_wake_up(door_controller,
+                                                    open_end_switch_mock,
+                                                    timer_mock,
+                                                    refresh_inputs_period_ms):
+    open_end_switch_mock.is_on.return_value = True
+    door_controller.light_slot(True)
+    refresh_inputs_callback()
+    timer_mock.reset_mock()
+    door_controller.open_switch_slot(False)
+    timer_mock.set_timeout.assert_called_with(DoorController.KICK_WAKE_UP_MS)
+    timer_mock.start.assert_called()
+
+def test_signal_while_idle_handled_at_once(door_controller,
+                                           open_end_switch_mock,
+                                           close_end_switch_mock,
+                                           motor_mock,
+                                           timer_mock):
+    open_end_switch_mock.is_on.return_value = True
+    close_end_switch_mock.is_on.return_value = False
+    door_controller.light_slot(True)
+    refresh_inputs_callback()
+    timer_mock.set_timeout.assert_called_with(DoorController.IDLE_WAKE_UP_PERIOD_MS)
+    # Night comes between two idle wake-ups.
+    door_controller.light_slot(False)
+    timer_mock.set_timeout.assert_called_with(DoorController.KICK_WAKE_UP_MS)
+    timer_mock.start.assert_called()
+    motor_mock.reset_mock()
+    # The timer fires after the kick period, not the idle one.
+    refresh_inputs_callback()
+    motor_mock.go.assert_called()
+
+def test_lazy_init():
+    DoorController.use_lazy_init(True)
+    try:
+        with (patch('coop_door.coop_door.door_controller.Motor') as Motor_mock,
+              patch('coop_door.coop_door.door_controller.LightSensor') as LightSensor_mock,
+              patch('coop_door.coop_door.door_controller.EndSwitch') as EndSwitch_mock,
+              patch('coop_door.coop_door.door_controller.Pin') as Pin_mock,
+              patch('coop_door.coop_door.door_controller.PWM'),
+              patch('coop_door.coop_door.door_controller.BatteryVoltageSensor') as VoltageSensor_mock,
+              patch('coop_door.coop_door.door_controller.Timer') as Timer_mock):
+            EndSwitch_mock.return_value.is_on.return_value = True
+            d = DoorController(wakeup_budget_us=None)
+            d.start()
+            LightSensor_mock.return_value.wakeup.assert_called_once()
+            Motor_mock.assert_not_called()
+            EndSwitch_mock.assert_not_called()
+            VoltageSensor_mock.assert_not_called()
+            Pin_mock.assert_not_called()
+            # The first wake-up creates the inputs.
+            wakeup = Timer_mock.call_args.args[1]
+            wakeup()
+            EndSwitch_mock.assert_has_calls([call(OPEN_END_SWITCH_PIN),
+                                             call(CLOSE_END_SWITCH_PIN)])
+            VoltageSensor_mock.assert_called_once_with(26)
+            VoltageSensor_mock.return_value.read.assert_called_once()
+            Motor_mock.assert_not_called()
+            # The decision creates the drive, the door is open already.
+            d.light_slot(True)
+            wakeup()
+            Motor_mock.assert_called_once_with(8, 9, 14, d.motor_voltage)
+            assert len(d.scheduler.machines) == 3
+            Pin_mock.assert_called_once_with(18, Pin_mock.OUT)
+            assert d.decision_time_us() is not None
+    finally:
+        DoorController.use_lazy_init(False)
+
+def test_lazy_init_switch_edge_before_decision():
+    DoorController.use_lazy_init(True)
+    try:
+        with (patch('coop_door.coop_door.door_controller.Motor') as Motor_mock,
+              patch('coop_door.coop_door.door_controller.LightSensor'),
+              patch('coop_door.coop_door.door_controller.EndSwitch') as EndSwitch_mock,
+              patch('coop_door.coop_door.door_controller.Pin'),
+              patch('coop_door.coop_door.door_controller.PWM'),
+              patch('coop_door.coop_door.door_controller.BatteryVoltageSensor'),
+              patch('coop_door.coop_door.door_controller.Timer') as Timer_mock):
+            switches = {}
+            def make_switch(pin):
+                switches[pin] = MagicMock()
+                switches[pin].is_on.return_value = pin == OPEN_END_SWITCH_PIN
+                return switches[pin]
+            EndSwitch_mock.side_effect = make_switch
+            d = DoorController(wakeup_budget_us=None)
+            d.start()
+            wakeup = Timer_mock.call_args.args[1]
+            wakeup()
+            # The switches report edges before the light sensor settled.
+            for pin in (OPEN_END_SWITCH_PIN, CLOSE_END_SWITCH_PIN):
+                slot = switches[pin].register_slot.call_args.args[0]
+                slot(True)
+                slot(False)
+            wakeup()
+            Motor_mock.assert_not_called()
+            d.light_slot(True)
+            wakeup()
+            Motor_mock.assert_called_once()
+    finally:
+        DoorController.use_lazy_init(False)
+
+def test_no_decision_time_before_decision(door_controller):
+    assert door_controller.decision_time_us() is None
+    door_controller.light_slot(True)
+    door_controller.do_all()
+    assert door_controller.decision_time_us() is not None
+
 del sys.modules['machine']
@@ -1,10 +1,12 @@
 import pytest
 from unittest.mock import MagicMock
-from unittest.mock import patch
+from unittest.mock import patch, call
 
 import sys
 sys.modules['machine'] = MagicMock()
 from ..coop_door.end_switch import EndSwitch
+from ..coop_door.irq_dispatcher import IrqDispatcher, run_scheduled
+from ..coop_door import log
 
 @pytest.fixture
 def pin_mock():
@@ -45,5 +47,127 @@ def test_slot_is_called_on_state_change(switch,
     pin_mock.value.return_value = False
     switch.read()
     observer_mock.assert_called_with(True)
-    
+
+def test_change_logged_as_numbers(switch, pin_mock):
+    log.dump()
+    pin_mock.value.return_value = False
+    switch.read()
+    records = log.records()
+    i = (records.start + records.count - 1) % records.capacity
+    assert list(records.kinds[2 * i:2 * i + 2]) == [log.INT, log.BOOL]
+    assert list(records.ints[2 * i:2 * i + 2]) == [3, 1]
+    log.dump()
+
+def test_deferred_irq_reports_recorded_level(pin_mock, observer_mock):
+    dispatcher = IrqDispatcher()
+    IrqDispatcher.use(dispatcher)
+    try:
+        with patch('coop_door.coop_door.end_switch.Pin') as Pin_mock:
+            Pin_mock.return_value = pin_mock
+            switch = EndSwitch(3, debounce_ms=0)
+    finally:
+        IrqDispatcher.use(None)
+    switch.register_slot(observer_mock)
+    irq_handler = pin_mock.irq.call_args.kwargs['handler']
+    pin_mock.value.return_value = 0
+    irq_handler(pin_mock)
+    # Bouncing back before the deferred handler runs.
+    pin_mock.value.return_value = 1
+    irq_handler(pin_mock)
+    observer_mock.assert_not_called()
+    run_scheduled()
+    assert observer_mock.call_args_list == [call(True), call(False)]
+
+class FakeTicks:
+    def __init__(self):
+        self.us = 0
+    def __call__(self):
+        return self.us
+
+@pytest.fixture
+def ticks():
+    return FakeTicks()
+
+@pytest.fixture
+def settle_timer_mock():
+    return MagicMock()
+
+@pytest.fixture
+def debounced_switch(pin_mock, ticks, settle_timer_mock):
+    with (patch('coop_door.coop_door.end_switch.Pin') as Pin_mock,
+          patch('coop_door.coop_door.end_switch.Timer') as Timer_mock,
+          patch('coop_door.coop_door.end_switch.ticks_us', ticks)):
+        Pin_mock.return_value = pin_mock
+        Timer_mock.return_value = settle_timer_mock
+        switch = EndSwitch(3, debounce_ms=10)
+        assert Timer_mock.call_args.args[0] == 10
+        switch.settle = Timer_mock.call_args.args[1]
+        switch.irq_handler = pin_mock.irq.call_args.kwargs['handler']
+        yield switch
+
+def test_bounces_are_collapsed(debounced_switch, pin_mock, ticks, observer_mock):
+    debounced_switch.register_slot(observer_mock)
+    for level in [0, 1, 0, 1, 0]:
+        pin_mock.value.return_value = level
+        debounced_switch.irq_handler(pin_mock)
+        ticks.us += 500
+    observer_mock.assert_called_once_with(True)
+    assert debounced_switch.edge_count() == 5
+    assert debounced_switch.change_count() == 1
+    assert debounced_switch.last_change_us() == 0
+
+def test_level_resampled_after_window(debounced_switch, pin_mock, ticks,
+                                      observer_mock, settle_timer_mock):
+    debounced_switch.register_slot(observer_mock)
+    pin_mock.value.return_value = 0
+    debounced_switch.irq_handler(pin_mock)
+    settle_timer_mock.start.assert_called_once()
+    ticks.us += 1000
+    # The switch bounced back open and stays open.
+    pin_mock.value.return_value = 1
+    debounced_switch.irq_handler(pin_mock)
+    ticks.us += 10000
+    debounced_switch.settle()
+    assert observer_mock.call_args_list == [call(True), call(False)]
+    assert debounced_switch.change_count() == 2
+
+def test_edge_after_window_is_reported(debounced_switch, pin_mock, ticks, observer_mock):
+    debounced_switch.register_slot(observer_mock)
+    pin_mock.value.return_value = 0
+    debounced_switch.irq_handler(pin_mock)
+    ticks.us += 10000
+    debounced_switch.settle()
+    pin_mock.value.return_value = 1
+    debounced_switch.irq_handler(pin_mock)
+    assert observer_mock.call_args_list == [call(True), call(False)]
+    assert debounced_switch.last_change_us() == 10000
+
+def test_deferred_edges_keep_their_time(pin_mock, ticks):
+    dispatcher = IrqDispatcher()
+    IrqDispatcher.use(dispatcher)
+    try:
+        with (patch('coop_door.coop_door.end_switch.Pin') as Pin_mock,
+              patch('coop_door.coop_door.end_switch.ticks_us', ticks)):
+            Pin_mock.return_value = pin_mock
+            switch = EndSwitch(3, debounce_ms=0)
+    finally:
+        IrqDispatcher.use(None)
+    changes = []
+    switch.register_slot(lambda is_on: changes.append((is_on, switch.last_change_us())))
+    irq_handler = pin_mock.irq.call_args.kwargs['handler']
+    with patch('coop_door.coop_door.end_switch.ticks_us', ticks):
+        for level in [0, 1, 0]:
+            ticks.us += 700
+            pin_mock.value.return_value = level
+            irq_handler(pin_mock)
+    run_scheduled()
+    assert changes == [(True, 700), (False, 1400), (True, 2100)]
+
+def test_pin_sampled_once_per_read(switch, pin_mock, observer_mock):
+    switch.register_slot(observer_mock)
+    switch.register_slot(MagicMock())
+    pin_mock.value.return_value = 0
+    switch.read()
+    pin_mock.value.assert_called_once()
+
 del sys.modules['machine']
@@ -1,7 +1,10 @@
 import pytest
 import math
+import random
+from array import array
+from unittest.mock import patch
 
-from ..coop_door.filter import Filter
+from ..coop_door.filter import Filter, FilterBank
 
 @pytest.fixture
 def default_coefficient():
@@ -110,3 +113,77 @@ def test_reset_restarts_filtering(filter, default_coefficient):
         filter.sample(x)
     # the output corresponds to one tau only
     assert math.isclose(filter.output(), 0.632, rel_tol=0.05)
+
+@pytest.fixture
+def trace():
+    rng = random.Random(1)
+    samples = [rng.uniform(0, 65535) for _ in range(500)]
+    samples[100] = math.nan
+    return samples
+
+def scalar_outputs(k, samples):
+    f = Filter(k)
+    return [f.sample(x) for x in samples]
+
+def same(a, b):
+    return all(x == y or (math.isnan(x) and math.isnan(y)) for x, y in zip(a, b))\
+        and len(a) == len(b)
+
+def test_sample_many_bit_compatible(filter, default_coefficient, trace):
+    assert same(filter.sample_many(trace), scalar_outputs(default_coefficient, trace))
+
+def test_sample_many_continues_filtering(filter, default_coefficient, trace):
+    filter.sample_many(trace[:250])
+    out = filter.sample_many(trace[250:])
+    assert same(out, scalar_outputs(default_coefficient, trace)[250:])
+    assert filter.output() == out[-1]
+
+def test_sample_many_into_float_buffer(filter, default_coefficient, trace):
+    samples = array('f', trace)
+    out = array('f', bytes(4 * len(samples)))
+    assert filter.sample_many(samples, out) is out
+    assert same(out, array('f', scalar_outputs(default_coefficient, samples)))
+
+def test_filter_bank_interleaved(trace):
+    coefficients = [0.01, 0.1, 0.5]
+    bank = FilterBank(coefficients)
+    assert bank.channels() == 3
+    out = bank.sample_many(trace[:498])
+    for c, k in enumerate(coefficients):
+        assert same(out[c::3], scalar_outputs(k, trace[c:498:3]))
+        assert bank.output()[c] == out[495 + c]
+
+def test_filter_bank_shared_input(trace):
+    coefficients = [0.01, 0.1, 0.5, 1]
+    bank = FilterBank(coefficients)
+    out = bank.sample_shared(trace)
+    for c, k in enumerate(coefficients):
+        assert same(out[c::4], scalar_outputs(k, trace))
+
+def test_filter_bank_reset(trace):
+    bank = FilterBank([0.1, 0.2])
+    bank.sample_shared(trace)
+    bank.reset()
+    assert all(math.isnan(y) for y in bank.output())
+
+@pytest.mark.parametrize('nans', [(0,), (0, 1), (5, 6, 7), (499,), (3, 250, 498)])
+def test_sample_many_restarts_after_nan(default_coefficient, trace, nans):
+    samples = list(trace)
+    for i in nans:
+        samples[i] = math.nan
+    samples[300] = math.inf
+    f = Filter(default_coefficient)
+    assert same(f.sample_many(samples), scalar_outputs(default_coefficient, samples))
+    bank = FilterBank([0.1, 0.5])
+    out = bank.sample_shared(samples)
+    assert same(out[1::2], scalar_outputs(0.5, samples))
+    bank.reset()
+    out = bank.sample_many(samples)
+    assert same(out[0::2], scalar_outputs(0.1, samples[0::2]))
+    assert same(out[1::2], scalar_outputs(0.5, samples[1::2]))
+
+def test_sample_many_no_nan_check_per_sample(filter, trace):
+    with patch.object(math, 'isnan', side_effect=math.isnan) as isnan_mock:
+        filter.sample_many(trace)
+    # The trace has a nan, bisected to.
+    assert isnan_mock.call_count < 20
@@ -0,0 +1,79 @@
+import csv
+import io
+import math
+import pytest
+
+from .top_level import TopLevel
+
+top_level = TopLevel()
+fleet = top_level.import_module('coop_door.sim.fleet')
+HOUR_MS = 3600e3
+DAY_ADC = 32767.5
+NIGHT_ADC = 65000.0
+
+@pytest.fixture(autouse=True)
+def fake_machine():
+    with top_level:
+        yield
+
+@pytest.fixture
+def trace_path(tmp_path):
+    path = tmp_path / 'north.csv'
+    path.write_text('t_ms,light_adc,battery_v\n'
+                    f'0,{NIGHT_ADC},6.2\n'
+                    f'{6 * HOUR_MS},{NIGHT_ADC},6.2\n'
+                    f'{6.5 * HOUR_MS},{DAY_ADC},6.6\n'
+                    f'{19.5 * HOUR_MS},{DAY_ADC},6.6\n'
+                    f'{20 * HOUR_MS},{NIGHT_ADC},6.4\n', encoding='utf-8')
+    return str(path)
+
+def test_load_site(trace_path):
+    site = fleet.load_site(trace_path)
+    assert site.name == 'north'
+    assert site.light == [(0.0, NIGHT_ADC), (6 * HOUR_MS, NIGHT_ADC), (6.5 * HOUR_MS, DAY_ADC),
+                          (19.5 * HOUR_MS, DAY_ADC), (20 * HOUR_MS, NIGHT_ADC)]
+    assert site.battery_v == [(0.0, 6.2), (6 * HOUR_MS, 6.2), (6.5 * HOUR_MS, 6.6),
+                              (19.5 * HOUR_MS, 6.6), (20 * HOUR_MS, 6.4)]
+    assert site.period_ms is None
+    assert site.travel_ms == fleet.Door.TRAVEL_MS
+
+@pytest.fixture
+def result(trace_path):
+    sites = [fleet.load_site(trace_path), fleet.synthetic_site('synthetic', 3)]
+    return fleet.run_fleet(sites, 1, processes=1, shard_size=1)
+
+def test_run_fleet(result):
+    assert len(result) == 2
+    assert result.names == ['north', 'synthetic']
+    assert list(result.column('moves')) == [2, 2]
+    assert list(result.column('failed_moves')) == [0, 0]
+    assert all(v > 0 for v in result.column('wakeups_per_day'))
+    summary = result.summary()
+    assert set(summary) == set(fleet.FleetResult.COLUMNS)
+    assert summary['moves'] == (2, 2)
+    wakeups = result.column('wakeups_per_day')
+    assert summary['wakeups_per_day'] == (sum(wakeups) / 2, max(wakeups))
+
+def test_summary_skips_nan():
+    result = fleet.FleetResult()
+    row = [1.0] * len(fleet.FleetResult.COLUMNS)
+    result.append('a', row)
+    result.append('b', [3.0] * (len(row) - 1) + [math.nan])
+    summary = result.summary()
+    assert summary['moves'] == (2, 3)
+    assert summary['max_close_latency_s'] == (1, 1)
+    empty = fleet.FleetResult()
+    empty.append('c', [math.nan] * len(row))
+    assert all(math.isnan(v) for v in empty.summary()['moves'])
+
+def test_csv_round_trip(result):
+    file = io.StringIO()
+    result.write_csv(file)
+    file.seek(0)
+    rows = list(csv.reader(file))
+    assert rows[0] == ['site'] + list(fleet.FleetResult.COLUMNS)
+    assert [row[0] for row in rows[1:]] == result.names
+    for i, row in enumerate(rows[1:]):
+        assert [float(v) for v in row[1:]] ==\
+            pytest.approx([result.column(c)[i] for c in fleet.FleetResult.COLUMNS],
+                          nan_ok=True)
@@ -0,0 +1,40 @@
+import pytest
+
+from .top_level import TopLevel
+
+top_level = TopLevel()
+import_report = top_level.import_module('tools.import_report')
+
+@pytest.fixture
+def root(tmp_path):
+    sources = {'main.py' : 'from coop_door.door import Door\n'
+                           'from coop_door import pins\n'
+                           'Door(pins.DOOR).start()\n',
+               'coop_door/__init__.py' : '',
+               'coop_door/door.py' : 'from .motor import Motor\n'
+                                     'from . import log\n'
+                                     'try:\n'
+                                     '    from .trace import Recorder\n'
+                                     'except ImportError:\n'
+                                     '    Recorder = None\n'
+                                     'class Door():\n'
+                                     '    def start(self):\n'
+                                     '        from .sim import install\n',
+               'coop_door/motor.py' : 'import math\n'
+                                      'from coop_door.log import getLogger\n',
+               'coop_door/log.py' : 'import sys\n',
+               'coop_door/pins.py' : 'DOOR = 1\n',
+               'coop_door/trace.py' : 'from .log import getLogger\n',
+               'coop_door/unused.py' : 'from . import log\n'}
+    for name, text in sources.items():
+        (tmp_path / name).parent.mkdir(exist_ok=True)
+        (tmp_path / name).write_text(text)
+    return tmp_path
+
+def test_parse_imports_in_source_order(root):
+    assert import_report.parse_imports(str(root / 'coop_door' / 'door.py')) ==\
+        ['motor', 'log', 'trace']
+    assert import_report.parse_imports(str(root / 'main.py')) == ['door', 'pins']
+
+def test_import_order_dependencies_first(root):
+    assert import_report.import_order(str(root)) == ['log', 'motor', 'trace', 'door', 'pins']
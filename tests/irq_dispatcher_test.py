@@ -0,0 +1,58 @@
+import pytest
+from unittest.mock import MagicMock
+from unittest.mock import patch
+
+from ..coop_door.irq_dispatcher import IrqDispatcher, run_scheduled
+
+@pytest.fixture
+def dispatcher():
+    return IrqDispatcher(4)
+
+def test_post_defers_handler(dispatcher):
+    handler = MagicMock()
+    source = dispatcher.register(handler)
+    dispatcher.post(source, 1)
+    handler.assert_not_called()
+    run_scheduled()
+    handler.assert_called_once_with(1)
+
+def test_events_are_handled_in_order(dispatcher):
+    calls = []
+    first = dispatcher.register(lambda v: calls.append(('first', v)))
+    second = dispatcher.register(lambda v: calls.append(('second', v)))
+    dispatcher.post(first, 0)
+    dispatcher.post(second, 255)
+    dispatcher.post(first, 1)
+    run_scheduled()
+    assert calls == [('first', 0), ('second', 255), ('first', 1)]
+
+def test_single_schedule_per_burst(dispatcher):
+    with patch('coop_door.coop_door.irq_dispatcher.schedule') as schedule_mock:
+        source = dispatcher.register(MagicMock())
+        dispatcher.post(source)
+        dispatcher.post(source)
+        schedule_mock.assert_called_once()
+        schedule_mock.call_args.args[0](None)
+        dispatcher.post(source)
+        assert schedule_mock.call_count == 2
+
+def test_schedule_retried_when_schedule_queue_full(dispatcher):
+    handler = MagicMock()
+    with patch('coop_door.coop_door.irq_dispatcher.schedule') as schedule_mock:
+        source = dispatcher.register(handler)
+        schedule_mock.side_effect = RuntimeError
+        dispatcher.post(source)
+        schedule_mock.side_effect = None
+        dispatcher.post(source)
+        assert schedule_mock.call_count == 2
+        schedule_mock.call_args.args[0](None)
+        assert handler.call_count == 2
+
+def test_overflow(dispatcher):
+    handler = MagicMock()
+    source = dispatcher.register(handler)
+    for _ in range(6):
+        dispatcher.post(source)
+    assert dispatcher.overflow_count() == 2
+    run_scheduled()
+    assert handler.call_count == 4
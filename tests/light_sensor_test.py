@@ -168,4 +168,92 @@ def test_report_day(light_sensor,
     light_sensor.read()
     observer_mock.assert_called_with(False)
 
+def test_oversampling(light_sensor, adc_mock):
+    light_sensor.set_oversampling(2, median=True)
+    adc_mock.read_u16.side_effect = [ADC_MAX, 0, ADC_MAX, ADC_MAX]
+    light_sensor.read()
+    assert adc_mock.read_u16.call_count == 4
+    assert not light_sensor.is_day()
+    light_sensor.set_oversampling(0)
+    adc_mock.read_u16.side_effect = None
+    adc_mock.read_u16.return_value = 0
+    light_sensor.read()
+    assert adc_mock.read_u16.call_count == 5
+    assert light_sensor.is_day()
+
+def test_set_thresholds(light_sensor, adc_mock):
+    light_sensor.set_thresholds(2 * R_DAY_OHM, 0)
+    adc_mock.read_u16.return_value = ohms_to_adc(2 * R_DAY_OHM - 1)
+    light_sensor.read()
+    assert light_sensor.is_day()
+    light_sensor.set_thresholds(R_DAY_OHM, R_HYSTERESIS_OHM)
+    adc_mock.read_u16.return_value = ohms_to_adc(R_DAY_OHM + R_HYSTERESIS_OHM - 1)
+    light_sensor.read()
+    assert light_sensor.is_day()
+
+def test_thresholds_adc():
+    day, night = LightSensor.thresholds_adc(R_DAY_OHM, R_HYSTERESIS_OHM)
+    assert day == ohms_to_adc(R_DAY_OHM + R_HYSTERESIS_OHM)
+    assert night == ohms_to_adc(R_DAY_OHM - R_HYSTERESIS_OHM)
+
+def test_filter(light_sensor, adc_mock):
+    light_sensor.set_filter(0.5)
+    adc_mock.read_u16.return_value = 0
+    light_sensor.read()
+    assert light_sensor.is_day()
+    # A single dark reading only gets half way
+    adc_mock.read_u16.return_value = 2 * ohms_to_adc(R_DAY_OHM + R_HYSTERESIS_OHM) - 2
+    light_sensor.read()
+    assert light_sensor.is_day()
+    light_sensor.read()
+    assert not light_sensor.is_day()
+    light_sensor.set_filter(None)
+    adc_mock.read_u16.return_value = 0
+    light_sensor.read()
+    assert light_sensor.is_day()
+
+def test_change_only(light_sensor, adc_mock, observer_mock):
+    light_sensor.register_light_slot(observer_mock)
+    light_sensor.set_change_only(True)
+    adc_mock.read_u16.return_value = ADC_MAX
+    light_sensor.read()
+    observer_mock.assert_called_once_with(False)
+    light_sensor.read()
+    light_sensor.read()
+    observer_mock.assert_called_once_with(False)
+    assert light_sensor.suppressed_count() == 2
+    adc_mock.read_u16.return_value = 0
+    light_sensor.read()
+    observer_mock.assert_called_with(True)
+    assert observer_mock.call_count == 2
+    assert light_sensor.suppressed_count() == 2
+
+def test_change_only_dwell(light_sensor, adc_mock, observer_mock):
+    light_sensor.register_light_slot(observer_mock)
+    light_sensor.set_change_only(True, dwell_ms=1000)
+    with patch('coop_door.coop_door.light_sensor.ticks_ms') as ticks_ms_mock:
+        ticks_ms_mock.return_value = 0
+        adc_mock.read_u16.return_value = ADC_MAX
+        # The first condition does not wait
+        light_sensor.read()
+        observer_mock.assert_called_once_with(False)
+        adc_mock.read_u16.return_value = 0
+        light_sensor.read()
+        ticks_ms_mock.return_value = 999
+        light_sensor.read()
+        observer_mock.assert_called_once_with(False)
+        ticks_ms_mock.return_value = 1000
+        light_sensor.read()
+        observer_mock.assert_called_with(True)
+        # A change going back within the dwell is not reported
+        adc_mock.read_u16.return_value = ADC_MAX
+        light_sensor.read()
+        adc_mock.read_u16.return_value = 0
+        ticks_ms_mock.return_value = 3000
+        light_sensor.read()
+        adc_mock.read_u16.return_value = ADC_MAX
+        light_sensor.read()
+        assert observer_mock.call_count == 2
+        assert light_sensor.suppressed_count() == 5
+
 del sys.modules['machine']
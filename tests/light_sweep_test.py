@@ -0,0 +1,83 @@
+import pytest
+
+from .top_level import TopLevel
+
+top_level = TopLevel()
+light_sweep = top_level.import_module('tools.light_sweep')
+sim = top_level.import_module('coop_door.sim')
+IMPORTED = set(top_level.modules)
+
+def test_import_keeps_machine():
+    assert 'tools.light_sweep' in IMPORTED
+    assert 'machine' not in IMPORTED
+
+@pytest.fixture(autouse=True)
+def fake_machine():
+    with top_level:
+        sim.install()
+        sim.Board(sim.VirtualClock(), {}).activate()
+        yield
+
+@pytest.fixture(scope='module')
+def trace():
+    with top_level:
+        sim.install()
+        return light_sweep.synthetic_trace(2, period_ms=60000, seed=3)
+
+class Readings():
+    """ ADC returning the trace samples one by one. """
+    def __init__(self, samples):
+        self.samples = iter(samples)
+
+    def read_u16(self):
+        return int(next(self.samples))
+
+def sensor_decisions(trace, r_light_ohm, r_hysteresis_ohm, k):
+    from coop_door.light_sensor import LightSensor
+    sensor = LightSensor(27, 28)
+    sensor.set_thresholds(r_light_ohm, r_hysteresis_ohm)
+    sensor.set_filter(k)
+    sensor.adc = Readings(trace.adc)
+    decisions = []
+    sensor.register_light_slot(decisions.append)
+    for _ in trace.adc:
+        sensor.read()
+    return decisions
+
+def sweep_decisions(trace, r_light_ohm, r_hysteresis_ohm, k):
+    filtered = light_sweep.FilterBank([k]).sample_shared(trace.adc)
+    indices, is_day = light_sweep.flips(light_sweep.Blocks(filtered), r_light_ohm,
+                                        r_hysteresis_ohm)
+    decisions = []
+    for i in range(len(trace.adc)):
+        if indices and indices[0] == i:
+            indices.pop(0)
+            is_day = not is_day
+        decisions.append(is_day)
+    return decisions
+
+@pytest.mark.parametrize('k', [1, 0.3, 0.05])
+@pytest.mark.parametrize('r_light_ohm, r_hysteresis_ohm',
+                         [(70e3, 4e3), (45e3, 0), (90e3, 10e3)])
+def test_flips_replay_light_sensor(trace, r_light_ohm, r_hysteresis_ohm, k):
+    decisions = sensor_decisions(trace, r_light_ohm, r_hysteresis_ohm, k)
+    assert sweep_decisions(trace, r_light_ohm, r_hysteresis_ohm, k) == decisions
+    # Two days and two nights at least.
+    assert decisions.count(True) and decisions.count(False)
+
+def test_split_tasks():
+    pairs = [(r, 0) for r in range(6)]
+    tasks = light_sweep.split_tasks([0.1], pairs, 4)
+    assert len(tasks) == 4
+    assert all(coefficients == [0.1] for coefficients, _pairs in tasks)
+    assert sorted(p for _k, task_pairs in tasks for p in task_pairs) == pairs
+    tasks = light_sweep.split_tasks([1, 0.5, 0.1], pairs, 2)
+    assert len(tasks) == 2
+    assert sorted(k for ks, _pairs in tasks for k in ks) == [0.1, 0.5, 1]
+    assert light_sweep.split_tasks([1, 0.5], pairs[:1], 8) == [([1], pairs[:1]),
+                                                              ([0.5], pairs[:1])]
+
+def test_sweep_processes_agree(trace):
+    args = (trace, [50e3, 70e3], [0, 4e3], [0.2])
+    assert sorted(light_sweep.sweep(*args, processes=2)) ==\
+        sorted(light_sweep.sweep(*args, processes=1))
@@ -0,0 +1,93 @@
+import logging
+import pytest
+
+from ..coop_door.log_sink import RotatingFlashHandler
+
+class FakeFile():
+    def __init__(self, fs, name):
+        self.fs = fs
+        self.name = name
+
+    def write(self, data):
+        self.fs.files[self.name] = self.fs.files.get(self.name, b'') + bytes(data)
+        self.fs.writes += 1
+
+    def close(self):
+        pass
+
+class FakeFileSystem():
+    def __init__(self):
+        self.files = {}
+        self.writes = 0
+
+    def open(self, name, mode):
+        assert mode == 'ab'
+        return FakeFile(self, name)
+
+    def size(self, name):
+        return len(self.files.get(name, b''))
+
+    def rename(self, old, new):
+        self.files[new] = self.files.pop(old)
+
+    def remove(self, name):
+        self.files.pop(name, None)
+
+@pytest.fixture
+def fs():
+    return FakeFileSystem()
+
+@pytest.fixture
+def handler(fs):
+    h = RotatingFlashHandler('app.log', block_size=64, segment_size=256,
+                             segments=3, fs=fs)
+    h.setFormatter(logging.Formatter('%(message)s'))
+    return h
+
+def record(message, level=logging.INFO):
+    return logging.LogRecord('test', level, __file__, 0, message, None, None)
+
+def test_records_kept_in_ram(handler, fs):
+    handler.emit(record('a' * 10))
+    assert fs.writes == 0
+    handler.flush()
+    assert fs.files['app.log'] == b'a' * 10 + b'\n'
+    assert handler.write_count() == 1
+    assert handler.byte_count() == 11
+
+def test_full_blocks_written(handler, fs):
+    for _ in range(10):
+        handler.emit(record('b' * 19))
+    # 200 bytes buffered, three 64 byte blocks written one by one
+    assert fs.writes == 3
+    assert fs.size('app.log') == 3 * 64
+    assert len(handler.buffer) == 200 - 3 * 64
+
+def test_error_flushes(handler, fs):
+    handler.emit(record('info'))
+    handler.emit(record('error', logging.ERROR))
+    assert fs.files['app.log'] == b'info\nerror\n'
+    assert fs.writes == 1
+
+def test_flush_of_empty_buffer_writes_nothing(handler, fs):
+    handler.flush()
+    assert fs.writes == 0
+
+def test_rotation(handler, fs):
+    for i in range(20):
+        handler.emit(record(f'{i:02d}' * 31))
+    handler.flush()
+    assert sorted(fs.files) == ['app.log', 'app.log.1', 'app.log.2']
+    assert all(size <= 256 for size in map(fs.size, fs.files))
+    assert handler.rotations == 4
+    # Oldest records dropped, the latest ones in the current segment
+    assert fs.files['app.log'].endswith(b'19' * 31 + b'\n')
+    assert not any(b'00' * 31 in data for data in fs.files.values())
+
+def test_continues_existing_segment(fs):
+    fs.files['app.log'] = b'x' * 250
+    h = RotatingFlashHandler('app.log', segment_size=256, fs=fs)
+    h.emit(record('more data'))
+    h.flush()
+    assert fs.files['app.log.1'] == b'x' * 250
+    assert fs.files['app.log'].endswith(b'more data\n')
@@ -0,0 +1,138 @@
+import logging
+import weakref
+from unittest.mock import MagicMock, call
+import pytest
+
+from ..coop_door import log
+from ..coop_door.log import RecordBuffer, Logger
+
+@pytest.fixture
+def buffer():
+    return RecordBuffer(4)
+
+@pytest.fixture
+def facade():
+    log.dump()
+    yield
+    log.dump()
+    log.set_level(log.DEBUG)
+
+def put(buffer, logger, fmt, *args):
+    args = args + (log._NO_ARG,) * (2 - len(args))
+    return buffer.put(logging.DEBUG, logger, fmt, *args)
+
+def test_nothing_formatted_until_dump(buffer):
+    logger = MagicMock()
+    put(buffer, logger, 'a = %s', 1)
+    assert logger.log.call_count == 0
+    buffer.dump()
+    assert logger.log.call_args == call(logging.DEBUG, 'a = %s', 1)
+
+def test_time_stamps(buffer):
+    logger = MagicMock()
+    buffer.stamped = True
+    put(buffer, logger, 'a = %s', 1)
+    buffer.dump()
+    assert logger.log.call_args == call(logging.DEBUG, '(@%d) a = %s', buffer.times[0], 1)
+
+def test_argument_count(buffer):
+    logger = MagicMock()
+    put(buffer, logger, 'none')
+    put(buffer, logger, 'one %s', None)
+    put(buffer, logger, 'two %s %s', 1, 2)
+    buffer.dump()
+    assert [c.args[2:] for c in logger.log.call_args_list] == [(), (None,), (1, 2)]
+
+def test_full_and_wrap_around(buffer):
+    logger = MagicMock()
+    for i in range(3):
+        assert not put(buffer, logger, '%d', i)
+    assert put(buffer, logger, '%d', 3)
+    buffer.dump()
+    assert buffer.count == 0
+    for i in range(4, 7):
+        put(buffer, logger, '%d', i)
+    buffer.dump()
+    assert [c.args[2] for c in logger.log.call_args_list] == list(range(7))
+    assert buffer.dumps == 2
+
+def test_no_argument_references_kept(buffer):
+    class Counter:
+        def __init__(self):
+            self.n = 1
+        def __str__(self):
+            return f'n={self.n}'
+    logger = MagicMock()
+    counter = Counter()
+    counter_ref = weakref.ref(counter)
+    put(buffer, logger, '%s', counter)
+    # Formatted with the state it had when logged.
+    counter.n = 2
+    del counter
+    assert counter_ref() is None
+    buffer.dump()
+    assert logger.log.call_args.args[2] == 'n=1'
+
+def test_argument_kinds(buffer):
+    logger = MagicMock()
+    put(buffer, logger, '%s %s', 7, -1.5)
+    put(buffer, logger, '%s %s', True, None)
+    put(buffer, logger, '%s %s', 'text', 1 << 70)
+    buffer.dump()
+    assert [c.args[2:] for c in logger.log.call_args_list] ==\
+        [(7, -1.5), (True, None), ('text', str(1 << 70))]
+    assert buffer.texts == [None] * 8
+
+def test_loggers_and_formats_stored_once(buffer):
+    logger = MagicMock()
+    for i in range(3):
+        put(buffer, logger, '%d', i)
+    assert buffer.table == [logger, '%d']
+
+def test_level_drops_records(facade):
+    logger = Logger('test')
+    log.set_level(log.INFO)
+    assert not log.debug_on
+    logger.debug('dropped')
+    assert log.records().count == 0
+    logger.info('kept')
+    assert log.records().count == 1
+
+def test_warning_dumps(facade, caplog):
+    logger = Logger('test')
+    with caplog.at_level(logging.DEBUG):
+        logger.debug('first %d', 1)
+        assert caplog.messages == []
+        logger.warning('second')
+    assert log.records().count == 0
+    assert caplog.messages == ['first 1', 'second']
+
+def test_full_buffer_dumps(facade, caplog):
+    logger = Logger('test')
+    with caplog.at_level(logging.DEBUG):
+        for i in range(log.CAPACITY):
+            logger.debug('%d', i)
+    assert len(caplog.messages) == log.CAPACITY
+    assert log.records().count == 0
+
+def test_flush_skips_handlers_without_flush(facade):
+    class Handler:
+        # Like micropython-lib's handlers, no flush.
+        level = logging.NOTSET
+        def __init__(self):
+            self.records = []
+        def handle(self, record):
+            self.records.append(record)
+    handler = Handler()
+    flushed = MagicMock(level=logging.NOTSET)
+    root = logging.getLogger()
+    root.addHandler(handler)
+    root.addHandler(flushed)
+    try:
+        Logger('test').warning('before sleep')
+        log.flush()
+    finally:
+        root.removeHandler(handler)
+        root.removeHandler(flushed)
+    assert len(handler.records) == 1
+    flushed.flush.assert_called_once()
@@ -0,0 +1,62 @@
+import pytest
+
+from ..coop_door.signal_queue import SignalQueue
+
+@pytest.fixture
+def capacity():
+    return 4
+
+@pytest.fixture
+def queue(capacity):
+    return SignalQueue(capacity)
+
+def test_empty_after_init(queue, capacity):
+    assert queue.is_empty()
+    assert len(queue) == 0
+    assert queue.get() is None
+    assert queue.capacity() == capacity
+
+def test_fifo_order(queue):
+    for s in ['a', 'b', 'c']:
+        queue.put(s)
+    assert len(queue) == 3
+    assert [queue.get(), queue.get(), queue.get()] == ['a', 'b', 'c']
+    assert queue.is_empty()
+
+def test_wrap_around(queue, capacity):
+    out = []
+    for i in range(5 * capacity):
+        assert queue.put(i)
+        out.append(queue.get())
+    assert out == list(range(5 * capacity))
+    assert queue.is_empty()
+
+def test_overflow_drops_newest(queue, capacity):
+    for i in range(capacity):
+        assert queue.put(i)
+    assert not queue.put('dropped')
+    assert not queue.put('dropped')
+    assert queue.overflow_count() == 2
+    assert [queue.get() for _ in range(capacity)] == list(range(capacity))
+    assert queue.get() is None
+
+def test_high_water_mark(queue):
+    queue.put(1)
+    queue.put(2)
+    queue.put(3)
+    queue.get()
+    queue.get()
+    queue.put(4)
+    assert queue.high_water_mark() == 3
+
+def test_reset_stats(queue, capacity):
+    for i in range(capacity + 1):
+        queue.put(i)
+    queue.get()
+    queue.reset_stats()
+    assert queue.overflow_count() == 0
+    assert queue.high_water_mark() == capacity - 1
+
+def test_zero_capacity_is_refused():
+    with pytest.raises(AssertionError):
+        SignalQueue(0)
@@ -0,0 +1,97 @@
+import pytest
+
+from .top_level import TopLevel
+
+top_level = TopLevel()
+sim = top_level.import_module('coop_door.sim')
+waveforms = sim.waveforms
+NIGHT = waveforms.light_adc(waveforms.constant(0))
+
+@pytest.fixture(autouse=True)
+def fake_machine():
+    with top_level:
+        yield
+
+@pytest.fixture
+def board():
+    board = sim.Board(sim.VirtualClock(), {})
+    board.activate()
+    return board
+
+def run_all(clock, end_ms):
+    while clock.next_due_ms() is not None and clock.next_due_ms() <= end_ms:
+        clock.run_next()
+
+def test_clock_runs_events_in_time_order():
+    clock = sim.VirtualClock()
+    fired = []
+    for due_ms in (30, 10, 20, 10):
+        clock.schedule(due_ms, lambda due_ms=due_ms: fired.append((due_ms, clock.now_ms)))
+    cancelled = clock.schedule(15, lambda: fired.append('cancelled'))
+    clock.cancel(cancelled)
+    run_all(clock, 100)
+    assert fired == [(10, 10), (10, 10), (20, 20), (30, 30)]
+    assert clock.next_due_ms() is None
+
+def test_timers_fire_in_virtual_time(board):
+    machine = sim.machine.module
+    fired = []
+    periodic = machine.Timer()
+    periodic.init(mode=machine.Timer.PERIODIC, period=30,
+                  callback=lambda _t: fired.append(('periodic', board.clock.now_ms)))
+    machine.Timer().init(mode=machine.Timer.ONE_SHOT, period=50,
+                         callback=lambda _t: fired.append(('one shot', board.clock.now_ms)))
+    run_all(board.clock, 100)
+    assert fired == [('periodic', 30), ('one shot', 50), ('periodic', 60), ('periodic', 90)]
+    periodic.deinit()
+    run_all(board.clock, 1000)
+    assert len(fired) == 4
+    assert sim.machine.ticks_ms() == 90
+
+def test_door_stops_at_end_switches(board):
+    machine = sim.machine.module
+    door = sim.Door(board.clock)
+    board.attach(door)
+    levels = []
+    switches = [machine.Pin(door.pins['close_switch']), machine.Pin(door.pins['open_switch'])]
+    for switch in switches:
+        # The door calls the handlers of both on any edge.
+        switch.irq(handler=lambda _pin: levels.append(
+            (board.clock.now_ms, [s.value() for s in switches])))
+    assert [switch.value() for switch in switches] == [0, 1]
+    machine.Pin(door.pins['enable']).value(1)
+    motor = machine.PWM(machine.Pin(door.pins['open']), freq=1000, duty_u16=65535)
+    run_all(board.clock, 2 * door.TRAVEL_MS)
+    # The switches change within the travel, the door stops at the end.
+    assert levels == [(door.margin_ms + 1, [1, 1]), (door.margin_ms + 1, [1, 1]),
+                      (door.TRAVEL_MS - door.margin_ms + 1, [1, 0]),
+                      (door.TRAVEL_MS - door.margin_ms + 1, [1, 0])]
+    door.update(2 * door.TRAVEL_MS)
+    assert door.position_ms == door.TRAVEL_MS
+    assert door.is_open()
+    motor.deinit()
+    assert door.moves == 1
+    assert len(door.peak_currents_a) == 1
+
+def test_one_day_opens_and_closes_once():
+    simulation = sim.Simulation(waveforms.light_adc(waveforms.sun(6.0, 20.0)))
+    metrics = simulation.run_day()
+    assert metrics.moves == 2
+    assert metrics.open_h == pytest.approx(14.0, abs=0.1)
+    assert len(simulation.open_latencies_ms) == 1
+    assert len(simulation.close_latencies_ms) == 1
+    assert simulation.failed_moves() == 0
+    assert simulation.door.is_closed()
+    assert simulation.hardware_timers() == 1
+
+def test_wakeups_counted():
+    minutes = 10
+    fixed = sim.Simulation(NIGHT, idle_wake_up_period_ms=100)
+    fixed.run_until(minutes * 60000)
+    assert fixed.wakeups == minutes * 600
+    adaptive = sim.Simulation(NIGHT)
+    adaptive.run_until(minutes * 60000)
+    # The door is closed, fast wake-ups until the night is told.
+    idle_wakeups = minutes * 60000 // adaptive.controller.IDLE_WAKE_UP_PERIOD_MS
+    assert idle_wakeups <= adaptive.wakeups <= idle_wakeups + 5
+    assert adaptive.door.moves == 0
@@ -2,9 +2,12 @@ import pytest
 from unittest.mock import MagicMock
 from unittest.mock import patch
 
+import struct
 import sys
 sys.modules['machine'] = MagicMock()
-from ..coop_door.state_machine import StateMachine, State, Signal, Choice
+from ..coop_door.state_machine import StateMachine, State, Signal, Choice, MachineScheduler,\
+    Graph, Timeout, SignalFamily
+from ..coop_door.trace import Recorder, RECORD_FORMAT, RECORD_SIZE, ENTER
 
 sys.modules['coop_door.coop_door.timer'] = MagicMock()
 
@@ -294,6 +297,314 @@ def test_choice_actions_are_executed(state_machine, states):
     state_machine.start()
     assert calls == ['fast lights action', 'green action']
 
+def test_transitions_are_compiled_on_start(state_machine, states):
+    go = Signal()
+    inner_state = State('inner_state', states['red'])
+    states['red'].set_init_state(inner_state)
+    transition = inner_state.on_signal(go).go_to(states['green'])
+    state_machine.set_init_state(states['red'])
+    assert transition.entry_path is None
+    state_machine.start()
+    assert transition.exit_state is states['red']
+    assert transition.entry_path == ()
+
+def test_compiled_entry_path_of_nested_target(state_machine, states):
+    go = Signal()
+    inner_state = State('inner_state', states['green'])
+    inner_inner_state = State('inner_inner_state', inner_state)
+    transition = states['red'].on_signal(go).go_to(inner_inner_state)
+    state_machine.set_init_state(states['red'])
+    state_machine.start()
+    assert transition.exit_state is states['red']
+    assert transition.entry_path == (states['green'], inner_state)
+    send_signal(state_machine, go)
+    assert state_machine.current_state is states['green']
+    assert states['green'].current_state is inner_state
+    assert inner_state.current_state is inner_inner_state
+
+def test_transition_added_after_start(state_machine, states):
+    go = Signal()
+    state_machine.set_init_state(states['red'])
+    state_machine.start()
+    states['red'].on_signal(go).go_to(states['green'])
+    send_signal(state_machine, go)
+    assert state_machine.current_state is states['green']
+
+def test_signals_are_dropped_on_full_queue():
+    go = Signal()
+    state_machine = StateMachine('small', queue_capacity=2)
+    red = State('red', state_machine)
+    green = State('green', state_machine)
+    red.on_signal(go).go_to(green)
+    green.on_signal(go).go_to(red)
+    state_machine.set_init_state(red)
+    state_machine.start()
+    assert state_machine.send_signal(go)
+    assert state_machine.send_signal(go)
+    assert not state_machine.send_signal(go)
+    assert state_machine.signal_queue.overflow_count() == 1
+    while state_machine.anything_to_do():
+        state_machine.process_signal()
+    assert state_machine.current_state is red
+
+@pytest.fixture
+def ping_pong(state_machine, states):
+    go = Signal()
+    states['red'].on_signal(go).go_to(states['green'])
+    states['green'].on_signal(go).go_to(states['red'])
+    state_machine.set_init_state(states['red'])
+    state_machine.start()
+    return go
+
+def test_process_all_drains_queue(state_machine, states, ping_pong):
+    for _ in range(3):
+        state_machine.send_signal(ping_pong)
+    assert state_machine.process_all() == 3
+    assert not state_machine.anything_to_do()
+    assert state_machine.current_state is states['green']
+
+def test_process_all_handles_signals_sent_while_processing(state_machine, states, ping_pong):
+    entries = []
+    def green_entry():
+        entries.append('green')
+        if len(entries) == 1:
+            state_machine.send_signal(ping_pong)
+    states['green'].do_on_entry(green_entry)
+    state_machine.send_signal(ping_pong)
+    assert state_machine.process_all() == 2
+    assert state_machine.current_state is states['red']
+
+def test_process_all_max_signals(state_machine, ping_pong):
+    for _ in range(5):
+        state_machine.send_signal(ping_pong)
+    assert state_machine.process_all(max_signals=2) == 2
+    assert len(state_machine.signal_queue) == 3
+
+def test_process_all_deadline(state_machine, ping_pong):
+    with patch('coop_door.coop_door.state_machine.ticks_us') as ticks_us_mock:
+        ticks_us_mock.side_effect = [100, 200, 300]
+        for _ in range(5):
+            state_machine.send_signal(ping_pong)
+        assert state_machine.process_all(deadline_us=300) == 2
+        assert len(state_machine.signal_queue) == 3
+
+def test_urgent_signal_goes_first(state_machine, states):
+    go = Signal('go')
+    stop = Signal('stop', Signal.URGENT)
+    states['red'].on_signal(go).go_to(states['green'])
+    states['red'].on_signal(stop).go_to(states['orange'])
+    state_machine.set_init_state(states['red'])
+    state_machine.start()
+    state_machine.send_signal(go)
+    state_machine.send_signal(stop)
+    state_machine.process_signal()
+    assert state_machine.current_state is states['orange']
+    assert state_machine.anything_to_do()
+    state_machine.process_signal()
+    assert not state_machine.anything_to_do()
+
+def test_repeated_signals_are_coalesced(state_machine, states):
+    go = Signal('go', family=SignalFamily())
+    entries = []
+    states['red'].on_signal(go).go_to(states['green'])
+    states['green'].on_signal(go).go_to(states['red'])
+    states['green'].do_on_entry(lambda: entries.append('green'))
+    state_machine.set_init_state(states['red'])
+    state_machine.start()
+    for _ in range(3):
+        assert state_machine.send_signal(go)
+    assert len(state_machine.signal_queue) == 1
+    assert state_machine.coalesced_count() == 2
+    assert state_machine.process_all() == 1
+    assert state_machine.current_state is states['green']
+    # Queued again once handled
+    state_machine.send_signal(go)
+    assert state_machine.process_all() == 1
+    assert state_machine.current_state is states['red']
+    assert entries == ['green']
+
+def test_latest_signal_of_family_wins(state_machine, states):
+    switch = SignalFamily()
+    on = Signal('on', family=switch)
+    off = Signal('off', family=switch)
+    other = Signal('other')
+    states['red'].on_signal(on).go_to(states['green'])
+    states['red'].on_signal(off).go_to(states['orange'])
+    state_machine.set_init_state(states['red'])
+    state_machine.start()
+    state_machine.send_signal(on)
+    state_machine.send_signal(other)
+    state_machine.send_signal(off)
+    assert len(state_machine.signal_queue) == 2
+    state_machine.process_signal()
+    assert state_machine.current_state is states['orange']
+
+def test_family_is_dropped_on_full_queue():
+    go = Signal('go', family=SignalFamily())
+    state_machine = StateMachine('small', queue_capacity=1)
+    State('red', state_machine)
+    state_machine.send_signal(Signal())
+    assert not state_machine.send_signal(go)
+    assert not go.family.is_queued
+    state_machine.process_signal()
+    assert state_machine.send_signal(go)
+    assert go.family.is_queued
+
+def test_scheduler_runs_machines_to_completion():
+    calls = []
+    ping = Signal('ping')
+    pong = Signal('pong')
+    first = StateMachine('first')
+    second = StateMachine('second')
+    for machine, signal, other, other_signal in [(first, ping, second, pong),
+                                                 (second, pong, first, ping)]:
+        idle = State('idle', machine)
+        busy = State('busy', machine)
+        machine.set_init_state(idle)
+        idle.on_signal(signal).go_to(busy)
+        busy.do_on_entry(lambda m=machine, o=other, s=other_signal:
+                         (calls.append(m.name), o.send_signal(s)))
+        machine.start()
+    scheduler = MachineScheduler([first, second])
+    second.send_signal(pong)
+    assert scheduler.anything_to_do()
+    assert scheduler.run() == 3
+    assert calls == ['second', 'first']
+    assert not scheduler.anything_to_do()
+
+def test_scheduler_prefers_higher_priority(ping_pong):
+    order = []
+    low = StateMachine('low')
+    high = StateMachine('high')
+    for machine in [low, high]:
+        idle = State('idle', machine)
+        machine.set_init_state(idle)
+        idle.on_signal(ping_pong).go_to(idle).do(lambda m=machine: order.append(m.name))
+        machine.start()
+    low.send_signal(ping_pong)
+    high.send_signal(ping_pong)
+    high.send_signal(ping_pong)
+    MachineScheduler([high, low]).run()
+    assert order == ['high', 'high', 'low']
+
+def test_scheduler_budget(ping_pong, state_machine):
+    with patch('coop_door.coop_door.state_machine.ticks_us') as ticks_us_mock:
+        ticks_us_mock.side_effect = [0, 10, 20, 30, 40]
+        for _ in range(5):
+            state_machine.send_signal(ping_pong)
+        assert MachineScheduler([state_machine]).run(budget_us=25) == 2
+
+def test_signal_slot_called_on_queued_signal(state_machine):
+    slot = MagicMock()
+    state_machine.register_signal_slot(slot)
+    state_machine.send_signal(Signal())
+    slot.assert_called_once()
+
+class Owner():
+    def __init__(self):
+        self.go = Signal('go')
+        self.back = Signal('back')
+        self.delay_ms = 1234
+        self.log = []
+        self.is_ready = True
+
+    def ready(self):
+        return self.is_ready
+
+    def not_ready(self):
+        return not self.is_ready
+
+    def enter_b2(self):
+        self.log.append('b2')
+
+    def timed_out(self):
+        self.log.append('timeout')
+
+GRAPH = Graph('graph',
+              states=(('a', None, State),
+                      ('b', None, State),
+                      ('b1', 'b', Choice),
+                      ('b2', 'b', State),
+                      ('b3', 'b', State)),
+              initial=((None, 'a'), ('b', 'b1')),
+              transitions=(('a', 'go', 'b', None, None),
+                           ('b', 'back', 'a', None, None),
+                           ('b1', None, 'b2', 'ready', None),
+                           ('b1', None, 'b3', 'not_ready', None),
+                           ('b2', Timeout('delay_ms'), 'b3', None, 'timed_out')),
+              actions=(('b2', 'enter_b2', None),))
+
+def test_graph_instance_runs():
+    owner = Owner()
+    machine = GRAPH.instantiate(owner)
+    machine.start()
+    assert machine.name == 'graph'
+    assert machine.current_state.name == 'a'
+    send_signal(machine, owner.go)
+    assert machine.current_state.current_state.name == 'b2'
+    assert owner.log == ['b2']
+    send_signal(machine, owner.back)
+    owner.is_ready = False
+    send_signal(machine, owner.go)
+    assert machine.current_state.current_state.name == 'b3'
+
+def test_graph_timeout():
+    owner = Owner()
+    with patch('coop_door.coop_door.state_machine.Timer') as Timer_mock:
+        machine = GRAPH.instantiate(owner)
+        assert Timer_mock.call_args.args[0] == owner.delay_ms
+        timeout_slot = Timer_mock.call_args.args[1]
+    machine.start()
+    send_signal(machine, owner.go)
+    timeout_slot()
+    assert machine.current_state.current_state.name == 'b3'
+    assert owner.log == ['b2', 'timeout']
+
+def test_graph_paths_compiled_as_transitions():
+    machine = GRAPH.instantiate(Owner())
+    def transitions(state):
+        yield from state.transitions.values()
+        for substate in state.substates:
+            yield from transitions(substate)
+    frozen = [(t.exit_state, t.entry_path) for t in transitions(machine)]
+    for t in transitions(machine):
+        t.compile()
+    assert frozen == [(t.exit_state, t.entry_path) for t in transitions(machine)]
+
+def test_machines_of_a_graph_traced_apart():
+    recorder = Recorder(fs=MagicMock())
+    Recorder.use(recorder)
+    try:
+        machines = [GRAPH.instantiate(Owner()) for _ in range(2)]
+    finally:
+        Recorder.use(None)
+    assert [recorder.names[m.trace_id - 1] for m in machines] == ['graph', 'graph#2']
+    for machine in machines:
+        machine.start()
+    records = [struct.unpack_from(RECORD_FORMAT, recorder.buffer, i * RECORD_SIZE)[1:]
+               for i in range(1, recorder.count)]
+    a = machines[0].current_state.trace_id
+    assert machines[1].current_state.trace_id == a
+    first, second = (m.trace_id for m in machines)
+    assert records == [(ENTER, first, first), (ENTER, first, a),
+                       (ENTER, second, second), (ENTER, second, a)]
+
+def test_scheduler_insert(ping_pong):
+    order = []
+    machines = []
+    for name in ['low', 'high']:
+        machine = StateMachine(name)
+        idle = State('idle', machine)
+        machine.set_init_state(idle)
+        idle.on_signal(ping_pong).go_to(idle).do(lambda m=machine: order.append(m.name))
+        machine.start()
+        machine.send_signal(ping_pong)
+        machines.append(machine)
+    scheduler = MachineScheduler([machines[0]])
+    scheduler.insert(0, machines[1])
+    scheduler.run()
+    assert order == ['high', 'low']
+
 del sys.modules['machine']
 del sys.modules['coop_door.coop_door.timer']
 
@@ -4,7 +4,8 @@ from unittest.mock import patch
 
 import sys
 sys.modules['machine'] = MagicMock()
-from ..coop_door.timer import Timer
+from ..coop_door.timer import Timer, TimerScheduler
+from ..coop_door.irq_dispatcher import IrqDispatcher, run_scheduled
 
 @pytest.fixture
 def machine_timer_mock():
@@ -64,4 +65,140 @@ def test_becomes_inactive_after_timeout(timer, machine_timer_mock):
     machine_timer_slot(None)
     assert not timer.active()
 
+def test_set_timeout(timer, machine_timer_mock):
+    timer.set_timeout(1000)
+    timer.start()
+    assert machine_timer_mock.init.call_args.kwargs['period'] == 1000
+
+class FakeTicks:
+    def __init__(self):
+        self.ms = 0
+    def __call__(self):
+        return self.ms
+
+@pytest.fixture
+def ticks():
+    return FakeTicks()
+
+@pytest.fixture
+def scheduler(machine_timer_mock, ticks):
+    with (patch('coop_door.coop_door.timer.MachineTimer') as MachineTimer_mock,
+          patch('coop_door.coop_door.timer.ticks_ms', ticks)):
+        MachineTimer_mock.return_value = machine_timer_mock
+        scheduler = TimerScheduler()
+        Timer.use_scheduler(scheduler)
+        yield scheduler
+        Timer.use_scheduler(None)
+
+def fire(machine_timer_mock, ticks):
+    """ Let the armed hardware timer expire. """
+    kwargs = machine_timer_mock.init.call_args.kwargs
+    ticks.ms += kwargs['period']
+    machine_timer_mock.init.reset_mock()
+    kwargs['callback'](None)
+
+def test_scheduled_timers_share_hardware_timer(scheduler):
+    with patch('coop_door.coop_door.timer.MachineTimer') as MachineTimer_mock:
+        Timer(100, None)
+        Timer(200, None, Timer.SINGLE_SHOT)
+        MachineTimer_mock.assert_not_called()
+    assert scheduler.timer_count() == 2
+
+def test_scheduler_arms_earliest_timer(scheduler, machine_timer_mock, ticks):
+    slow = MagicMock()
+    fast = MagicMock()
+    Timer(500, slow, Timer.SINGLE_SHOT).start()
+    Timer(200, fast, Timer.SINGLE_SHOT).start()
+    assert machine_timer_mock.init.call_args.kwargs['mode'] == machine_timer_mock.ONE_SHOT
+    assert machine_timer_mock.init.call_args.kwargs['period'] == 200
+    fire(machine_timer_mock, ticks)
+    fast.assert_called_once()
+    slow.assert_not_called()
+    assert machine_timer_mock.init.call_args.kwargs['period'] == 300
+    fire(machine_timer_mock, ticks)
+    slow.assert_called_once()
+    assert scheduler.active_count() == 0
+    assert scheduler.peak_active_count() == 2
+
+def test_scheduled_periodic_timer(scheduler, machine_timer_mock, ticks):
+    slot = MagicMock()
+    Timer(100, slot).start()
+    for _ in range(3):
+        fire(machine_timer_mock, ticks)
+    assert slot.call_count == 3
+    assert machine_timer_mock.init.call_args.kwargs['period'] == 100
+    assert scheduler.active_count() == 1
+
+def test_stopped_scheduled_timer_does_not_fire(scheduler, machine_timer_mock, ticks):
+    stopped = MagicMock()
+    running = MagicMock()
+    timer = Timer(100, stopped, Timer.SINGLE_SHOT)
+    timer.start()
+    Timer(300, running, Timer.SINGLE_SHOT).start()
+    timer.stop()
+    assert not timer.active()
+    ticks.ms = 300
+    machine_timer_mock.init.call_args.kwargs['callback'](None)
+    stopped.assert_not_called()
+    running.assert_called_once()
+
+def test_hardware_timer_released_when_all_stopped(scheduler, machine_timer_mock):
+    timer = Timer(100, None)
+    timer.start()
+    timer.stop()
+    machine_timer_mock.deinit.assert_called()
+    assert scheduler.active_count() == 0
+
+def test_restart_scheduled_timer(scheduler, machine_timer_mock, ticks):
+    slot = MagicMock()
+    timer = Timer(100, slot, Timer.SINGLE_SHOT)
+    timer.start()
+    ticks.ms = 50
+    timer.start()
+    assert scheduler.active_count() == 1
+    ticks.ms = 100
+    machine_timer_mock.init.call_args.kwargs['callback'](None)
+    slot.assert_not_called()
+    fire(machine_timer_mock, ticks)
+    slot.assert_called_once()
+
+def test_scheduler_time_rebase(scheduler, machine_timer_mock, ticks):
+    slot = MagicMock()
+    Timer(100, slot).start()
+    ticks.ms = TimerScheduler.REBASE_MS
+    machine_timer_mock.init.call_args.kwargs['callback'](None)
+    slot.assert_called_once()
+    assert scheduler.now_ms == 0
+    fire(machine_timer_mock, ticks)
+    assert slot.call_count == 2
+
+@pytest.fixture
+def dispatcher():
+    dispatcher = IrqDispatcher()
+    IrqDispatcher.use(dispatcher)
+    yield dispatcher
+    IrqDispatcher.use(None)
+
+def test_deferred_timeout(dispatcher, machine_timer_mock):
+    slot = MagicMock()
+    with patch('coop_door.coop_door.timer.MachineTimer') as MachineTimer_mock:
+        MachineTimer_mock.return_value = machine_timer_mock
+        timer = Timer(100, slot, Timer.SINGLE_SHOT)
+    timer.start()
+    machine_timer_mock.init.call_args.kwargs['callback'](None)
+    slot.assert_not_called()
+    run_scheduled()
+    slot.assert_called_once()
+
+def test_deferred_timeout_dropped_after_stop(dispatcher, machine_timer_mock):
+    slot = MagicMock()
+    with patch('coop_door.coop_door.timer.MachineTimer') as MachineTimer_mock:
+        MachineTimer_mock.return_value = machine_timer_mock
+        timer = Timer(100, slot, Timer.SINGLE_SHOT)
+    timer.start()
+    machine_timer_mock.init.call_args.kwargs['callback'](None)
+    timer.stop()
+    run_scheduled()
+    slot.assert_not_called()
+
 del sys.modules['machine']
@@ -0,0 +1,42 @@
+""" The host tools, the simulator and the benchmarks import coop_door
+as a top level package, the way they run from the repository root.
+TopLevel imports them so beside the coop_door.coop_door modules of
+the unit tests and swaps its modules in while a test runs, the fake
+machine module of the simulator included.
+"""
+import importlib
+import os
+import sys
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGES = ('coop_door', 'tools', 'benchmarks', 'machine', 'micropython')
+
+def _ours(name):
+    return name.split('.')[0] in PACKAGES
+
+class TopLevel():
+    """ Top level modules of the repository, in use within a with block. """
+    def __init__(self):
+        self.modules = {}
+        self.saved = None
+
+    def __enter__(self):
+        self.saved = {name : module for name, module in sys.modules.items() if _ours(name)}
+        for name in self.saved:
+            del sys.modules[name]
+        sys.modules.update(self.modules)
+        sys.path.insert(0, REPO)
+        return self
+
+    def __exit__(self, *_exc):
+        sys.path.remove(REPO)
+        self.modules = {name : module for name, module in sys.modules.items() if _ours(name)}
+        for name in self.modules:
+            del sys.modules[name]
+        sys.modules.update(self.saved)
+        self.saved = None
+
+    def import_module(self, name):
+        """ Import a module, return it. """
+        with self:
+            return importlib.import_module(name)
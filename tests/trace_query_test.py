@@ -0,0 +1,194 @@
+import importlib
+import os
+import struct
+import sys
+import pytest
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PERIOD = 1 << 30
+
+def _import_tools():
+    # The tools import coop_door as a top level package, the way they
+    # run from the repository root.
+    def ours(name):
+        return name.split('.')[0] in ('coop_door', 'tools')
+    saved = {name : module for name, module in sys.modules.items() if ours(name)}
+    for name in saved:
+        del sys.modules[name]
+    sys.path.insert(0, REPO)
+    try:
+        return (importlib.import_module('tools.trace_query'),
+                importlib.import_module('tools.trace_decode'),
+                importlib.import_module('coop_door.trace'))
+    finally:
+        sys.path.remove(REPO)
+        for name in [name for name in sys.modules if ours(name)]:
+            del sys.modules[name]
+        sys.modules.update(saved)
+
+trace_query, trace_decode, trace = _import_tools()
+BOOT, SIGNAL, ENTER, EXIT, LIGHT = trace.BOOT, trace.SIGNAL, trace.ENTER, trace.EXIT,\
+    trace.LIGHT_ADC
+
+def write_trace(path, records):
+    with open(path, 'wb') as file:
+        for record in records:
+            file.write(struct.pack(trace.RECORD_FORMAT, *record))
+
+def synthetic_records():
+    """ Records with a ticks_ms wrap-around in the first segment and
+    a reboot in the second one, (ticks, event, source, value).
+    """
+    events = [(LIGHT, 0, 900), (SIGNAL, 1, 2), (EXIT, 1, 3), (ENTER, 1, 4),
+              (SIGNAL, 1, 5), (LIGHT, 0, 100)]
+    first = [(PERIOD - 4000, BOOT, 0, 0)]
+    ticks = PERIOD - 4000
+    for i in range(25):
+        ticks = (ticks + 250 + 10 * i) % PERIOD
+        first.append((ticks,) + events[i % len(events)])
+    second = []
+    for i in range(20):
+        ticks = (ticks + 300) % PERIOD
+        second.append((ticks,) + events[(i + 2) % len(events)])
+    ticks = 7
+    second.append((ticks, BOOT, 0, 0))
+    for i in range(15):
+        ticks += 40 + i
+        second.append((ticks,) + events[(i + 4) % len(events)])
+    return first, second
+
+@pytest.fixture
+def trace_paths(tmp_path):
+    first, second = synthetic_records()
+    paths = [str(tmp_path / 'trace.bin.1'), str(tmp_path / 'trace.bin')]
+    write_trace(paths[0], first)
+    write_trace(paths[1], second)
+    return paths
+
+@pytest.fixture
+def index(trace_paths):
+    return trace_query.TraceIndex(trace_paths, stride=4)
+
+def test_trace_records_match_decode(trace_paths, index):
+    expected = list(trace_decode.records(trace_paths))
+    assert list(index.records()) == expected
+    assert index.end_ms == expected[-1][0]
+
+def test_trace_time_range(trace_paths, index):
+    expected = list(trace_decode.records(trace_paths))
+    start_ms = expected[10][0]
+    end_ms = expected[40][0]
+    assert list(index.records(start_ms, end_ms)) ==\
+        [r for r in expected if start_ms <= r[0] < end_ms]
+
+def test_trace_event_filter(trace_paths, index):
+    expected = list(trace_decode.records(trace_paths))
+    events = (1 << SIGNAL) | (1 << BOOT)
+    assert list(index.records(events=events)) ==\
+        [r for r in expected if r[1] in (SIGNAL, BOOT)]
+
+def test_trace_id_filter(trace_paths, index):
+    expected = list(trace_decode.records(trace_paths))
+    assert list(index.records(signals=1 << 5, states=1 << 4)) ==\
+        [r for r in expected if (r[1] == SIGNAL and r[3] == 5)
+         or (r[1] in (ENTER, EXIT) and r[3] == 4)]
+    assert list(index.records(events=1 << ENTER, states=(1 << 3) | (1 << 4))) ==\
+        [r for r in expected if r[1] == ENTER and r[3] in (3, 4)]
+
+def test_describe_names_the_machine():
+    names = ['?', 'machine', 'idle', 'go', 'machine#2']
+    assert trace_decode.describe((1500, ENTER, 4, 2), names).split() ==\
+        ['1.500', 'enter', 'idle', 'of', 'machine#2']
+    assert trace_decode.describe((1500, EXIT, 0, 2), names).split() == ['1.500', 'exit', 'idle']
+    assert trace_decode.describe((1500, SIGNAL, 1, 3), names).split() ==\
+        ['1.500', 'signal', 'go', '->', 'machine']
+
+def test_trace_time_range_of_equal_times(tmp_path):
+    path = str(tmp_path / 'trace.bin')
+    write_trace(path, [(100, BOOT, 0, 0)] + [(100 + 10 * (i // 6), LIGHT, 0, i)
+                                             for i in range(18)])
+    index = trace_query.TraceIndex([path], stride=4)
+    expected = list(trace_decode.records([path]))
+    assert list(index.records(10, 20)) == [r for r in expected if 10 <= r[0] < 20]
+
+def test_segments_oldest_first(tmp_path, trace_paths):
+    os.utime(trace_paths[0], (1000, 1000))
+    os.utime(trace_paths[1], (1000, 1000))
+    (tmp_path / 'trace.bin.names').write_text('')
+    assert trace_query.segments(str(tmp_path), 'trace.bin') == trace_paths
+
+def log_times(segments):
+    """ (t_ms, line) of all lines: a stamped line takes the time of
+    its stamp, other lines the time of the line before.
+    """
+    rows = []
+    t_ms = 0
+    last_ticks = None
+    for lines in segments:
+        for line in lines:
+            if '(@' in line:
+                ticks = int(line.split('(@')[1].split(')')[0])
+                if last_ticks is not None:
+                    delta = (ticks - last_ticks) % PERIOD
+                    if delta < PERIOD // 2:
+                        t_ms += delta
+                last_ticks = ticks
+            rows.append((t_ms, line))
+    return rows
+
+def synthetic_log():
+    """ Log segments with a wrap-around and a reboot, unstamped lines
+    at the start of the second segment.
+    """
+    first = []
+    ticks = PERIOD - 3000
+    for i in range(30):
+        ticks = (ticks + 200) % PERIOD
+        first.append(f'INFO:coop_door.door_controller:(@{ticks}) door {i}')
+        if i % 7 == 3:
+            first.append(f'door traceback {i}')
+    second = ['door traceback at the start', 'door traceback continued']
+    for i in range(30):
+        ticks = (ticks + 150) % PERIOD if i != 12 else 5
+        second.append(f'WARNING:coop_door.door_move_controller:(@{ticks}) door {i}')
+    return first, second
+
+@pytest.fixture
+def log_segments(tmp_path):
+    segments = synthetic_log()
+    paths = [str(tmp_path / 'app.log.1'), str(tmp_path / 'app.log')]
+    for path, lines in zip(paths, segments):
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write('\n'.join(lines) + '\n')
+    return paths, segments
+
+def test_log_grep_matches_line_times(log_segments):
+    paths, segments = log_segments
+    index = trace_query.LogIndex(paths, stride=64)
+    expected = log_times(segments)
+    assert list(index.grep('door')) == expected
+    assert list(index.grep('traceback')) == [row for row in expected if 'traceback' in row[1]]
+
+def test_log_grep_time_range(log_segments):
+    paths, segments = log_segments
+    index = trace_query.LogIndex(paths, stride=64)
+    expected = log_times(segments)
+    start_ms = expected[20][0]
+    end_ms = expected[50][0]
+    assert list(index.grep('door', start_ms, end_ms)) ==\
+        [row for row in expected if start_ms <= row[0] < end_ms]
+
+def test_door_index_cached(tmp_path, trace_paths, log_segments):
+    door = trace_query.Door(str(tmp_path))
+    assert os.path.exists(tmp_path / trace_query.CACHE_NAME)
+    cached = trace_query.Door(str(tmp_path))
+    assert cached.trace.times == door.trace.times
+    assert list(cached.log.grep('door')) == list(door.log.grep('door'))
+
+def test_door_cache_not_writable(tmp_path, trace_paths, log_segments):
+    door = trace_query.Door(str(tmp_path), cache=False)
+    # Neither read nor written, as in a read-only directory.
+    (tmp_path / trace_query.CACHE_NAME).mkdir()
+    uncached = trace_query.Door(str(tmp_path))
+    assert uncached.trace.times == door.trace.times
+    assert list(uncached.log.grep('door')) == list(door.log.grep('door'))
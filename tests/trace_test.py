@@ -0,0 +1,106 @@
+import struct
+import pytest
+from unittest.mock import patch
+
+from ..coop_door.trace import Recorder, RECORD_FORMAT, BOOT, LIGHT_ADC, ENTER
+
+class FakeFile():
+    def __init__(self, fs, name, mode):
+        self.fs = fs
+        self.name = name
+        if mode == 'wb':
+            fs.files[name] = b''
+
+    def write(self, data):
+        self.fs.files[self.name] = self.fs.files.get(self.name, b'') + bytes(data)
+        self.fs.writes += 1
+
+    def close(self):
+        pass
+
+class FakeFileSystem():
+    def __init__(self):
+        self.files = {}
+        self.writes = 0
+
+    def open(self, name, mode):
+        return FakeFile(self, name, mode)
+
+    def size(self, name):
+        return len(self.files.get(name, b''))
+
+    def rename(self, old, new):
+        self.files[new] = self.files.pop(old)
+
+    def remove(self, name):
+        self.files.pop(name, None)
+
+@pytest.fixture
+def fs():
+    return FakeFileSystem()
+
+@pytest.fixture
+def recorder(fs):
+    with patch('coop_door.coop_door.trace.ticks_ms') as ticks_ms:
+        ticks_ms.return_value = 7
+        yield Recorder('trace.bin', capacity=8, block=4, segment_size=64, fs=fs)
+
+def unpack(data):
+    return list(struct.iter_unpack(RECORD_FORMAT, data))
+
+def test_boot_recorded_and_kept_in_ram(recorder, fs):
+    recorder.record(LIGHT_ADC, 0, 1234)
+    assert recorder.pending() == 2
+    assert fs.writes == 0
+    recorder.flush()
+    assert unpack(fs.files['trace.bin']) == [(7, BOOT, 0, 0), (7, LIGHT_ADC, 0, 1234)]
+    assert recorder.pending() == 0
+
+def test_full_blocks_written(recorder, fs):
+    for value in range(6):
+        recorder.record(LIGHT_ADC, 0, value)
+    recorder.flush_blocks()
+    assert len(unpack(fs.files['trace.bin'])) == 4
+    assert recorder.pending() == 3
+
+def test_overwritten_records_dropped(recorder, fs):
+    for value in range(10):
+        recorder.record(LIGHT_ADC, 0, value)
+    assert recorder.dropped_count() == 3
+    recorder.flush()
+    assert [r[3] for r in unpack(fs.files['trace.bin'])] == list(range(2, 10))
+
+def test_write_wraps_around_ring(recorder, fs):
+    recorder.segment_size = 1024
+    for value in range(5):
+        recorder.record(LIGHT_ADC, 0, value)
+    recorder.flush()
+    for value in range(5, 11):
+        recorder.record(LIGHT_ADC, 0, value)
+    recorder.flush()
+    assert [r[3] for r in unpack(fs.files['trace.bin'])[1:]] == list(range(11))
+
+def test_names_written(recorder, fs):
+    state = recorder.name_id('idle')
+    assert recorder.name_id('active') == state + 1
+    assert recorder.name_id('idle') == state
+    recorder.record(ENTER, 0, state)
+    recorder.flush()
+    assert fs.files['trace.bin.names'] == b'idle\nactive\n'
+
+def test_machine_ids(recorder, fs):
+    first = recorder.machine_id('machine')
+    assert recorder.name_id('machine') == first
+    second = recorder.machine_id('machine')
+    assert second != first
+    assert recorder.machine_id('other') not in (first, second)
+    recorder.flush()
+    assert fs.files['trace.bin.names'] == b'machine\nmachine#2\nother\n'
+
+def test_segments_rotate(recorder, fs):
+    for _ in range(3):
+        for value in range(4):
+            recorder.record(LIGHT_ADC, 0, value)
+        recorder.flush()
+    assert len(fs.files['trace.bin.1']) == 40
+    assert len(fs.files['trace.bin']) == 64
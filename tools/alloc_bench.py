@@ -0,0 +1,67 @@
+""" Heap allocation per sensor read, float versus fixed point.
+On the Pico the gc.mem_free() delta over a number of reads is
+measured with the garbage collector disabled:
+    mpremote run tools/alloc_bench.py
+On a host python the sensors run on the fake machine module of
+coop_door.sim and tracemalloc gives an indicative figure only,
+host ints and floats are not allocated the way micropython ones are:
+    python -m tools.alloc_bench
+"""
+import gc
+
+try:
+    import machine # pylint: disable=unused-import
+except ImportError:
+    from coop_door.sim import Board, VirtualClock, install, waveforms
+    install()
+    Board(VirtualClock(), {27 : waveforms.light_adc(),
+                           26 : waveforms.battery_adc()}).activate()
+
+# pylint: disable=wrong-import-position, import-error, no-name-in-module
+from coop_door.light_sensor import LightSensor
+from coop_door.battery_voltage_sensor import BatteryVoltageSensor
+from coop_door.dcmotor_drive import Motor
+
+READS = 200
+
+def bytes_per_call(func, calls=READS):
+    """ Return heap bytes allocated per func() call. """
+    func()
+    if hasattr(gc, 'mem_free'):
+        gc.collect()
+        gc.disable()
+        free = gc.mem_free() # pylint: disable=no-member
+        for _ in range(calls):
+            func()
+        used = free - gc.mem_free() # pylint: disable=no-member
+        gc.enable()
+        return used / calls
+    import tracemalloc # pylint: disable=import-outside-toplevel
+    tracemalloc.start()
+    before, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    for _ in range(calls):
+        func()
+    _current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return (peak - before) / calls
+
+def main():
+    """ Print bytes allocated per read for both conversion paths. """
+    light = LightSensor(27, 28)
+    battery = BatteryVoltageSensor(26)
+    battery.init_timer.stop()
+    motor_voltage = [6500]
+    motor = Motor(8, 9, 14, lambda: motor_voltage[0])
+    for fixed_point in (False, True):
+        battery.set_fixed_point(fixed_point)
+        motor.set_fixed_point(fixed_point)
+        motor_voltage[0] = 6500 if fixed_point else 6.5
+        name = 'fixed point' if fixed_point else 'float'
+        print(f'{name}:')
+        print(f'  light read    {bytes_per_call(light.read):6.1f} B')
+        print(f'  battery read  {bytes_per_call(battery.read):6.1f} B')
+        print(f'  motor duty    {bytes_per_call(lambda: motor._v_to_duty(motor_voltage[0])):6.1f} B') # pylint: disable=protected-access
+
+if __name__ == '__main__':
+    main()
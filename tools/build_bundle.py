@@ -0,0 +1,107 @@
+""" Build the precompiled deployment bundle of the coop_door package.
+Every device module is compiled to micropython bytecode (.mpy) by
+mpy-cross, the board then loads it without running the compiler:
+no parsing on a cold boot and no RAM for the parse tree. main.py
+stays a source file, it is run as __main__.
+A manifest to freeze the package into the firmware is written as
+well, frozen bytecode runs from flash and takes no RAM at all:
+    make -C ports/rp2 BOARD=RPI_PICO FROZEN_MANIFEST=<build>/manifest.py
+
+mpy-cross has to match the micropython version of the board, e.g.
+    pip install mpy-cross==<version>
+Run from the repository root, install.sh does:
+    python -m tools.build_bundle
+    python -m tools.build_bundle --build build --opt 3 --mpy-cross ~/mpy-cross
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+
+PACKAGE = 'coop_door'
+# Host only packages and modules of the repository.
+HOST_ONLY = ('sim',)
+MARCH = 'armv6m'
+
+def device_modules(root='.'):
+    """ Return the file names of the device modules of the package. """
+    directory = os.path.join(root, PACKAGE)
+    return sorted(name for name in os.listdir(directory)
+                  if name.endswith('.py') and name[:-3] not in HOST_ONLY)
+
+def find_mpy_cross(path=None):
+    """ Return the mpy-cross command, None if there is none. """
+    if path is not None:
+        return [path]
+    found = shutil.which('mpy-cross')
+    if found is not None:
+        return [found]
+    try:
+        import mpy_cross # pylint: disable=import-outside-toplevel, unused-import
+    except ImportError:
+        return None
+    return [sys.executable, '-m', 'mpy_cross']
+
+def compile_module(mpy_cross, source, target, opt):
+    """ Compile a source file to a .mpy file. """
+    subprocess.run(mpy_cross + ['-march=' + MARCH, f'-O{opt}', '-s', os.path.basename(source),
+                                '-o', target, source], check=True)
+
+def write_manifest(path, root, modules, opt):
+    """ Write the manifest freezing the package into the firmware. """
+    files = ', '.join(repr(name) for name in modules)
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write('""" Freeze coop_door into the rp2 firmware, written by'
+                   ' tools.build_bundle. """\n')
+        file.write('include("$(PORT_DIR)/boards/manifest.py")\n')
+        file.write('require("logging")\n')
+        file.write(f'package({PACKAGE!r}, files=[{files}],\n'
+                   f'        base_path={os.path.abspath(root)!r}, opt={opt})\n')
+
+def build(root, build_dir, mpy_cross, opt):
+    """ Compile the package to build_dir/coop_door and write the manifest.
+    Return rows of (module, source bytes, .mpy bytes).
+    """
+    modules = device_modules(root)
+    target_dir = os.path.join(build_dir, PACKAGE)
+    os.makedirs(target_dir, exist_ok=True)
+    for name in os.listdir(target_dir):
+        if name.endswith('.mpy'):
+            os.remove(os.path.join(target_dir, name))
+    rows = []
+    for name in modules:
+        source = os.path.join(root, PACKAGE, name)
+        target = os.path.join(target_dir, name[:-3] + '.mpy')
+        compile_module(mpy_cross, source, target, opt)
+        rows.append((name[:-3], os.path.getsize(source), os.path.getsize(target)))
+    write_manifest(os.path.join(build_dir, 'manifest.py'), root, modules, opt)
+    return rows
+
+def main():
+    """ Build and print the module sizes. """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0],
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--build', default='build', help='output directory')
+    parser.add_argument('--opt', type=int, default=3,
+                        help='optimisation level, 3 drops asserts and line numbers')
+    parser.add_argument('--mpy-cross', help='mpy-cross executable')
+    parser.add_argument('--manifest-only', action='store_true',
+                        help='only write the manifest, no mpy-cross needed')
+    args = parser.parse_args()
+    if args.manifest_only:
+        os.makedirs(args.build, exist_ok=True)
+        write_manifest(os.path.join(args.build, 'manifest.py'), '.',
+                       device_modules(), args.opt)
+        return
+    mpy_cross = find_mpy_cross(args.mpy_cross)
+    if mpy_cross is None:
+        sys.exit('mpy-cross not found, pip install mpy-cross or use --mpy-cross')
+    rows = build('.', args.build, mpy_cross, args.opt)
+    print(f'{"module":24s} {"source":>8s} {"mpy":>8s}')
+    for module, source_bytes, mpy_bytes in rows:
+        print(f'{module:24s} {source_bytes:8d} {mpy_bytes:8d}')
+    print(f'{"total":24s} {sum(row[1] for row in rows):8d} {sum(row[2] for row in rows):8d}')
+
+if __name__ == '__main__':
+    main()
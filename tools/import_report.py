@@ -0,0 +1,163 @@
+""" Report the import time and RAM of the coop_door modules.
+The modules main.py imports at start-up are imported one by one,
+dependencies first, in fresh host processes on the fake machine
+module of the simulator. Each is measured compiled from source, as
+the board does with .py files, and loaded from cached bytecode, as
+it does with the .mpy files of tools.build_bundle. A module is
+charged for the standard modules it is the first to import.
+The cold start is all of it plus the DoorController construction,
+the first light reading follows after the sensor settles.
+Modules missing from the report are not imported at start-up.
+Times are host times, the ratios are what carries over to the board.
+
+Run from the repository root:
+    python -m tools.import_report
+    python -m tools.import_report --rounds 10
+"""
+import argparse
+import ast
+import importlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+PACKAGE = 'coop_door'
+
+def _imports(tree):
+    """ Return the coop_door modules imported outside of functions,
+    in the order they are imported.
+    """
+    modules = []
+    nodes = list(reversed(tree.body))
+    while nodes:
+        node = nodes.pop()
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            continue
+        if isinstance(node, ast.ImportFrom):
+            module = node.module or ''
+            if node.level == 0 and module.startswith(PACKAGE + '.'):
+                modules.append(module[len(PACKAGE) + 1:])
+            elif node.level == 0 and module == PACKAGE or node.level == 1 and not module:
+                modules.extend(alias.name for alias in node.names)
+            elif node.level == 1:
+                modules.append(module)
+        nodes.extend(reversed(list(ast.iter_child_nodes(node))))
+    return modules
+
+def parse_imports(path):
+    """ Return the coop_door modules a source file imports. """
+    with open(path, encoding='utf-8') as file:
+        return _imports(ast.parse(file.read(), path))
+
+def import_order(root='.'):
+    """ Return the modules main.py imports, dependencies first. """
+    order = []
+    def visit(module):
+        if module in order:
+            return
+        for dependency in parse_imports(os.path.join(root, PACKAGE, module + '.py')):
+            visit(dependency)
+        order.append(module)
+    for module in parse_imports(os.path.join(root, 'main.py')):
+        visit(module)
+    return order
+
+def measure(modules, memory):
+    """ Import the modules and build a DoorController.
+    Return rows of (name, ns, bytes kept, peak bytes), the bytes
+    are 0 unless memory.
+    """
+    # pylint: disable=import-outside-toplevel
+    from coop_door.sim import machine
+    sys.modules['machine'] = machine.module
+    if memory:
+        tracemalloc.start()
+    rows = []
+    def step(name, operation):
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        start = time.perf_counter_ns()
+        result = operation()
+        elapsed = time.perf_counter_ns() - start
+        after, peak = tracemalloc.get_traced_memory()
+        rows.append((name, elapsed, after - before, max(peak - before, 0)))
+        return result
+    for module in modules:
+        step(module, lambda module=module: importlib.import_module(PACKAGE + '.' + module))
+    from coop_door.sim import Board, VirtualClock
+    machine.install()
+    Board(VirtualClock(), {}).activate()
+    door_controller = sys.modules[PACKAGE + '.door_controller']
+    door_controller.DoorController.use_lazy_init(True)
+    step('DoorController()', door_controller.DoorController)
+    return rows
+
+def run_child(modules, memory, cache_dir, compile_source):
+    """ Measure in a fresh process, return its rows. """
+    env = dict(os.environ, PYTHONPYCACHEPREFIX=cache_dir)
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    if compile_source:
+        env['PYTHONDONTWRITEBYTECODE'] = '1'
+    command = [sys.executable, '-m', 'tools.import_report', '--child', ','.join(modules)]
+    if memory:
+        command.append('--memory')
+    output = subprocess.run(command, env=env, check=True, capture_output=True,
+                            text=True).stdout
+    return json.loads(output)
+
+def report(modules, rounds):
+    """ Return {mode: (best ns, bytes kept, peak bytes)} of the rows,
+    modes are 'source' and 'bytecode'.
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as source_cache,\
+         tempfile.TemporaryDirectory() as bytecode_cache:
+        # Fill the bytecode cache first.
+        run_child(modules, False, bytecode_cache, False)
+        for mode, cache_dir in (('source', source_cache), ('bytecode', bytecode_cache)):
+            compile_source = mode == 'source'
+            times = None
+            for _ in range(rounds):
+                rows = run_child(modules, False, cache_dir, compile_source)
+                ns = [row[1] for row in rows]
+                times = ns if times is None else [min(a, b) for a, b in zip(times, ns)]
+            rows = run_child(modules, True, cache_dir, compile_source)
+            results[mode] = (times, [row[2] for row in rows], [row[3] for row in rows])
+    return results
+
+def main():
+    """ Measure and print the report. """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0],
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rounds', type=int, default=5, help='processes per mode, best kept')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument('--memory', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child is not None:
+        print(json.dumps(measure(args.child.split(','), args.memory)))
+        return
+    modules = import_order()
+    results = report(modules, args.rounds)
+    names = modules + ['DoorController()']
+    print(f'{"":24s} {"source":>27s} {"bytecode":>27s}')
+    print(f'{"module":24s}' + f' {"ms":>8s} {"kB kept":>9s} {"kB peak":>8s}' * 2)
+    def columns(values):
+        ns, kept, peak = values
+        return f' {ns / 1e6:8.2f} {kept / 1e3:9.1f} {peak / 1e3:8.1f}'
+    for i, name in enumerate(names):
+        print(f'{name:24s}' + ''.join(columns([column[i] for column in results[mode]])
+                                      for mode in ('source', 'bytecode')))
+    # The peaks do not add up, the largest one is the RAM needed.
+    print(f'{"cold start":24s}' + ''.join(
+        columns((sum(results[mode][0]), sum(results[mode][1]), max(results[mode][2])))
+        for mode in ('source', 'bytecode')))
+    skipped = sorted(set(name[:-3] for name in os.listdir(PACKAGE)
+                         if name.endswith('.py') and name != '__init__.py') - set(modules))
+    print('not imported at start-up: ' + ', '.join(skipped))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,251 @@
+""" Sweep light thresholds and filter coefficients over a light trace.
+Every combination of day/night resistance threshold, hysteresis and
+filter coefficient k is replayed through the LightSensor threshold
+logic: readings filtered by an exponential average of k, day holds
+up to the day threshold, night turns day at the night threshold.
+Reported per combination are the day/night flips per day and the
+decision latency, the time from the raw trace crossing the
+threshold to the decision flipping the same way.
+
+The filter runs for all coefficients of a task at once (FilterBank),
+the thresholds are then found by jumping from one flip to the next
+over block minima and maxima instead of visiting every sample.
+Tasks run on a pool of processes. k applies per trace sample.
+The LightSensor maths need the fake machine module of the simulator,
+main() and the workers install it, callers of the functions do
+(coop_door.sim.install).
+
+Run from the repository root:
+    python -m tools.light_sweep --synthetic-days 365
+    python -m tools.light_sweep --trace site.csv --csv sweep.csv
+    python -m tools.light_sweep --r-light 40e3:100e3:5e3 --r-hysteresis 0:10e3:1e3 \\
+        --k 1,0.5,0.2,0.1,0.05
+"""
+import argparse
+import bisect
+import csv
+import math
+import multiprocessing
+import os
+import random
+from array import array
+from coop_door.filter import FilterBank
+from coop_door.sim import install
+from coop_door.sim.fleet import load_site
+from coop_door.sim.waveforms import DAY_MS, R_DAY_OHM, R_NIGHT_OHM, day_length_h
+
+BLOCK = 64
+
+class Trace():
+    """ Light sensor ADC samples and their times [ms]. """
+    def __init__(self, times_ms, adc):
+        self.times_ms = array('d', times_ms)
+        self.adc = array('d', adc)
+
+    def days(self):
+        """ Return the length of the trace in days. """
+        return max((self.times_ms[-1] - self.times_ms[0]) / DAY_MS, 1 / 24)
+
+def synthetic_trace(days, period_ms=60000, seed=0):
+    """ Return a trace with seasons, dusk ramps and sensor noise. """
+    from coop_door.light_sensor import LightSensor # pylint: disable=import-outside-toplevel
+    rng = random.Random(seed)
+    dusk_h = 0.7
+    times_ms = []
+    adc = []
+    for i in range(int(days * DAY_MS // period_ms)):
+        now_ms = i * period_ms
+        hour = (now_ms % DAY_MS) / 3600e3
+        half_h = day_length_h(now_ms // DAY_MS % 365) / 2
+        daylight = min(1.0, max(0.0, (half_h - abs(hour - 13)) / dusk_h + 0.5))
+        r_ohm = R_NIGHT_OHM * (R_DAY_OHM / R_NIGHT_OHM) ** daylight\
+            * math.exp(rng.gauss(0, 0.15))
+        times_ms.append(now_ms)
+        adc.append(round(LightSensor.ohm_to_adc(r_ohm)))
+    return Trace(times_ms, adc)
+
+def load_trace(path):
+    """ Return the light trace of a t_ms,light_adc,battery_v file. """
+    points = load_site(path).light
+    return Trace([t for t, _adc in points], [adc for _t, adc in points])
+
+class Blocks():
+    """ Maxima and minima of BLOCK long blocks of a sequence. """
+    def __init__(self, y):
+        self.y = y
+        self.maxima = array('d', (max(y[i:i + BLOCK]) for i in range(0, len(y), BLOCK)))
+        self.minima = array('d', (min(y[i:i + BLOCK]) for i in range(0, len(y), BLOCK)))
+
+    def first_above(self, start, threshold):
+        """ Return the first index from start with y > threshold, or len(y). """
+        y = self.y
+        end = min(len(y), (start // BLOCK + 1) * BLOCK)
+        for i in range(start, end):
+            if y[i] > threshold:
+                return i
+        maxima = self.maxima
+        for b in range(end // BLOCK, len(maxima)):
+            if maxima[b] > threshold:
+                for i in range(b * BLOCK, min(len(y), (b + 1) * BLOCK)):
+                    if y[i] > threshold:
+                        return i
+        return len(y)
+
+    def first_at_or_below(self, start, threshold):
+        """ Return the first index from start with y <= threshold, or len(y). """
+        y = self.y
+        end = min(len(y), (start // BLOCK + 1) * BLOCK)
+        for i in range(start, end):
+            if y[i] <= threshold:
+                return i
+        minima = self.minima
+        for b in range(end // BLOCK, len(minima)):
+            if minima[b] <= threshold:
+                for i in range(b * BLOCK, min(len(y), (b + 1) * BLOCK)):
+                    if y[i] <= threshold:
+                        return i
+        return len(y)
+
+def flips(blocks, r_light_ohm, r_hysteresis_ohm):
+    """ Return the indices where the day/night decision flips and
+    whether it starts as day, as LightSensor.read decides.
+    """
+    from coop_door.light_sensor import LightSensor # pylint: disable=import-outside-toplevel
+    day_adc, night_adc = LightSensor.thresholds_adc(r_light_ohm, r_hysteresis_ohm)
+    is_day = blocks.y[0] <= LightSensor.ohm_to_adc(r_light_ohm)
+    starts_day = is_day
+    result = []
+    i = 0
+    while True:
+        if is_day:
+            i = blocks.first_above(i + 1, day_adc)
+        else:
+            i = blocks.first_at_or_below(i + 1, night_adc)
+        if i >= len(blocks.y):
+            return result, starts_day
+        is_day = not is_day
+        result.append(i)
+
+def crossings(adc, threshold):
+    """ Return the indices of the raw trace turning day and night
+    at a threshold without hysteresis.
+    """
+    to_day = []
+    to_night = []
+    is_day = adc[0] <= threshold
+    for i, x in enumerate(adc):
+        if (x <= threshold) is not is_day:
+            is_day = not is_day
+            (to_day if is_day else to_night).append(i)
+    return to_day, to_night
+
+_trace = None
+
+def _init_worker(trace):
+    global _trace # pylint: disable=global-statement
+    _trace = trace
+
+def _init_process(trace):
+    # A spawned worker does not inherit the fake machine module.
+    install()
+    _init_worker(trace)
+
+def evaluate(task):
+    """ Evaluate the threshold pairs for the coefficients of a task.
+    Return rows of (r_light, r_hysteresis, k, flips/day,
+    mean latency [s], max latency [s]).
+    """
+    # pylint: disable=import-outside-toplevel
+    from coop_door.light_sensor import LightSensor
+    coefficients, pairs = task
+    trace = _trace
+    times_ms = trace.times_ms
+    days = trace.days()
+    filtered = FilterBank(coefficients).sample_shared(trace.adc)
+    centers = {}
+    rows = []
+    for c, k in enumerate(coefficients):
+        blocks = Blocks(filtered[c::len(coefficients)])
+        for r_light_ohm, r_hysteresis_ohm in pairs:
+            if r_light_ohm not in centers:
+                centers[r_light_ohm] = crossings(trace.adc, LightSensor.ohm_to_adc(r_light_ohm))
+            to_day, to_night = centers[r_light_ohm]
+            indices, is_day = flips(blocks, r_light_ohm, r_hysteresis_ohm)
+            latencies_ms = []
+            for i in indices:
+                is_day = not is_day
+                raw = to_day if is_day else to_night
+                j = bisect.bisect_right(raw, i) - 1
+                if j >= 0:
+                    latencies_ms.append(times_ms[i] - times_ms[raw[j]])
+            rows.append((r_light_ohm, r_hysteresis_ohm, k, len(indices) / days,
+                         sum(latencies_ms) / len(latencies_ms) / 1000 if latencies_ms else math.nan,
+                         max(latencies_ms, default=math.nan) / 1000))
+    return rows
+
+def split_tasks(coefficients, pairs, processes):
+    """ Return (coefficients, pairs) tasks for a number of processes.
+    A task filters its coefficients at once, the coefficients are
+    split over the processes first, then the threshold pairs.
+    """
+    groups = max(1, min(processes, len(coefficients)))
+    parts = max(1, min(math.ceil(processes / groups), len(pairs)))
+    return [(coefficients[i::groups], pairs[j::parts])
+            for i in range(groups) for j in range(parts)]
+
+def sweep(trace, r_lights, r_hystereses, coefficients, processes=None):
+    """ Evaluate all combinations, return the rows of evaluate. """
+    pairs = [(r_light, r_hysteresis) for r_light in r_lights
+             for r_hysteresis in r_hystereses if r_hysteresis < r_light]
+    processes = processes or os.cpu_count() or 1
+    tasks = split_tasks(coefficients, pairs, processes)
+    if processes == 1:
+        _init_worker(trace)
+        results = map(evaluate, tasks)
+    else:
+        with multiprocessing.Pool(processes, _init_process, (trace,)) as pool:
+            results = pool.map(evaluate, tasks)
+    return [row for rows in results for row in rows]
+
+def parse_values(text):
+    """ Return the values of 'a,b,c' or of a 'start:stop:step' range,
+    stop included.
+    """
+    if ':' in text:
+        start, stop, step = (float(v) for v in text.split(':'))
+        return [start + i * step for i in range(int(round((stop - start) / step)) + 1)]
+    return [float(v) for v in text.split(',')]
+
+def main():
+    """ Sweep and print the best combinations. """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0],
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--trace', help='t_ms,light_adc,battery_v trace file')
+    parser.add_argument('--synthetic-days', type=float, default=365,
+                        help='days of synthetic trace if there is no --trace')
+    parser.add_argument('--r-light', default='40e3:100e3:5e3')
+    parser.add_argument('--r-hysteresis', default='0:10e3:1e3')
+    parser.add_argument('--k', default='1,0.5,0.3,0.2,0.1,0.05,0.02,0.01')
+    parser.add_argument('--processes', type=int)
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--csv', help='write all combinations here')
+    args = parser.parse_args()
+    install()
+    trace = load_trace(args.trace) if args.trace else synthetic_trace(args.synthetic_days)
+    rows = sweep(trace, parse_values(args.r_light), parse_values(args.r_hysteresis),
+                 parse_values(args.k), args.processes)
+    rows.sort(key=lambda row: (row[3], row[4]))
+    if args.csv:
+        with open(args.csv, 'w', newline='', encoding='utf-8') as file:
+            writer = csv.writer(file)
+            writer.writerow(('r_light_ohm', 'r_hysteresis_ohm', 'k', 'flips_per_day',
+                             'mean_latency_s', 'max_latency_s'))
+            writer.writerows(rows)
+    print(f'{len(rows)} combinations, {len(trace.adc)} samples, {trace.days():.1f} days')
+    print('  r_light  r_hyst      k  flips/day  latency [s] mean  max')
+    for row in rows[:args.top]:
+        print(f'{row[0]:9.0f} {row[1]:7.0f} {row[2]:6.3f} {row[3]:10.2f}'
+              f' {row[4]:12.0f} {row[5]:6.0f}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+""" Flash writes per simulated day, per record file versus buffered sink.
+The door controller runs in the wake-up simulation with all debug
+records logged to a fake filesystem that counts write calls and
+bytes. The per record handler writes and flushes every record the
+way logging.FileHandler does, the sink is the RotatingFlashHandler.
+
+Run from the repository root:
+    python -m tools.log_sink_bench --days 2
+"""
+import argparse
+import logging
+from coop_door import log
+from coop_door.log_sink import RotatingFlashHandler
+from tools.wakeup_sim import simulate
+
+class CountingFile():
+    """ A file that only counts what is written to flash. """
+    def __init__(self, fs, name):
+        self.fs = fs
+        self.name = name
+
+    def write(self, data):
+        """ Count a flash write. """
+        self.fs.writes += 1
+        self.fs.bytes += len(data)
+        self.fs.sizes[self.name] = self.fs.sizes.get(self.name, 0) + len(data)
+        return len(data)
+
+    def flush(self):
+        """ Nothing buffered. """
+
+    def close(self):
+        """ Nothing to close. """
+
+class FakeFileSystem():
+    """ Filesystem keeping file sizes only. """
+    def __init__(self):
+        self.sizes = {}
+        self.writes = 0
+        self.bytes = 0
+
+    def open(self, name, _mode):
+        """ Open a file for appending. """
+        return CountingFile(self, name)
+
+    def size(self, name):
+        """ Return the file size. """
+        return self.sizes.get(name, 0)
+
+    def rename(self, old, new):
+        """ Rename a file. """
+        self.sizes[new] = self.sizes.pop(old)
+
+    def remove(self, name):
+        """ Remove a file. """
+        self.sizes.pop(name, None)
+
+def main():
+    """ Print flash writes and bytes per day of both handlers.
+    Both are attached to the root logger of a single simulation,
+    the coop_door modules bind the fake machine once.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--days', type=int, default=1)
+    args = parser.parse_args()
+    per_record_fs = FakeFileSystem()
+    sink_fs = FakeFileSystem()
+    handlers = (('per record', logging.StreamHandler(CountingFile(per_record_fs, 'app.log')),
+                 per_record_fs),
+                ('buffered sink', RotatingFlashHandler('app.log', fs=sink_fs), sink_fs))
+    formatter = logging.Formatter('[%(levelname)s]\t(+%(msecs)s) %(name)s %(message)s')
+    root_logger = logging.getLogger()
+    root_logger.setLevel(logging.DEBUG)
+    for _name, handler, _fs in handlers:
+        handler.setFormatter(formatter)
+        root_logger.addHandler(handler)
+    log.set_level(logging.DEBUG)
+    simulate(args.days)
+    log.flush()
+    for name, handler, fs in handlers:
+        root_logger.removeHandler(handler)
+        print(f'{name:14s} {fs.writes / args.days:9.0f} writes/day'
+              f' {fs.bytes / args.days / 1024:9.1f} KiB/day'
+              f' {sum(fs.sizes.values()) / 1024:9.1f} KiB on flash')
+
+if __name__ == '__main__':
+    main()
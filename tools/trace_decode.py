@@ -0,0 +1,113 @@
+""" Decode a binary event trace written by coop_door.trace.
+Files are memory mapped and decoded record by record. Given the
+segments oldest first, time stamps continue from one to the next.
+The light and battery readings can be written out as a site trace
+(t_ms,light_adc,battery_v) for coop_door.sim.fleet.
+
+Run from the repository root:
+    python -m tools.trace_decode trace.bin.1 trace.bin
+    python -m tools.trace_decode trace.bin --site site.csv
+"""
+import argparse
+import csv
+import mmap
+import os
+import struct
+from coop_door.trace import RECORD_FORMAT, RECORD_SIZE, BOOT, LIGHT_ADC,\
+    BATTERY_ADC, EDGE, SIGNAL, ENTER, EXIT
+from coop_door.sim.waveforms import battery_volts
+
+TICKS_PERIOD = 1 << 30
+EVENT_NAMES = {BOOT : 'boot', LIGHT_ADC : 'light_adc', BATTERY_ADC : 'battery_adc',
+               EDGE : 'edge', SIGNAL : 'signal', ENTER : 'enter', EXIT : 'exit'}
+
+def names_path(path):
+    """ Return the name file of a trace segment. """
+    base = path[:-2] if path.endswith('.1') else path
+    return base + '.names'
+
+def read_names(path):
+    """ Return the names of a trace, index is the id, 0 is unknown. """
+    names = ['?']
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as file:
+            names.extend(line.rstrip('\n') for line in file)
+    return names
+
+def raw_records(path):
+    """ Yield (ticks_ms, event, source, value) of a trace file. """
+    with open(path, 'rb') as file:
+        if os.fstat(file.fileno()).st_size < RECORD_SIZE:
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            view = memoryview(data)
+            try:
+                end = len(view) - len(view) % RECORD_SIZE
+                yield from struct.iter_unpack(RECORD_FORMAT, view[:end])
+            finally:
+                view.release()
+
+def records(paths):
+    """ Yield (t_ms, event, source, value) of trace segments given
+    oldest first. ticks_ms wrap-arounds are undone, time goes on
+    across reboots.
+    """
+    t_ms = None
+    last_ticks = 0
+    for path in paths:
+        for ticks, event, source, value in raw_records(path):
+            if t_ms is None:
+                t_ms = 0
+            elif event != BOOT:
+                t_ms += (ticks - last_ticks) % TICKS_PERIOD
+            last_ticks = ticks
+            yield t_ms, event, source, value
+
+def describe(record, names):
+    """ Return a line of text of a record. """
+    t_ms, event, source, value = record
+    text = f'{t_ms / 1000:12.3f} {EVENT_NAMES.get(event, event):12s}'
+    machine = names[source] if source < len(names) else source
+    if event in (ENTER, EXIT):
+        state = names[value] if value < len(names) else value
+        return f'{text} {state} of {machine}' if source else f'{text} {state}'
+    if event == SIGNAL:
+        return f'{text} {names[value] if value < len(names) else value} -> {machine}'
+    if event == EDGE:
+        return f'{text} pin {source} = {value}'
+    return f'{text} {value}'
+
+def site_rows(trace_records):
+    """ Yield (t_ms, light ADC, battery [V]) on every reading once
+    both sensors have been read.
+    """
+    light = None
+    battery_v = None
+    for t_ms, event, _source, value in trace_records:
+        if event == LIGHT_ADC:
+            light = value
+        elif event == BATTERY_ADC:
+            battery_v = battery_volts(value)
+        else:
+            continue
+        if light is not None and battery_v is not None:
+            yield t_ms, light, battery_v
+
+def main():
+    """ Print the records or write a site trace. """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('paths', nargs='+', help='trace segments, oldest first')
+    parser.add_argument('--site', help='write the sensor readings as a site trace')
+    args = parser.parse_args()
+    if args.site:
+        with open(args.site, 'w', newline='', encoding='utf-8') as file:
+            writer = csv.writer(file)
+            writer.writerow(('t_ms', 'light_adc', 'battery_v'))
+            writer.writerows(site_rows(records(args.paths)))
+        return
+    names = read_names(names_path(args.paths[-1]))
+    for record in records(args.paths):
+        print(describe(record, names))
+
+if __name__ == '__main__':
+    main()
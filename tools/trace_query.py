@@ -0,0 +1,514 @@
+""" Query the recorded traces and logs of a fleet of doors.
+Every door is a directory of pulled files: binary trace segments
+(trace.bin, trace.bin.1, ... see coop_door.trace) and app.log
+segments written by main.py, time stamped by coop_door.log
+(set_time_stamps). Segments are ordered by modification
+time, oldest first, then by their rotation number, highest first.
+
+Files are memory mapped and indexed once, the index is cached in the
+door directory (.trace_query.idx), if it can be written, and rebuilt
+when a file changes.
+The trace index holds the time of every STRIDE-th record and which
+events, signals and states occur in each block of STRIDE records,
+a query bisects to its time range and decodes only the blocks that
+can match. The log index holds the time of a line every LOG_STRIDE
+bytes, text is searched in the time range with mmap.find.
+
+Device time is the ticks_ms counter, unwrapped and continued over
+reboots. It is pinned to the wall clock by the newest segment
+modification time, the time the files were pulled, so dates are as
+good as the last record is close to the pull.
+
+Run from the repository root:
+    python -m tools.trace_query fleet/ --grep 'Failed to close/open the door in time' \\
+        --since 2025-12-01 --until 2026-03-01
+    python -m tools.trace_query fleet/ --state go --event enter --since 2026-01-01 --count
+"""
+import argparse
+import bisect
+import datetime
+import mmap
+import multiprocessing
+import os
+import pickle
+import re
+import struct
+from collections import namedtuple
+from coop_door.trace import RECORD_FORMAT, RECORD_SIZE, BOOT, SIGNAL, ENTER, EXIT
+from tools.trace_decode import EVENT_NAMES, TICKS_PERIOD, read_names, describe
+
+STRIDE = 1024
+LOG_STRIDE = 4096
+CACHE_NAME = '.trace_query.idx'
+CACHE_VERSION = 2
+
+_TICKS = struct.Struct('<I')
+_TIME = re.compile(rb'\(@(\d+)\)')
+
+Hit = namedtuple('Hit', ('door', 'wall_ms', 't_ms', 'text'))
+Hit.__doc__ = """ A query match: the door name, the wall clock time
+[ms since the epoch], the device time [ms] and the decoded record
+or the log line.
+"""
+
+def segments(directory, prefix):
+    """ Return the segments of a file in a door directory, oldest first. """
+    paths = []
+    for entry in os.scandir(directory):
+        name = entry.name
+        if not name.startswith(prefix):
+            continue
+        suffix = name[len(prefix):]
+        if suffix and not (suffix[0] == '.' and suffix[1:].isdigit()):
+            continue
+        rotation = int(suffix[1:]) if suffix else 0
+        paths.append((entry.stat().st_mtime, -rotation, entry.path))
+    return [path for _mtime, _rotation, path in sorted(paths)]
+
+def _signature(paths):
+    return [(os.path.basename(path), os.path.getsize(path), os.path.getmtime(path))
+            for path in paths]
+
+def _ticks(data, record):
+    return _TICKS.unpack_from(data, record * RECORD_SIZE)[0]
+
+def _bits(values):
+    bits = 0
+    for value in values:
+        bits |= 1 << value
+    return bits
+
+class TraceIndex():
+    # pylint: disable=too-many-instance-attributes
+    """ Sparse index of binary trace segments.
+    For every block of STRIDE records of a segment: the segment, the
+    first record, its device time and bit sets of the event types,
+    the signal ids and the state ids in the block.
+    """
+    def __init__(self, paths, stride=STRIDE):
+        self.paths = paths
+        self.stride = stride
+        self.signature = _signature(paths)
+        self.segment = []
+        self.first = []
+        self.times = []
+        self.events = []
+        self.signals = []
+        self.states = []
+        self.end_ms = 0
+        t_ms = None
+        last_ticks = None
+        for number, path in enumerate(paths):
+            with open(path, 'rb') as file:
+                size = os.fstat(file.fileno()).st_size
+                if size < RECORD_SIZE:
+                    continue
+                with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    t_ms, last_ticks = self._add_segment(number, data, size // RECORD_SIZE,
+                                                         t_ms, last_ticks)
+        self.end_ms = t_ms or 0
+
+    def _add_segment(self, number, data, count, t_ms, last_ticks):
+        # pylint: disable=too-many-arguments
+        if t_ms is None:
+            t_ms = 0
+            last_ticks = _ticks(data, 0)
+        for first in range(0, count, self.stride):
+            end = min(count, first + self.stride)
+            events = data[first * RECORD_SIZE + 4:end * RECORD_SIZE:RECORD_SIZE]
+            low = data[first * RECORD_SIZE + 6:end * RECORD_SIZE:RECORD_SIZE]
+            pairs = set(zip(events, low))
+            if data[first * RECORD_SIZE + 4] != BOOT:
+                t_ms += (_ticks(data, first) - last_ticks) % TICKS_PERIOD
+            self.segment.append(number)
+            self.first.append(first)
+            self.times.append(t_ms)
+            self.events.append(_bits(event for event, _value in pairs))
+            self.signals.append(_bits(value for event, value in pairs if event == SIGNAL))
+            self.states.append(_bits(value for event, value in pairs
+                                     if event in (ENTER, EXIT)))
+            if BOOT in events[1:]:
+                for record_ms, _event, _source, _value in _decode(data, first + 1, end, t_ms,
+                                                                  _ticks(data, first)):
+                    t_ms = record_ms
+            else:
+                t_ms += (_ticks(data, end - 1) - _ticks(data, first)) % TICKS_PERIOD
+            last_ticks = _ticks(data, end - 1)
+        return t_ms, last_ticks
+
+    def blocks(self, start_ms, end_ms, events=0, signals=0, states=0):
+        """ Return the numbers of the blocks that may hold records
+        between start_ms and end_ms of the event types in the events
+        bit set and of the signal or state ids in signals and states.
+        """
+        first = max(0, bisect.bisect_left(self.times, start_ms) - 1)
+        last = bisect.bisect_left(self.times, end_ms)
+        return [b for b in range(first, last)
+                if (not events or self.events[b] & events)
+                and (not (signals or states)
+                     or self.signals[b] & signals or self.states[b] & states)]
+
+    def records(self, start_ms=0, end_ms=None, events=0, signals=0, states=0):
+        """ Yield (t_ms, event, source, value) between start_ms and
+        end_ms, of the event types in the events bit set, if given.
+        Given signal or state id bit sets, only the signals and the
+        state entries and exits of those ids are yielded.
+        """
+        if end_ms is None:
+            end_ms = self.end_ms + 1
+        patterns = _patterns(events, signals, states)
+        data = None
+        number = None
+        try:
+            for block in self.blocks(start_ms, end_ms, events, signals, states):
+                if self.segment[block] != number:
+                    if data is not None:
+                        data.close()
+                    number = self.segment[block]
+                    with open(self.paths[number], 'rb') as file:
+                        data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+                first = self.first[block]
+                end = min(len(data) // RECORD_SIZE, first + self.stride)
+                if patterns and not self.events[block] & (1 << BOOT):
+                    # Without a reboot the time is an offset from the block start.
+                    records = _find(data, first, end, self.times[block],
+                                    _ticks(data, first), patterns)
+                else:
+                    records = _decode(data, first, end, self.times[block],
+                                      _ticks(data, first))
+                for record in records:
+                    t_ms, event, _source, value = record
+                    if t_ms >= end_ms:
+                        return
+                    if t_ms < start_ms:
+                        continue
+                    if events and not events & (1 << event):
+                        continue
+                    if (signals or states)\
+                       and not (event == SIGNAL and signals & (1 << value))\
+                       and not (event in (ENTER, EXIT) and states & (1 << value)):
+                        continue
+                    yield record
+        finally:
+            if data is not None:
+                data.close()
+
+def _ids(bits):
+    return [i for i in range(bits.bit_length()) if bits & (1 << i)]
+
+def _patterns(events, signals, states):
+    """ Return the byte patterns of the event type, or the event type
+    and the 16 bit value, of the records asked for, None for all.
+    """
+    if signals or states:
+        pairs = [(SIGNAL, i) for i in _ids(signals)]\
+            + [(event, i) for event in (ENTER, EXIT) for i in _ids(states)]
+        return [bytes((event, i & 0xFF, i >> 8)) for event, i in pairs
+                if not events or events & (1 << event)]
+    if events:
+        return [bytes((event,)) for event in _ids(events)]
+    return None
+
+def _find(data, first, end, t_ms, first_ticks, patterns):
+    """ Yield (t_ms, event, source, value) of records first to end
+    holding the patterns, the time of the first record being t_ms.
+    The event type (and value) columns are searched with bytes.find.
+    """
+    # pylint: disable=too-many-arguments
+    start = first * RECORD_SIZE
+    stop = end * RECORD_SIZE
+    width = len(patterns[0])
+    if width == 1:
+        columns = data[start + 4:stop:RECORD_SIZE]
+    else:
+        columns = bytearray(3 * (end - first))
+        columns[0::3] = data[start + 4:stop:RECORD_SIZE]
+        columns[1::3] = data[start + 6:stop:RECORD_SIZE]
+        columns[2::3] = data[start + 7:stop:RECORD_SIZE]
+    found = []
+    for pattern in patterns:
+        position = columns.find(pattern)
+        while position >= 0:
+            if position % width == 0:
+                found.append(first + position // width)
+            position = columns.find(pattern, position + 1)
+    found.sort()
+    for record in found:
+        ticks, event, source, value = struct.unpack_from(RECORD_FORMAT, data,
+                                                         record * RECORD_SIZE)
+        yield t_ms + (ticks - first_ticks) % TICKS_PERIOD, event, source, value
+
+def _decode(data, first, end, t_ms, last_ticks):
+    """ Yield (t_ms, event, source, value) of records first to end,
+    the time of the first one being t_ms.
+    """
+    for ticks, event, source, value in struct.iter_unpack(
+            RECORD_FORMAT, data[first * RECORD_SIZE:end * RECORD_SIZE]):
+        if event != BOOT:
+            t_ms += (ticks - last_ticks) % TICKS_PERIOD
+        last_ticks = ticks
+        yield t_ms, event, source, value
+
+class LogIndex():
+    """ Sparse index of app.log segments.
+    Every segment start and about every LOG_STRIDE bytes a line start
+    is indexed with the device time and ticks_ms of the last stamp
+    before it. Lines without a time stamp take the
+    time of the line before, ticks going back mean a reboot, the
+    time goes on from the last line.
+    """
+    def __init__(self, paths, stride=LOG_STRIDE):
+        self.paths = paths
+        self.signature = _signature(paths)
+        self.segment = []
+        self.offsets = []
+        self.times = []
+        self.ticks = []
+        t_ms = 0
+        last_ticks = None
+        for number, path in enumerate(paths):
+            if os.path.getsize(path) == 0:
+                continue
+            with open(path, 'rb') as file:
+                with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    # A segment starts with an entry, its lines before
+                    # the first stamp go on from the last segment.
+                    self._add(number, 0, t_ms, last_ticks)
+                    mark = stride
+                    for match in _TIME.finditer(data):
+                        if match.start() >= mark:
+                            self._add(number, data.rfind(b'\n', 0, match.start()) + 1,
+                                      t_ms, last_ticks)
+                            mark = match.start() + stride
+                        ticks = int(match.group(1))
+                        t_ms = _advance(t_ms, last_ticks, ticks)
+                        last_ticks = ticks
+        self.end_ms = t_ms
+
+    def _add(self, number, offset, t_ms, last_ticks):
+        self.segment.append(number)
+        self.offsets.append(offset)
+        self.times.append(t_ms)
+        self.ticks.append(last_ticks)
+
+    def grep(self, text, start_ms=0, end_ms=None):
+        """ Yield (t_ms, line) of lines holding text between
+        start_ms and end_ms.
+        """
+        if end_ms is None:
+            end_ms = self.end_ms + 1
+        text = text.encode()
+        first = max(0, bisect.bisect_left(self.times, start_ms) - 1)
+        last = bisect.bisect_left(self.times, end_ms)
+        if first >= last:
+            return
+        for number in sorted(set(self.segment[first:last])):
+            entries = [i for i in range(first, last) if self.segment[i] == number]
+            offsets = [self.offsets[i] for i in entries]
+            with open(self.paths[number], 'rb') as file:
+                with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    following = entries[-1] + 1
+                    stop = self.offsets[following]\
+                        if following < len(self.offsets) and self.segment[following] == number\
+                        else len(data)
+                    found = data.find(text, offsets[0], stop)
+                    while found >= 0:
+                        line_start = data.rfind(b'\n', 0, found) + 1
+                        line_end = data.find(b'\n', found)
+                        if line_end < 0:
+                            line_end = len(data)
+                        entry = entries[bisect.bisect_right(offsets, line_start) - 1]
+                        t_ms = self._time(data, entry, line_start)
+                        if t_ms >= end_ms:
+                            return
+                        if t_ms >= start_ms:
+                            yield t_ms, data[line_start:line_end].decode(errors='replace')
+                        found = data.find(text, line_end, stop)
+
+    def _time(self, data, entry, line_start):
+        t_ms = self.times[entry]
+        last_ticks = self.ticks[entry]
+        line_end = data.find(b'\n', line_start)
+        for match in _TIME.finditer(data, self.offsets[entry],
+                                    line_end if line_end >= 0 else len(data)):
+            ticks = int(match.group(1))
+            t_ms = _advance(t_ms, last_ticks, ticks)
+            last_ticks = ticks
+        return t_ms
+
+def _advance(t_ms, last_ticks, ticks):
+    if last_ticks is None:
+        return t_ms
+    delta = (ticks - last_ticks) % TICKS_PERIOD
+    # A step back is a reboot, the time goes on.
+    return t_ms + delta if delta < TICKS_PERIOD // 2 else t_ms
+
+def _restore(cls, state, paths):
+    """ Return an index of its cached attributes, None if the files changed. """
+    if state['paths'] != paths or state['signature'] != _signature(paths):
+        return None
+    index = cls.__new__(cls)
+    index.__dict__.update(state)
+    return index
+
+class Door():
+    """ The indexed trace and log of a door directory. """
+    def __init__(self, directory, cache=True):
+        self.directory = directory
+        self.name = os.path.basename(os.path.normpath(directory))
+        trace_paths = segments(directory, 'trace.bin')
+        log_paths = segments(directory, 'app.log')
+        self.trace = self.log = None
+        cache_path = os.path.join(directory, CACHE_NAME)
+        if cache and os.path.exists(cache_path):
+            try:
+                with open(cache_path, 'rb') as file:
+                    version, trace, log = pickle.load(file)
+            except (OSError, ValueError, pickle.UnpicklingError):
+                version = None
+            if version == CACHE_VERSION:
+                self.trace = _restore(TraceIndex, trace, trace_paths)
+                self.log = _restore(LogIndex, log, log_paths)
+        if self.trace is None or self.log is None:
+            self.trace = self.trace or TraceIndex(trace_paths)
+            self.log = self.log or LogIndex(log_paths)
+            if cache:
+                self._save(cache_path)
+        self.names = read_names(os.path.join(directory, 'trace.bin.names'))
+        self.trace_anchor_ms = self._anchor(trace_paths, self.trace.end_ms)
+        self.log_anchor_ms = self._anchor(log_paths, self.log.end_ms)
+
+    def _save(self, cache_path):
+        # Plain attributes, loadable whatever module runs as __main__.
+        try:
+            with open(cache_path, 'wb') as file:
+                pickle.dump((CACHE_VERSION, vars(self.trace), vars(self.log)), file)
+        except OSError:
+            # A read-only door directory is queried without a cache.
+            pass
+
+    @staticmethod
+    def _anchor(paths, end_ms):
+        if not paths:
+            return 0
+        return max(os.path.getmtime(path) for path in paths) * 1000 - end_ms
+
+    def ids(self, names):
+        """ Return the bit set of the ids of names. """
+        return _bits(i for i, name in enumerate(self.names) if i and name in names)
+
+    def query(self, since_ms=None, until_ms=None, events=(), signals=(), states=()):
+        """ Yield the Hits of trace records of the event types, signal
+        names and state names given, between the wall clock times.
+        """
+        # pylint: disable=too-many-arguments
+        anchor = self.trace_anchor_ms
+        for record in self.records(since_ms, until_ms, events, signals, states):
+            yield Hit(self.name, anchor + record[0], record[0], describe(record, self.names))
+
+    def records(self, since_ms=None, until_ms=None, events=(), signals=(), states=()):
+        """ Yield the (t_ms, event, source, value) records of query. """
+        # pylint: disable=too-many-arguments
+        signal_ids = self.ids(signals)
+        state_ids = self.ids(states)
+        if (signals or states) and not (signal_ids or state_ids):
+            return iter(())
+        anchor = self.trace_anchor_ms
+        return self.trace.records(0 if since_ms is None else since_ms - anchor,
+                                  None if until_ms is None else until_ms - anchor,
+                                  _bits(events), signal_ids, state_ids)
+
+    def grep(self, text, since_ms=None, until_ms=None):
+        """ Yield the Hits of log lines holding text between the wall
+        clock times.
+        """
+        anchor = self.log_anchor_ms
+        for t_ms, line in self.log.grep(text, 0 if since_ms is None else since_ms - anchor,
+                                        None if until_ms is None else until_ms - anchor):
+            yield Hit(self.name, anchor + t_ms, t_ms, line)
+
+def doors(root):
+    """ Return the door directories under root, sorted. """
+    return sorted(entry.path for entry in os.scandir(root)
+                  if entry.is_dir() and (segments(entry.path, 'trace.bin')
+                                         or segments(entry.path, 'app.log')))
+
+def query_door(task):
+    """ Run a query on a door, return the list of its Hits, or the
+    number of them if counting.
+    """
+    directory, text, since_ms, until_ms, events, signals, states, count = task
+    door = Door(directory)
+    if text is not None:
+        if count:
+            return door.name, sum(1 for _hit in door.log.grep(
+                text, 0 if since_ms is None else since_ms - door.log_anchor_ms,
+                None if until_ms is None else until_ms - door.log_anchor_ms))
+        return list(door.grep(text, since_ms, until_ms))
+    if count:
+        return door.name, sum(1 for _record in door.records(
+            since_ms, until_ms, events, signals, states))
+    return list(door.query(since_ms, until_ms, events, signals, states))
+
+def _run(directories, query, processes):
+    tasks = [(directory,) + query for directory in directories]
+    processes = processes or os.cpu_count() or 1
+    if processes == 1:
+        yield from map(query_door, tasks)
+        return
+    with multiprocessing.Pool(processes) as pool:
+        yield from pool.imap(query_door, tasks, chunksize=8)
+
+def query_fleet(directories, text=None, since_ms=None, until_ms=None,
+                events=(), signals=(), states=(), processes=None):
+    """ Yield the Hits of all doors, door by door. A text queries the
+    logs, otherwise the traces are.
+    """
+    # pylint: disable=too-many-arguments
+    for hits in _run(directories,
+                     (text, since_ms, until_ms, events, signals, states, False), processes):
+        yield from hits
+
+def count_fleet(directories, text=None, since_ms=None, until_ms=None,
+                events=(), signals=(), states=(), processes=None):
+    """ Return {door name : number of hits} of query_fleet. """
+    # pylint: disable=too-many-arguments
+    return dict(_run(directories,
+                     (text, since_ms, until_ms, events, signals, states, True), processes))
+
+def wall_ms(text):
+    """ Return the epoch milliseconds of an ISO date or time. """
+    return datetime.datetime.fromisoformat(text).timestamp() * 1000
+
+def main():
+    """ Print the matching records or log lines of all doors. """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0],
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('root', help='directory of door directories')
+    parser.add_argument('--grep', help='search the logs for this text')
+    parser.add_argument('--event', action='append', default=[],
+                        choices=sorted(EVENT_NAMES.values()))
+    parser.add_argument('--signal', action='append', default=[])
+    parser.add_argument('--state', action='append', default=[])
+    parser.add_argument('--since', type=wall_ms, help='ISO date or time')
+    parser.add_argument('--until', type=wall_ms, help='ISO date or time')
+    parser.add_argument('--count', action='store_true', help='print hits per door')
+    parser.add_argument('--processes', type=int)
+    args = parser.parse_args()
+    events = [event for event, name in EVENT_NAMES.items() if name in args.event]
+    query = (doors(args.root), args.grep, args.since, args.until,
+             events, args.signal, args.state, args.processes)
+    if args.count:
+        counts = count_fleet(*query)
+        for door, count in counts.items():
+            if count:
+                print(f'{door}\t{count}')
+        print(f'{sum(counts.values())} hits,'
+              f' {sum(1 for count in counts.values() if count)} doors')
+        return
+    for hit in query_fleet(*query):
+        date = datetime.datetime.fromtimestamp(hit.wall_ms / 1000).isoformat(' ', 'seconds')
+        print(f'{hit.door}\t{date}\t{hit.text.strip()}')
+
+if __name__ == '__main__':
+    main()
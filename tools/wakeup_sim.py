@@ -0,0 +1,43 @@
+""" Count door controller wake-ups per simulated day.
+The real DoorController runs on the coop_door.sim simulator.
+
+Run from the repository root:
+    python -m tools.wakeup_sim --days 3
+    python -m tools.wakeup_sim --days 1 --fixed
+    python -m tools.wakeup_sim --timer-per-instance
+"""
+import argparse
+import logging
+from coop_door.sim import Simulation
+
+def simulate(days, idle_wake_up_period_ms=None, shared_timer=True):
+    """ Run the controller for a number of days.
+    Return a list of (wake-ups, motor on [s]) per day and the peak
+    number of hardware timers in use.
+    """
+    kwargs = {}
+    if idle_wake_up_period_ms is not None:
+        kwargs['idle_wake_up_period_ms'] = idle_wake_up_period_ms
+    sim = Simulation(shared_timer=shared_timer, **kwargs)
+    report = [(day.wakeups, day.motor_on_s) for day in sim.run_days(days)]
+    return report, sim.hardware_timers()
+
+def main():
+    """ Print wake-ups per simulated day. """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--days', type=int, default=1)
+    parser.add_argument('--fixed', action='store_true',
+                        help='keep the fast wake-up period all the time')
+    parser.add_argument('--timer-per-instance', action='store_true',
+                        help='give each timer its own hardware timer')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+    report, hardware_timers = simulate(args.days, 100 if args.fixed else None,
+                                       not args.timer_per_instance)
+    for day, (wakeups, motor_on_s) in enumerate(report):
+        print(f'day {day}: {wakeups} wake-ups, motor on {motor_on_s:.1f} s')
+    print(f'average: {sum(w for w, _ in report) / len(report):.0f} wake-ups/day')
+    print(f'hardware timers: {hardware_timers}')
+
+if __name__ == '__main__':
+    main()